@@ -1,5 +1,6 @@
 from ctaBase import *
 from ctaTemplate import *
+from tick_filters import PriceFilter, TickFilterChain
 
 from datetime import datetime, timedelta
 from datetime import time as datetime_time
@@ -94,6 +95,9 @@ class future_grid_inf_v106(CtaTemplate):
         self.variables = variables()
         self.timer = timer()
         self.risker = risk_control()
+        # 过滤涨跌停和集合竞价: 最新价, 买一价或卖一价为 0 的 tick, 与原来的判断一致
+        # (PriceFilter 另外过滤负数和非有限值的价格, 行情不会推送这样的 tick)
+        self.tick_filter = TickFilterChain([PriceFilter(empty_book=True, limits=False)])
 
         self.curr_grid = 0
         self.next_open = 0
@@ -138,7 +142,7 @@ class future_grid_inf_v106(CtaTemplate):
         """收到行情TICK推送（必须由用户继承实现）"""
         super().onTick(tick)
         # 过滤涨跌停和集合竞价
-        if tick.lastPrice == 0 or tick.askPrice1 == 0 or tick.bidPrice1 == 0:
+        if not self.tick_filter(tick):
             return
         # 更新时间，推送状态
         self.putEvent()
@@ -184,19 +188,11 @@ class future_grid_inf_v106(CtaTemplate):
             if not self.timer.check_time(now_time.strftime("%Y%m%d %H:%M:%S"), 'trade_time'):
                 self.write_log(f'onTimer: {now_time} is not in trading time')
                 return
-            now_time = datetime.now()
-            start_date = now_time.strftime('%Y%m%d')
-            start_time = now_time.strftime('%H:%M:%S')
-            # 获取从 start_date 和 start_time 往前 1 天的 5 分钟 K线
-            bars: list = ctaEngine.getKLineData(
-                self.vtSymbol,
-                self.exchange,
-                start_date,
-                1,
-                0,
-                start_time,
-                5
-            )
+            # 获取当前交易日的 5 分钟 K线, 设置 barCache 后没有新的 K 线走完时直接使用缓存
+            try:
+                bars: list = self.loadKLineData(1, style=5)
+            except ValueError:
+                bars = []
             if not bars:
                 self.write_log(f'{self.vtSymbol} 合约在所选周期内没有分钟线数据')
             
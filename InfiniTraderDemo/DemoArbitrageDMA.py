@@ -5,6 +5,7 @@ from pythongo.classdef import KLineData, OrderData, TickData, TradeData
 from pythongo.core import KLineStyleType
 from pythongo.ui import BaseStrategy
 from pythongo.utils import KLineGeneratorArb
+from streaming import StreamingIndicators
 
 
 class Params(BaseParams):
@@ -58,6 +59,9 @@ class DemoArbitrageDMA(BaseStrategy):
         self.order_id = None
         """报单 ID"""
 
+        self.streaming: StreamingIndicators = None
+        """增量指标, K 线回调中确认走完的 K 线, 实时推送回调中更新正在走的 K 线"""
+
     @property
     def main_indicator_data(self) -> dict[str, float]:
         """主图指标"""
@@ -90,6 +94,10 @@ class DemoArbitrageDMA(BaseStrategy):
             style=self.params_map.kline_style,
             real_time_callback=self.real_time_callback
         )
+
+        """第一次查询时用 producer 中已有的 K 线 seed, 之后由回调逐根更新"""
+        self.streaming = StreamingIndicators(self.kline_generator.producer)
+
         self.kline_generator.push_history_data()
 
         super().on_start()
@@ -113,6 +121,7 @@ class DemoArbitrageDMA(BaseStrategy):
 
     def callback(self, kline: KLineData):
         """接受 K 线回调"""
+        self.streaming.update(kline.high, kline.low, kline.close)
         self.calc_indicator()
 
         self.calc_signal(kline)
@@ -130,6 +139,7 @@ class DemoArbitrageDMA(BaseStrategy):
 
     def real_time_callback(self, kline: KLineData) -> None:
         """使用收到的实时推送 K 线来计算指标并更新线图"""
+        self.streaming.provisional(kline.high, kline.low, kline.close)
         self.calc_indicator()
 
         self.widget.recv_kline({
@@ -138,12 +148,12 @@ class DemoArbitrageDMA(BaseStrategy):
         })
 
     def calc_indicator(self):
-        """计算指标数据"""
-        slow_ma = self.kline_generator.producer.sma(self.params_map.slow_period, array=True)
-        fast_ma = self.kline_generator.producer.sma(self.params_map.fast_period, array=True)
+        """计算指标数据, 使用增量指标, 实时推送时正在走的 K 线只计算临时值"""
+        self.state_map.slow_ma = self.streaming.sma(self.params_map.slow_period)
+        self.pre_slow_ma = self.streaming.sma(self.params_map.slow_period, shift=1)
 
-        self.state_map.slow_ma, self.pre_slow_ma = slow_ma[-1], slow_ma[-2]
-        self.state_map.fast_ma, self.pre_fast_ma = fast_ma[-1], fast_ma[-2]
+        self.state_map.fast_ma = self.streaming.sma(self.params_map.fast_period)
+        self.pre_fast_ma = self.streaming.sma(self.params_map.fast_period, shift=1)
 
     def calc_signal(self, kline: KLineData):
         """计算交易信号"""
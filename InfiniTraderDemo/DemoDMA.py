@@ -5,6 +5,7 @@ from pythongo.classdef import KLineData, OrderData, TickData, TradeData
 from pythongo.core import KLineStyleType
 from pythongo.ui import BaseStrategy
 from pythongo.utils import KLineGenerator
+from streaming import StreamingIndicators
 
 
 class Params(BaseParams):
@@ -38,6 +39,9 @@ class DemoDMA(BaseStrategy):
         self.kline_generator: KLineGenerator = None
         """K 线合成器"""
 
+        self.streaming: StreamingIndicators = None
+        """增量指标, K 线回调中确认走完的 K 线, 实时推送回调中更新正在走的 K 线"""
+
         self.pre_fast_ma = 0
         """上一根 K 线快均线数值"""
 
@@ -83,6 +87,9 @@ class DemoDMA(BaseStrategy):
             style=self.params_map.kline_style
         )
 
+        """第一次查询时用 producer 中已有的 K 线 seed, 之后由回调逐根更新"""
+        self.streaming = StreamingIndicators(self.kline_generator.producer)
+
         self.kline_generator.push_history_data()
 
         super().on_start()
@@ -124,6 +131,8 @@ class DemoDMA(BaseStrategy):
 
     def callback(self, kline: KLineData) -> None:
         """接受 K 线回调"""
+        self.streaming.update(kline.high, kline.low, kline.close)
+
         if len(self.order_id) > 0:
             for order_id in self.order_id:
                 self.cancel_order(order_id)
@@ -190,6 +199,7 @@ class DemoDMA(BaseStrategy):
 
     def real_time_callback(self, kline: KLineData) -> None:
         """使用收到的实时推送 K 线来计算指标并更新线图"""
+        self.streaming.provisional(kline.high, kline.low, kline.close)
         self.calc_indicator()
 
         self.widget.recv_kline({
@@ -198,9 +208,9 @@ class DemoDMA(BaseStrategy):
         })
 
     def calc_indicator(self) -> None:
-        """计算指标数据"""
-        slow_ma = self.kline_generator.producer.sma(self.params_map.slow_period, array=True)
-        fast_ma = self.kline_generator.producer.sma(self.params_map.fast_period, array=True)
+        """计算指标数据, 使用增量指标, 实时推送时正在走的 K 线只计算临时值"""
+        self.pre_slow_ma = self.streaming.sma(self.params_map.slow_period, shift=1)
+        self.state_map.slow_ma = self.streaming.sma(self.params_map.slow_period)
 
-        self.pre_slow_ma, self.state_map.slow_ma = slow_ma[-2:]
-        self.pre_fast_ma, self.state_map.fast_ma = fast_ma[-2:]
+        self.pre_fast_ma = self.streaming.sma(self.params_map.fast_period, shift=1)
+        self.state_map.fast_ma = self.streaming.sma(self.params_map.fast_period)
@@ -6,6 +6,8 @@ from pythongo.base import BaseParams, BaseState, Field
 from pythongo.classdef import KLineData, OrderData, TickData, TradeData
 from pythongo.ui import BaseStrategy
 from pythongo.utils import KLineGenerator
+from indicator_graph import IndicatorSet
+from streaming import StreamingIndicators
 
 
 class Params(BaseParams):
@@ -23,6 +25,10 @@ class Params(BaseParams):
     N2: int = Field(default=26, title="ATR 指标参数")
     N1: int = Field(default=5, title="快均线周期")
     P1: int = Field(default=10, title="慢均线周期")
+    indicators: str = Field(
+        default="macd=macd(); atr=atr(N2); kdj=kdj(N, M1, M2); ma0=sma(P1); ma1=sma(N1); kc=keltner(N)",
+        title="指标声明"
+    )
 
 
 class State(BaseState):
@@ -69,6 +75,12 @@ class DemoKC(BaseStrategy):
         self.order_id = None
         self.signal_price = 0
 
+        self.streaming: StreamingIndicators = None
+        """增量指标, K 线回调中确认走完的 K 线, 实时推送回调中更新正在走的 K 线"""
+
+        self.indicator_set: IndicatorSet = None
+        """声明的指标集合"""
+
     @property
     def main_indicator_data(self) -> dict[str, float]:
         """主图指标"""
@@ -112,6 +124,11 @@ class DemoKC(BaseStrategy):
             instrument_id=self.params_map.instrument_id,
             style=self.params_map.kline_style
         )
+
+        """第一次查询时用 producer 中已有的 K 线 seed, 之后由回调逐根更新"""
+        self.streaming = StreamingIndicators(self.kline_generator.producer)
+        self.indicator_set = IndicatorSet(self.streaming, self.params_map.indicators, namespace=self.params_map)
+
         self.kline_generator.push_history_data()
 
         super().on_start()
@@ -133,6 +150,7 @@ class DemoKC(BaseStrategy):
     def callback(self, kline: KLineData) -> None:
         """接受 K 线回调"""
         # 计算指标
+        self.streaming.update(kline.high, kline.low, kline.close)
         self.calc_indicator()
 
         # 计算信号
@@ -154,6 +172,7 @@ class DemoKC(BaseStrategy):
 
     def real_time_callback(self, kline: KLineData) -> None:
         """使用收到的实时推送 K 线来计算指标并更新线图"""
+        self.streaming.provisional(kline.high, kline.low, kline.close)
         self.calc_indicator()
 
         self.widget.recv_kline({
@@ -240,36 +259,27 @@ class DemoKC(BaseStrategy):
             )
 
     def calc_indicator(self) -> None:
-        macd, signal, hist = self.kline_generator.producer.macdext(array=True)
+        """计算指标数据, 声明的指标每根 K 线计算一次, 实时推送时正在走的 K 线只计算临时值"""
+        pre, cur = self.indicator_set.values(shift=1), self.indicator_set.values()
 
         (
             (self.macd1, self.state_map.macd),
             (self.signall1, self.state_map.signall),
             (_, self.state_map.hist)
-        ) = np.round((macd[-2:], signal[-2:], hist[-2:]), 2)
+        ) = np.round((pre["macd"], cur["macd"]), 2).T
 
-        self.state_map.atr, self.tr = self.kline_generator.producer.atr(self.params_map.N2)
-
-        k, d, j = self.kline_generator.producer.kdj(
-            fastk_period=self.params_map.N,
-            slowk_period=self.params_map.M1,
-            slowd_period=self.params_map.M2,
-            array=True
-        )
+        self.state_map.atr, self.tr = cur["atr"]
 
         (
             (self.kk, self.state_map.k),
             (self.dd, self.state_map.d),
             (self.jj, self.state_map.j)
-        ) = np.round((k[-2:], d[-2:], j[-2:]), 2)
-
-        ma = self.kline_generator.producer.sma(self.params_map.P1, array=True)
-        ma1 = self.kline_generator.producer.sma(self.params_map.N1, array=True)
+        ) = np.round((pre["kdj"], cur["kdj"]), 2).T
 
-        self.ma00, self.state_map.ma0 = np.round(ma[-2:], 2)
-        self.ma10, self.state_map.ma1 = np.round(ma1[-2:], 2)
+        self.ma00, self.state_map.ma0 = np.round((pre["ma0"], cur["ma0"]), 2)
+        self.ma10, self.state_map.ma1 = np.round((pre["ma1"], cur["ma1"]), 2)
 
-        upper_envelope, lower_envelope = self.kline_generator.producer.keltner(self.params_map.N)
+        upper_envelope, lower_envelope = cur["kc"]
         self.state_map.bup, self.state_map.bdn = round(upper_envelope, 2), round(lower_envelope, 2)
 
     def calc_signal(self, kline: KLineData):
@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Union
+
+import numpy as np
+
+from sessions import SessionCalendar
+
+TICK_DTYPE = np.dtype([
+    ("timestamp", "datetime64[ms]"),
+    ("last_price", np.float64),
+    ("volume", np.int64),
+    ("open_interest", np.float64)
+])
+"""tick 结构化数组格式, volume 为当日累计成交量"""
+
+KLINE_DTYPE = np.dtype([
+    ("datetime", "datetime64[us]"),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("open_interest", np.float64)
+])
+"""K 线结构化数组格式, 与 KLineSeries 的列一致"""
+
+_STYLE_UNITS = {"S": 1, "M": 60, "H": 3600}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def style_seconds(style: Union[Any, str, int]) -> int:
+    """
+    K 线周期对应的秒数
+
+    Args:
+        style: KLineStyle 枚举值或其名称 (如 M5, H1), 整数表示秒数
+    """
+    if isinstance(style, int):
+        return style
+
+    name: str = getattr(style, "name", style)
+    unit, number = name[:1], name[1:]
+
+    if unit not in _STYLE_UNITS or not number.isdigit():
+        raise ValueError(f"不支持的 K 线周期: {name}")
+
+    return _STYLE_UNITS[unit] * int(number)
+
+
+def _time_to_seconds(value: str) -> int:
+    """HH:MM:SS 转为当日秒数"""
+    hour, minute, second = value.split(":")
+    return int(hour) * 3600 + int(minute) * 60 + int(second[:2])
+
+
+def ticks_to_klines(
+    ticks: np.ndarray,
+    style: Union[Any, str, int] = "M1",
+    close_time: Iterable[str] = (),
+    drop_last: bool = False
+) -> np.ndarray:
+    """
+    批量将 tick 合成 K 线
+    ----
+        与 MinKLineGenerator.tick_to_kline 的规则一致:\n
+        1. 丢弃成交量为 0 以及与上一个 tick 成交量相同的 tick\n
+        2. K 线时间为该周期的结束时间, tick 时间 (去掉毫秒) 大于等于结束时间即进入下一根\n
+        3. close_time 中的 tick (每个交易时段结束后的 tick) 不驱动新 K 线, 归入当前 K 线\n
+        4. 成交量为本根最后一个 tick 与上一根最后一个 tick 的累计成交量之差, 为负时视为新交易日取累计量\n
+        周期按自然时间对齐, 跨交易时段的周期 (如午休) 不做切分
+
+    Args:
+        ticks: TICK_DTYPE 结构化数组, 按时间升序\n
+        style: K 线周期, KLineStyle 枚举值或名称, 整数表示秒数\n
+        close_time: 交易时段结束时间列表, 格式 HH:MM:SS, 即 MarketCenter.get_close_time 的返回值\n
+        drop_last: 是否丢弃最后一根未走完的 K 线
+
+    Returns:
+        KLINE_DTYPE 结构化数组
+    """
+    period = style_seconds(style)
+
+    volume = ticks["volume"]
+    ticks = ticks[volume > 0]
+    volume = ticks["volume"]
+
+    if not len(ticks):
+        return np.zeros(0, dtype=KLINE_DTYPE)
+
+    ticks = ticks[np.r_[True, volume[1:] != volume[:-1]]]
+    volume = ticks["volume"]
+    price = ticks["last_price"]
+
+    seconds = ticks["timestamp"].astype("datetime64[s]").astype(np.int64)
+
+    if close_time:
+        close_seconds = np.array([_time_to_seconds(_time) for _time in close_time])
+        seconds = seconds - np.isin(seconds % 86400, close_seconds)
+
+    end = (seconds // period + 1) * period
+
+    starts = np.flatnonzero(np.r_[True, end[1:] != end[:-1]])
+    lasts = np.r_[starts[1:], len(ticks)] - 1
+
+    bar_volume = volume[lasts] - np.r_[volume[0], volume[lasts[:-1]]]
+    bar_volume = np.where(bar_volume < 0, volume[lasts], bar_volume)
+
+    klines = np.zeros(len(starts), dtype=KLINE_DTYPE)
+    klines["datetime"] = end[starts].astype("datetime64[s]")
+    klines["open"] = price[starts]
+    klines["high"] = np.maximum.reduceat(price, starts)
+    klines["low"] = np.minimum.reduceat(price, starts)
+    klines["close"] = price[lasts]
+    klines["volume"] = bar_volume
+    klines["open_interest"] = ticks["open_interest"][lasts]
+
+    return klines[:-1] if drop_last else klines
+
+
+class KLineResampler(object):
+    """
+    K 线周期增量合成
+    ----
+        将小周期 K 线 (如 M1) 逐根合成大周期 K 线, K 线时间均为周期结束时间\n
+        小周期 K 线时间等于大周期结束时间时立即推出, 跳到下一个大周期时推出未走完的上一根\n
+        没有 calendar 时周期按自然时间对齐; 给定 calendar 时按交易时段开盘时间对齐, 时段最后一根在时段结束时间走完,
+        与 SessionCalendar.next_bar_time 相同, 日历中休市时间的 K 线归入未走完的上一根
+
+    Args:
+        style: 目标 K 线周期, KLineStyle 枚举值或名称\n
+        calendar: 交易时段日历, 周期必须为整分钟
+    """
+
+    def __init__(self, style: Union[Any, str, int], calendar: SessionCalendar = None) -> None:
+        self.period = timedelta(seconds=style_seconds(style))
+        self.calendar = calendar
+        self.pending: dict = None
+
+        if calendar is not None and self.period % timedelta(minutes=1):
+            raise ValueError("按交易时段对齐的周期必须为整分钟")
+
+    def _end_time(self, _datetime: datetime) -> datetime:
+        """K 线所属大周期的结束时间"""
+        if self.calendar is None:
+            return _EPOCH - ((_EPOCH - _datetime) // self.period) * self.period
+
+        """小周期 K 线时间为结束时间, 用其最后一分钟查询所属的大周期"""
+        end_time = self.calendar.next_bar_time(_datetime - timedelta(minutes=1), self.period // timedelta(minutes=1))
+        if end_time is None:
+            return self.pending["datetime"] if self.pending else _datetime
+        return end_time
+
+    def update(
+        self,
+        _datetime: datetime,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        open_interest: float = 0
+    ) -> List[dict]:
+        """
+        合成一根小周期 K 线
+
+        Returns:
+            本次走完的大周期 K 线, 字段与 KLineContainer 中的 K 线一致
+        """
+        finished: List[dict] = []
+        end_time = self._end_time(_datetime)
+
+        if self.pending and self.pending["datetime"] != end_time:
+            finished.append(self.pending)
+            self.pending = None
+
+        if self.pending is None:
+            self.pending = {
+                "open": open,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume,
+                "datetime": end_time,
+                "open_interest": open_interest
+            }
+        else:
+            self.pending.update(
+                high=max(self.pending["high"], high),
+                low=min(self.pending["low"], low),
+                close=close,
+                volume=self.pending["volume"] + volume,
+                open_interest=open_interest
+            )
+
+        if _datetime == end_time:
+            finished.append(self.pending)
+            self.pending = None
+
+        return finished
@@ -0,0 +1,213 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CacheEntry = Tuple[List[dict], bool, datetime]
+"""缓存的一个交易日 (K 线字典列表, 是否已走完, 写入时间)"""
+
+
+def _encode(values: list) -> np.ndarray:
+    """一列值转为数组, datetime 列转为 datetime64[us], 类型不一致的列保留为 object"""
+    if isinstance(values[0], datetime):
+        return np.array(values, dtype="datetime64[us]")
+    if len({type(value) for value in values}) > 1:
+        return np.array(values, dtype=object)
+    return np.array(values)
+
+
+class BarCache(object):
+    """
+    K 线磁盘缓存
+    ----
+        按 交易所/合约/周期/交易日.npz 每个交易日一个文件, 按列存储 K 线字典的各个字段, 读取时还原为原来的字典,
+        int, float, str 和 datetime 的类型保持不变\n
+        已走完的交易日写入后不再变化; 当前交易日标记为未走完, 只在调用方判断仍然有效时使用\n
+        写入先写临时文件再用 os.replace 替换, 其他进程或线程读到的总是完整的旧文件或新文件, 读取时不需要加锁\n
+        读取时更新文件修改时间, 总大小超过 max_bytes 时按修改时间从早到晚删除, 即淘汰最久未使用的交易日\n
+        早于获取到的最早 K 线的空交易日未经确认, 只在 empty_ttl 内有效, 之后重新获取, 见 load
+
+    Args:
+        root: 缓存目录\n
+        max_bytes: 缓存总大小上限\n
+        empty_ttl: 早于获取到的最早 K 线的空交易日的有效时间
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 2 ** 20, empty_ttl: timedelta = timedelta(days=1)) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.empty_ttl = empty_ttl
+
+    def path(self, exchange: str, instrument: str, style: str, day: date) -> str:
+        """交易日的缓存文件路径"""
+        return os.path.join(self.root, exchange, instrument, style, f"{day:%Y%m%d}.npz")
+
+    def read(self, exchange: str, instrument: str, style: str, day: date) -> Optional[CacheEntry]:
+        """读取一个交易日, 没有缓存或文件已被淘汰时返回 None"""
+        path = self.path(exchange, instrument, style, day)
+        try:
+            with np.load(path, allow_pickle=True) as data:
+                keys: List[str] = data["keys"].tolist()
+                columns = [data[f"c{index}"].tolist() for index in range(len(keys))]
+                complete = bool(data["complete"])
+                written: datetime = data["written"].item()
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        return [dict(zip(keys, row)) for row in zip(*columns)], complete, written
+
+    def write(
+        self,
+        exchange: str,
+        instrument: str,
+        style: str,
+        day: date,
+        bars: List[dict],
+        complete: bool = True,
+        written: datetime = None
+    ) -> None:
+        """
+        写入一个交易日, 没有 K 线 (节假日) 时同样写入
+
+        Args:
+            bars: 该交易日升序的 K 线字典, 各根的字段相同\n
+            complete: 交易日是否已走完, 空交易日为 False 时表示未经确认\n
+            written: 写入时间, 默认为当前时间
+        """
+        path = self.path(exchange, instrument, style, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        keys = list(bars[0]) if bars else []
+        columns = {f"c{index}": _encode([bar[key] for bar in bars]) for index, key in enumerate(keys)}
+
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            np.savez(
+                f,
+                keys=np.array(keys, dtype=str),
+                complete=np.array(complete),
+                written=np.datetime64(written or datetime.now(), "us"),
+                **columns
+            )
+        os.replace(temp, path)
+
+    def files(self) -> List[Tuple[float, int, str]]:
+        """缓存的全部文件 (修改时间, 大小, 路径)"""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".npz"):
+                    try:
+                        stat = os.stat(os.path.join(directory, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+        return files
+
+    def evict(self) -> int:
+        """总大小超过 max_bytes 时删除最久未使用的文件, 返回删除的文件数"""
+        files = sorted(self.files())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                """其他进程正在读取 (Windows) 或已删除"""
+                continue
+            total -= size
+            removed += 1
+
+        return removed
+
+    def load(
+        self,
+        exchange: str,
+        instrument: str,
+        style: str,
+        days: List[date],
+        fetch: Callable[[int, Optional[dict]], List[dict]],
+        day_of: Callable[[dict], date],
+        fresh: Callable[[datetime], bool] = None,
+        now: datetime = None
+    ) -> List[dict]:
+        """
+        先读缓存, 只获取缓存之后的部分
+        ----
+            从最早的交易日开始读取缓存, 遇到第一个没有缓存的交易日为止, 之后的交易日 (至少包含当前交易日) 用 fetch 获取\n
+            获取到的交易日少于需要的交易日时 (分段边界的交易日被重复计算等), 从获取到的最早的 K 线往前继续获取缺少的天数,
+            直到不再缺少或者不能更早\n
+            仍然没有 K 线的交易日写入空的交易日: 晚于获取到的最早 K 线的 (日历缺少的节假日) 已由前后的 K 线确认休市, 之后不再重复获取;
+            早于最早 K 线的 (合约上市之前, 也可能是请求失败返回的空数据) 只在 empty_ttl 内有效; fetch 没有返回任何 K 线时不写入\n
+            已走完的交易日写入缓存, 当前交易日只在 fresh 不为 None 时写入, 下次读取时 fresh(写入时间) 为 True 才使用
+
+        Args:
+            days: 需要的交易日, 从最近到最早, 第一个为当前交易日\n
+            fetch: fetch(n, before) 获取 before (K 线字典, 为 None 时为当前时间) 及之前 n 个交易日的 K 线, 返回升序的 K 线字典列表\n
+            day_of: K 线所属的交易日\n
+            fresh: 判断当前交易日的缓存是否仍然有效\n
+            now: 当前时间, 作为写入时间和空交易日是否过期的判断, 默认为系统时间
+
+        Returns:
+            days 中各交易日升序的 K 线字典列表
+        """
+        now = now or datetime.now()
+        start = len(days)
+        cached: List[List[dict]] = []
+
+        for index in range(len(days) - 1, -1, -1):
+            entry = self.read(exchange, instrument, style, days[index])
+            if entry is None or not (
+                entry[1]
+                or (index == 0 and fresh and fresh(entry[2]))
+                or (index > 0 and not entry[0] and now - entry[2] < self.empty_ttl)
+            ):
+                break
+            cached.append(entry[0])
+            start = index
+
+        bars = [bar for _bars in cached for bar in _bars]
+        if start == 0:
+            return bars
+
+        groups: Dict[date, List[dict]] = {}
+        count, before = start, None
+        while True:
+            _groups: Dict[date, List[dict]] = {}
+            for bar in fetch(count, before) or []:
+                _groups.setdefault(day_of(bar), []).append(bar)
+
+            """before 所属的交易日已经获取过, 只取更早的交易日"""
+            _groups = {day: _bars for day, _bars in _groups.items() if day not in groups}
+            if not _groups:
+                break
+            groups.update(_groups)
+
+            oldest = min(groups)
+            if not (missing := sum(day < oldest for day in days[1:start])):
+                break
+            count, before = missing + 1, groups[oldest][0]
+
+        if groups:
+            oldest = min(groups)
+            for day in days[1:start]:
+                if day not in groups:
+                    """早于最早 K 线的空交易日标记为未确认, 只在 empty_ttl 内使用"""
+                    self.write(exchange, instrument, style, day, [], complete=day > oldest, written=now)
+
+            for day, _bars in groups.items():
+                if day < days[0]:
+                    self.write(exchange, instrument, style, day, _bars, written=now)
+                elif day == days[0] and fresh:
+                    self.write(exchange, instrument, style, day, _bars, complete=False, written=now)
+
+            self.evict()
+
+        newest = days[start] if start < len(days) else days[-1] - timedelta(days=1)
+        return bars + [bar for day in sorted(groups) if newest < day <= days[0] for bar in groups[day]]
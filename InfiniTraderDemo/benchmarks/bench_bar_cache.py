@@ -0,0 +1,228 @@
+"""
+BarCache 历史 K 线磁盘缓存的一致性校验和耗时对比
+
+用 bench_load_bar 的 LocalEngine 代替行情接口, 按 CtaTemplate.loadKLineData 的方式分段获取
+
+1. 空缓存, 当前交易日缓存有效, 到了之后的交易日三种情况, 开始时间包含与不包含, 使用缓存的结果都正好是需要的各个交易日的
+   全部 K 线, 开始时间不包含时与不使用缓存完全一致, 之后的交易日只请求缓存之后的交易日\n
+2. 日历缺少节假日时, 获取范围内的节假日写入空的交易日, 再次载入不重复请求;
+   更早的交易日获取失败返回空数据时, 早于最早 K 线的空交易日只在 empty_ttl 内使用, 获取全部失败时不写入\n
+3. 一个线程反复重写同一个交易日时, 其他线程读到的总是完整的文件\n
+4. 总大小超过上限时淘汰最久未使用的交易日\n
+5. 输出每次请求固定延迟时, 不使用缓存与使用缓存载入 30 天的耗时, 开始时间包含时不使用缓存每段边界少一个交易日,
+   使用缓存时从最早的 K 线往前补齐
+
+运行: python benchmarks/bench_bar_cache.py [latency_ms]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bar_cache import BarCache  # noqa: E402
+from bench_load_bar import EXCHANGE, SYMBOL, LocalEngine  # noqa: E402
+from history import bar_time, bar_trading_day, dedupe_bars, fetch_history  # noqa: E402
+from sessions import SessionCalendar  # noqa: E402
+
+
+def load(engine: LocalEngine, days: int, now: datetime, cache: BarCache = None, holidays: tuple = ()) -> list:
+    """与 CtaTemplate.loadKLineData 相同的获取方式, cache 为 None 时不使用缓存"""
+    calendar = SessionCalendar.for_instrument(SYMBOL, holidays)
+
+    def fetch(start_date: str, start_time: str, _days: int) -> list:
+        return engine.getKLineData(SYMBOL, EXCHANGE, start_date, _days, 0, start_time, 1)
+
+    def fetch_days(_days: int, before: dict = None) -> list:
+        return list(dedupe_bars(reversed(fetch_history(_days, bar_time(before) if before else now, calendar, fetch, 4))))
+
+    if cache is None:
+        return fetch_days(days)
+
+    return cache.load(
+        EXCHANGE, SYMBOL, "M1", calendar.recent_trading_days(now, days), fetch_days,
+        day_of=lambda bar: bar_trading_day(bar, calendar),
+        fresh=lambda written: (end := calendar.next_bar_time(written, 1)) is not None and end > now,
+        now=now
+    )
+
+
+def expected(engine: LocalEngine, days: int, now: datetime) -> list:
+    """now 所属交易日及之前 days 个交易日在 now 之前的全部 K 线"""
+    wanted = set(engine.calendar.recent_trading_days(now, days))
+    return [
+        engine._bar(index) for index, (_datetime, day) in enumerate(zip(engine.times, engine.trading_days))
+        if day in wanted and (_datetime <= now if engine.inclusive else _datetime < now)
+    ]
+
+
+def check_consistency(root: str) -> None:
+    holidays = (date(2024, 4, 4), date(2024, 4, 5))
+
+    for inclusive in (True, False):
+        engine = LocalEngine(datetime(2024, 4, 30, 14, 30), latency=0, holidays=holidays, inclusive=inclusive)
+        for days in (1, 3, 7, 13):
+            cache = BarCache(os.path.join(root, f"consistency_{inclusive}_{days}"))
+            check_days(engine, days, cache, holidays)
+
+    print(
+        "空缓存, 同一根 K 线内再次载入, 之后的交易日, 1 ~ 13 天, 开始时间包含与不包含: 使用缓存的结果正好是需要的交易日, "
+        "不包含时与不使用缓存一致, 只请求缓存之后的交易日"
+    )
+
+    """日历缺少节假日, 节假日写入空的交易日"""
+    cache = BarCache(os.path.join(root, "holidays"))
+    now = datetime(2024, 4, 10, 14, 20)
+    load(engine, 7, now, cache)
+    entry = cache.read(EXCHANGE, SYMBOL, "M1", date(2024, 4, 4))
+    assert entry is not None and entry[0] == [] and entry[1]
+
+    engine.calls = 0
+    load(engine, 7, now + timedelta(days=1), cache)
+    assert engine.calls == 1
+    print("日历缺少节假日: 节假日缓存为空的交易日, 之后的交易日只请求 1 次")
+
+    check_failed_fetch(root)
+
+
+def check_failed_fetch(root: str) -> None:
+    """更早的交易日获取失败 (返回空数据), 空交易日过期后重新获取; 全部失败时不写入"""
+    cache = BarCache(os.path.join(root, "failed"), empty_ttl=timedelta(hours=1))
+    days = [date(2024, 4, 12) - timedelta(days=index) for index in range(4)]
+    now = datetime(2024, 4, 12, 14, 20)
+    calls = []
+
+    def fetch(count: int, before: dict = None) -> list:
+        calls.append(before)
+        return [] if before else [{"day": day} for day in days[:2][::-1]]
+
+    def load(_now: datetime) -> list:
+        return cache.load(EXCHANGE, SYMBOL, "M1", days, fetch, day_of=lambda bar: bar["day"], now=_now)
+
+    load(now)
+    assert [cache.read(EXCHANGE, SYMBOL, "M1", day)[1] for day in days[2:]] == [False, False]
+
+    calls.clear()
+    load(now + timedelta(minutes=30))
+    assert len(calls) == 1, "empty_ttl 内不应重新获取空交易日"
+
+    calls.clear()
+    load(now + timedelta(hours=2))
+    assert len(calls) == 2 and calls[1] is not None, "空交易日过期后应重新获取"
+
+    empty = BarCache(os.path.join(root, "failed_all"))
+    empty.load(EXCHANGE, SYMBOL, "M1", days, lambda *_: [], day_of=lambda bar: bar["day"], now=now)
+    assert all(empty.read(EXCHANGE, SYMBOL, "M1", day) is None for day in days)
+    print("更早的交易日获取失败: 空交易日只在 empty_ttl 内使用, 全部失败时不写入")
+
+
+def check_days(engine: LocalEngine, days: int, cache: BarCache, holidays: tuple) -> None:
+    for now in (datetime(2024, 4, 22, 10, 5, 20), datetime(2024, 4, 22, 10, 5, 40), datetime(2024, 4, 23, 21, 40)):
+        engine.calls = 0
+        result = load(engine, days, now, cache, holidays)
+        calls = engine.calls
+        assert result == expected(engine, days, now), f"{days} 天 {now} 缓存结果不是需要的交易日"
+        assert engine.inclusive or result == load(engine, days, now, holidays=holidays), f"{days} 天 {now} 缓存结果不一致"
+
+        if now.second == 40:
+            """同一根 K 线内再次载入, 当前交易日的缓存有效"""
+            assert calls == 0, f"{days} 天 {now} 当前交易日的缓存有效时不应请求, 实际 {calls} 次"
+        elif now.hour == 21:
+            """之后的交易日 (夜盘), 缓存之后的 3 个交易日只需请求 1 次"""
+            assert calls == 1, f"{days} 天 {now} 只应请求 1 次, 实际 {calls} 次"
+
+    """文件中的类型与原来的字典相同"""
+    assert [type(value) for value in result[0].values()] == [str, str, str, str, datetime, int, int, int, int, int, int]
+
+
+def check_concurrent_readers(root: str) -> None:
+    cache = BarCache(os.path.join(root, "concurrent"))
+    engine = LocalEngine(datetime(2024, 4, 26, 15, 30), latency=0)
+    bars = load(engine, 1, datetime(2024, 4, 26, 15, 30))
+    day = date(2024, 4, 26)
+    versions = [bars[:count] for count in (60, 120, 180, len(bars))]
+    cache.write(EXCHANGE, SYMBOL, "M1", day, versions[0])
+
+    stop = threading.Event()
+    reads, errors = [0], []
+
+    def reader() -> None:
+        while not stop.is_set():
+            entry = cache.read(EXCHANGE, SYMBOL, "M1", day)
+            if entry is None or entry[0] not in versions:
+                errors.append(entry)
+            reads[0] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    for index in range(200):
+        cache.write(EXCHANGE, SYMBOL, "M1", day, versions[index % len(versions)])
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, f"{len(errors)} 次读到不完整的文件"
+    print(f"写入 200 次的同时 4 个线程读取 {reads[0]} 次, 全部读到完整的文件")
+
+
+def check_eviction(root: str) -> None:
+    cache = BarCache(os.path.join(root, "eviction"))
+    engine = LocalEngine(datetime(2024, 4, 26, 15, 30), latency=0)
+    load(engine, 20, datetime(2024, 4, 26, 15, 30), cache)
+
+    files = sorted(cache.files())
+    total = sum(size for _, size, _ in files)
+    cache.max_bytes = total // 2
+
+    """最早写入的 3 个交易日最近读过, 不被淘汰"""
+    recent = [path for _, _, path in files[:3]]
+    time.sleep(0.01)
+    for path in recent:
+        day = datetime.strptime(os.path.basename(path)[:8], "%Y%m%d").date()
+        assert cache.read(EXCHANGE, SYMBOL, "M1", day) is not None
+
+    removed = cache.evict()
+    remaining = cache.files()
+    assert sum(size for _, size, _ in remaining) <= cache.max_bytes
+    assert all(os.path.exists(path) for path in recent)
+    print(f"上限为一半时淘汰 {removed} / {len(files)} 个交易日, 最近读过的交易日保留")
+
+
+def main(latency: float = 0.2) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        check_consistency(root)
+        check_concurrent_readers(root)
+        check_eviction(root)
+
+        now = datetime(2024, 4, 26, 14, 20, 30)
+        engine = LocalEngine(now + timedelta(days=1), latency=latency)
+        cache = BarCache(os.path.join(root, "timing"))
+        print(f"\n每次请求延迟 {latency * 1000:.0f}ms, 载入 30 天:")
+
+        for name, _now, _cache in (
+            ("不使用缓存", now, None),
+            ("空缓存", now, cache),
+            ("同一根 K 线内", now + timedelta(seconds=10), cache),
+            ("下一根 K 线", now + timedelta(minutes=1), cache),
+        ):
+            engine.calls = 0
+            start = time.perf_counter()
+            bars = load(engine, 30, _now, _cache)
+            cost = time.perf_counter() - start
+
+            assert _cache is None or bars == expected(engine, 30, _now)
+            trading_days = len({engine.calendar.trading_day(bar["datetime"] - timedelta(seconds=1)) for bar in bars})
+            print(f"{name:>8}: {trading_days} 个交易日 {len(bars)} 根, {engine.calls} 次请求, {cost:6.3f}s")
+
+        usage = sum(size for _, size, _ in cache.files())
+        print(f"缓存 {len(cache.files())} 个交易日, {usage / 2 ** 20:.2f}MB")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.2)
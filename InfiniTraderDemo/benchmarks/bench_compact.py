@@ -0,0 +1,98 @@
+"""
+紧凑存储的内存占用与一致性测试
+
+1. 价格按 0.2 的最小变动价位生成, 分别用 float64, float32 和 price_decimals=1 的 int32 存储 100k 根 K 线,
+   输出各自的内存占用, 以及读取收盘价 (转为 float64) 后的 talib 指标与 float64 存储的差异\n
+2. 对比追加和读取 (转 float64) 的耗时, 环形缓冲 KLineRingSeries 同样对比
+
+运行: python benchmarks/bench_compact.py [bars]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import talib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_series import make_bars  # noqa: E402
+from series import KLineRingSeries, KLineSeries  # noqa: E402
+
+MODES = {
+    "float64": {},
+    "float32": {"compact": True},
+    "int32 x10": {"price_decimals": 1}
+}
+
+
+def tick_bars(count: int) -> tuple:
+    """价格取整到 0.2 的合成 K 线"""
+    open, high, low, close, volume, _datetime, open_interest = make_bars(count)
+    open, high, low, close = (np.round(column * 5) / 5 for column in (open, high, low, close))
+    return open, high, low, close, volume, _datetime, open_interest
+
+
+def fill(series: KLineSeries, bars: tuple) -> float:
+    start = time.perf_counter()
+    for row in zip(*bars):
+        series.append(*row)
+    return time.perf_counter() - start
+
+
+def main(count: int = 100000) -> None:
+    bars = tick_bars(count)
+    baseline = None
+
+    for mode, kwargs in MODES.items():
+        series = KLineSeries(capacity=count, **kwargs)
+        cost = fill(series, bars)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            series.close
+        read_cost = (time.perf_counter() - start) / 100 * 1e6
+
+        start = time.perf_counter()
+        for _ in range(100):
+            series.update_last(*(column[-1] for column in bars))
+            series.close
+        reread_cost = (time.perf_counter() - start) / 100 * 1e6
+
+        indicators = np.concatenate([
+            talib.SMA(series.close, 20), talib.EMA(series.close, 12),
+            talib.ATR(series.high, series.low, series.close, 14), series.volume
+        ])
+        if baseline is None:
+            baseline = indicators
+            assert np.array_equal(series.close, bars[3]) and np.array_equal(series.volume, bars[4])
+        elif "price_decimals" in kwargs:
+            assert np.array_equal(indicators, baseline, equal_nan=True), f"{mode} 指标与 float64 存储不一致"
+
+        usage = series.memory_usage()
+        difference = np.nanmax(np.abs(indicators - baseline))
+        print(
+            f"{mode:>10}: {usage['nbytes'] / 2 ** 20:6.2f}MB (float64 {usage['float64'] / 2 ** 20:6.2f}MB, "
+            f"节省 {1 - usage['nbytes'] / usage['float64']:5.1%}), 转换副本 {usage['decoded'] / 2 ** 20:5.2f}MB, "
+            f"追加 {cost / count * 1e6:5.2f}us/根, 读取收盘价 {read_cost:7.1f}us (缓存), "
+            f"写入后读取 {reread_cost:7.1f}us, 指标最大误差 {difference:.2e}"
+        )
+
+    for mode, kwargs in MODES.items():
+        ring = KLineRingSeries(1000, **kwargs)
+        start = time.perf_counter()
+        for row in zip(*bars[:6]):
+            ring.append(*row)
+            ring.window("close")
+        cost = (time.perf_counter() - start) / count * 1e6
+
+        assert np.allclose(ring.window("close"), bars[3][-1000:], rtol=1e-7)
+        usage = ring.memory_usage()
+        print(
+            f"{mode:>10} 环形缓冲 1000 根: {usage['nbytes'] / 1024:6.1f}KB (float64 {usage['float64'] / 1024:6.1f}KB), "
+            f"追加并读取 {cost:5.2f}us/根"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
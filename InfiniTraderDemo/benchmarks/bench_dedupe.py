@@ -0,0 +1,77 @@
+"""
+K 线去重的一致性校验和耗时对比
+
+原 CtaTemplate.deleteDuplicate 用 reduce 和 y in x 逐个比较字典, 为 O(n^2),
+新实现 history.dedupe_bars 按 (date, time) 哈希去重, 逐段输入, 为 O(n)
+
+1. 各段边界重叠一根 K 线, 结果与原实现一致\n
+2. 重叠的 K 线在较新的一段中数据不同时, 以较新的一段为准\n
+3. 输出 30 天 (约 10k 根) 和 100k 根 K 线的耗时, 原实现只测试一部分再按平方外推
+
+运行: python benchmarks/bench_dedupe.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import reduce
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import dedupe_bars, merge_chunks  # noqa: E402
+
+
+def delete_duplicate(lst: list) -> list:
+    """原 CtaTemplate.deleteDuplicate"""
+    func = lambda x, y: x if y in x else x + [y]  # noqa: E731
+    return reduce(func, [[], ] + lst)
+
+
+def make_chunks(count: int, size: int = 1000) -> list:
+    """从最早到最近排列的各段升序 K 线, 相邻两段重叠一根"""
+    start = datetime(2024, 1, 2, 9, 1)
+    bars = []
+    for i in range(count):
+        _datetime = start + timedelta(minutes=i)
+        bars.append({
+            "date": _datetime.strftime("%Y%m%d"),
+            "time": _datetime.strftime("%H:%M:%S"),
+            "datetime": _datetime,
+            "open": 3500.0 + i % 13,
+            "close": 3501.0 + i % 11,
+            "volume": i % 50
+        })
+    return [bars[max(0, i - 1):i + size] for i in range(0, count, size)]
+
+
+def main() -> None:
+    chunks = make_chunks(3500, size=500)
+    expected = delete_duplicate(merge_chunks(chunks[::-1]))
+    assert list(dedupe_bars(chunks)) == expected
+    assert list(dedupe_bars(iter(chunks))) == expected
+
+    newer = [chunk[:] for chunk in chunks]
+    newer[1][0] = {**newer[1][0], "close": -1.0}
+    result = list(dedupe_bars(newer))
+    assert len(result) == len(expected) and result[len(chunks[0]) - 1]["close"] == -1.0
+    print(f"{len(chunks)} 段 {len(expected)} 根: 结果与原实现一致, 重叠的 K 线以较新的一段为准")
+
+    for count in (10000, 100000):
+        chunks = make_chunks(count)
+        bars = merge_chunks(chunks[::-1])
+
+        start = time.perf_counter()
+        result = list(dedupe_bars(chunks))
+        hash_cost = time.perf_counter() - start
+        assert len(result) == count
+
+        sample = min(count, 3000)
+        start = time.perf_counter()
+        delete_duplicate(bars[:sample])
+        reduce_cost = (time.perf_counter() - start) * (count / sample) ** 2
+
+        print(f"{count:>7} 根: dedupe_bars {hash_cost * 1000:8.2f}ms, 原实现外推约 {reduce_cost:8.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+kernels 向量化实现与原逐元素 Python 实现的结果校验和耗时对比
+
+原实现为 ArrayManager / Indicators 中的 arr_max, xmax, xmin, sma1, kdj,
+分别在 1k, 10k, 100k 根 K 线下对比
+
+运行: python benchmarks/bench_kernels.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import talib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kernels  # noqa: E402
+
+
+def arr_max_loop(*array: np.ndarray) -> np.ndarray:
+    return np.array(list(map(max, zip(*array))))
+
+
+def xmax_loop(arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
+    return np.array(list(map(max, zip(arr1[1:], arr2[:-1]))))
+
+
+def xmin_loop(arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
+    return np.array(list(map(min, zip(arr1[1:], arr2[:-1]))))
+
+
+def sma1_loop(arr: np.ndarray, n: int, m: int, inity: int) -> np.ndarray:
+    y = inity
+    result = []
+    for x in arr:
+        if np.isnan(x):
+            continue
+        y = (m * x + (n - m) * y) / n
+        result.append(y)
+    return np.array(result)
+
+
+def kdj_loop(close, high, low, n=9, s=3) -> tuple:
+    """ctaTemplate.ArrayManager.kdj"""
+    hhv, llv = talib.MAX(high, n), talib.MIN(low, n)
+    shl = hhv - llv
+    scl = close - llv
+    shl = shl[~np.isnan(shl)]
+    scl = scl[~np.isnan(scl)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsv = 100 * scl / shl
+    k = sma1_loop(rsv, s, 1, 50)
+    d = sma1_loop(k, s, 1, 50)
+    return k, d, 3 * k - 2 * d
+
+
+def make_bars(count: int) -> tuple:
+    rng = np.random.default_rng(0)
+    close = 4000 + rng.normal(0, 3, count).cumsum()
+    high = close + rng.random(count) * 5
+    low = close - rng.random(count) * 5
+    high[: count // 50] = low[: count // 50] = close[: count // 50] = 4000
+    """开头一段价格不变, 覆盖最高价等于最低价时 RSV 为 nan 的情况"""
+    high[[3, 7]] = np.nan
+    return high, low, close
+
+
+def timeit(func, *args, repeat: int = 3) -> tuple:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main() -> None:
+    print(f"{'bars':>7} {'kernel':<8} {'loop(ms)':>10} {'numpy(ms)':>10} {'speedup':>8}")
+
+    for count in (1000, 10000, 100000):
+        high, low, close = make_bars(count)
+        cases = {
+            "arr_max": (arr_max_loop, kernels.arr_max, (high - low, abs(close - low), high)),
+            "xmax": (xmax_loop, kernels.xmax, (high, low)),
+            "xmin": (xmin_loop, kernels.xmin, (low, high)),
+            "sma1": (sma1_loop, kernels.sma1, (close - 4000, 3, 1, 50)),
+            "kdj": (
+                kdj_loop,
+                lambda c, h, l: kernels.kdj_sma(c, talib.MAX(h, 9), talib.MIN(l, 9), 3),
+                (close, high, low)
+            )
+        }
+
+        for name, (loop, kernel, args) in cases.items():
+            expected, loop_time = timeit(loop, *args)
+            result, kernel_time = timeit(kernel, *args)
+
+            assert np.allclose(expected, result, rtol=1e-9, atol=1e-9, equal_nan=True), f"{name} 结果不一致"
+            print(f"{count:>7} {name:<8} {loop_time:>10.3f} {kernel_time:>10.3f} {loop_time / kernel_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+秒级 KLineGenerator 单 tick 耗时测试
+
+分别以 1s, 5s, 30s 周期合成 K 线, 按 tick 数分段统计每个 tick 的平均耗时,
+耗时应不随已处理 tick 数增长
+
+需在无限易 Python 环境中运行 (依赖 core, ctaEngine)
+
+运行: python benchmarks/bench_kline_generator.py [ticks]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import KLineGenerator  # noqa: E402
+from vtObject import TickData  # noqa: E402
+
+
+def make_ticks(count: int) -> list:
+    """每秒 2 个 tick, 每 97 个 tick 插入一段 3 秒的断档, 每 50 个 tick 插入同一秒的密集 tick"""
+    ticks, _datetime, volume = [], datetime(2024, 1, 2, 9, 0, 0), 1000
+
+    for i in range(count):
+        _datetime += timedelta(milliseconds=0 if i % 50 == 0 else 500)
+        if i % 97 == 0:
+            _datetime += timedelta(seconds=3)
+        volume += i % 3
+
+        tick = TickData()
+        tick.__dict__.update(
+            symbol="rb2410",
+            exchange="SHFE",
+            lastPrice=3500.0 + i % 7,
+            volume=volume,
+            openInterest=100000,
+            datetime=_datetime,
+            date=_datetime.strftime("%Y%m%d"),
+            time=_datetime.strftime("%X")
+        )
+        ticks.append(tick)
+
+    return ticks
+
+
+def main(count: int = 200000, segments: int = 4) -> None:
+    ticks = make_ticks(count)
+    size = count // segments
+
+    for seconds in (1, 5, 30):
+        klines = []
+        generator = KLineGenerator(callback=klines.append, seconds=seconds)
+
+        costs = []
+        for i in range(segments):
+            start = time.perf_counter()
+            for tick in ticks[i * size:(i + 1) * size]:
+                generator.tick_to_kline(tick)
+            costs.append((time.perf_counter() - start) / size * 1e6)
+
+        segment_text = "  ".join(f"{cost:6.2f}" for cost in costs)
+        print(f"{seconds:>2}s K 线 {len(klines):>6} 根, 分段单 tick 耗时(us): {segment_text}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
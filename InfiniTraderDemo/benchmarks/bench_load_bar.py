@@ -0,0 +1,171 @@
+"""
+CtaTemplate.loadBar 分段获取历史 K 线的一致性校验和耗时对比
+
+用本地的 ctaEngine 替身 LocalEngine 代替行情接口, getKLineData 每次调用固定延迟, 返回开始时间之前
+最近若干个交易日的 1 分钟 K 线, 开始时间包含与不包含两种情况都校验, 替身的日历包含节假日, loadBar 使用的日历不包含
+
+1. 原实现逐段获取, 下一段从上一段最早的一根 K 线往前获取\n
+2. 新实现 fetch_history 按交易日历预先计算各段的开始时间, 用线程池同时获取, 核对各段边界, 不一致时重新计划剩余的段\n
+两者去重后的 K 线必须完全一致, 并输出不同线程数下的耗时
+
+运行: python benchmarks/bench_load_bar.py [latency_ms]
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import dedupe_bars, fetch_history, split_days  # noqa: E402
+from sessions import SessionCalendar, product_sessions, session_bar_times  # noqa: E402
+
+SYMBOL, EXCHANGE = "rb2410", "SHFE"
+
+
+class LocalEngine(object):
+    """
+    ctaEngine 替身, 只实现 getKLineData
+    ----
+        按交易时段生成 now 之前 60 天的 1 分钟 K 线, K 线时间为周期结束时间, 价格由时间决定,
+        同一根 K 线在不同的请求中完全相同
+
+    Args:
+        now: 当前时间\n
+        latency: 每次调用的延迟秒数\n
+        holidays: 节假日\n
+        inclusive: 返回的 K 线是否包含开始时间的 K 线
+    """
+
+    def __init__(self, now: datetime, latency: float, holidays: tuple = (), inclusive: bool = True) -> None:
+        self.latency = latency
+        self.inclusive = inclusive
+        self.calendar = SessionCalendar(product_sessions(SYMBOL), holidays)
+        self.calls = 0
+        self.concurrency = 0
+        self.max_concurrency = 0
+        self._lock = threading.Lock()
+
+        times = session_bar_times(now - timedelta(days=60), now, 60, product_sessions(SYMBOL))
+        self.times = [
+            _datetime for _datetime in times.astype(datetime)
+            if self.calendar.is_trading(_datetime - timedelta(seconds=1))
+        ]
+        self.trading_days = [self.calendar.trading_day(_datetime - timedelta(seconds=1)) for _datetime in self.times]
+
+    def _bar(self, index: int) -> dict:
+        _datetime: datetime = self.times[index]
+        price = 3500 + (int(_datetime.timestamp()) // 60) % 97
+        return {
+            "symbol": SYMBOL,
+            "exchange": EXCHANGE,
+            "date": _datetime.strftime("%Y%m%d"),
+            "time": _datetime.strftime("%H:%M:%S"),
+            "datetime": _datetime,
+            "open": price,
+            "high": price + 2,
+            "low": price - 2,
+            "close": price + 1,
+            "volume": 10,
+            "openInterest": 1000
+        }
+
+    def getKLineData(self, symbol, exchange, start_date, days, count, start_time="23:59:59", style=1) -> list:
+        """开始时间之前最近 days 个交易日的 K 线, 升序"""
+        with self._lock:
+            self.calls += 1
+            self.concurrency += 1
+            self.max_concurrency = max(self.max_concurrency, self.concurrency)
+
+        time.sleep(self.latency)
+
+        anchor = datetime.strptime(f"{start_date} {start_time}", "%Y%m%d %H:%M:%S")
+        end = int(np.searchsorted(
+            np.array(self.times, dtype="datetime64[us]"),
+            np.datetime64(anchor, "us"),
+            "right" if self.inclusive else "left"
+        ))
+        wanted = sorted(set(self.trading_days[:end]))[-days:]
+        bars = [self._bar(i) for i in range(end) if self.trading_days[i] in wanted]
+
+        with self._lock:
+            self.concurrency -= 1
+
+        return bars
+
+
+def dedupe(bars: list) -> list:
+    """按时间去重, 保留第一次出现的 K 线"""
+    seen, result = set(), []
+    for bar in bars:
+        if (key := (bar["date"], bar["time"])) not in seen:
+            seen.add(key)
+            result.append(bar)
+    return result
+
+
+def serial(engine: LocalEngine, days: int, now: datetime) -> list:
+    """原 loadBar 的逐段获取"""
+    bars_list = []
+    start_date, start_time = now.strftime("%Y%m%d"), now.strftime("%H:%M:%S")
+    for _days in split_days(days):
+        bars = engine.getKLineData(SYMBOL, EXCHANGE, start_date, _days, 0, start_time, 1)
+        bars.reverse()
+        bars_list.extend(bars)
+        start_date, start_time = bars[-1]["date"], bars[-1]["time"]
+    return dedupe(bars_list[::-1])
+
+
+def concurrent(engine: LocalEngine, days: int, now: datetime, workers: int) -> list:
+    """新 loadBar 的预先分段, 同时获取"""
+    fetch = lambda start_date, start_time, _days: engine.getKLineData(  # noqa: E731
+        SYMBOL, EXCHANGE, start_date, _days, 0, start_time, 1
+    )
+    return list(dedupe_bars(reversed(fetch_history(days, now, SessionCalendar.for_instrument(SYMBOL), fetch, workers))))
+
+
+def main(latency: float = 0.2) -> None:
+    holidays = (date(2024, 4, 4), date(2024, 4, 5))
+
+    for now in (datetime(2024, 4, 26, 14, 20, 30), datetime(2024, 4, 26, 21, 40), datetime(2024, 4, 27, 10)):
+        for inclusive in (True, False):
+            engine = LocalEngine(now, latency=0, holidays=holidays, inclusive=inclusive)
+            for days in (1, 2, 3, 4, 7, 13, 30):
+                expected = serial(engine, days, now)
+                result = concurrent(engine, days, now, workers=4)
+                assert result == expected, f"{now} {days} 天: {len(result)} 根 != 原实现 {len(expected)} 根"
+
+                times = [bar["datetime"] for bar in result]
+                assert times == sorted(times)
+
+                """不包含开始时间时各段不重叠, 正好是 days 个交易日"""
+                trading_days = {engine.calendar.trading_day(t - timedelta(seconds=1)) for t in times}
+                assert inclusive or len(trading_days) == days
+
+    print("当前时间为日盘, 夜盘, 周末, 1 ~ 30 天, 开始时间包含与不包含, 预先分段的结果与逐段获取一致")
+
+    now = datetime(2024, 4, 26, 14, 20, 30)
+    for _holidays in ((), holidays):
+        engine = LocalEngine(now, latency=latency, holidays=_holidays)
+        print(f"\n每次请求延迟 {latency * 1000:.0f}ms, {'日历缺少 2 天节假日' if _holidays else '日历正确'}:")
+
+        start = time.perf_counter()
+        expected = serial(engine, 30, now)
+        print(f"逐段获取 30 天 {len(expected)} 根, {engine.calls} 次请求: {time.perf_counter() - start:6.2f}s")
+
+        for workers in (1, 2, 4, 10):
+            engine.calls = engine.max_concurrency = 0
+            start = time.perf_counter()
+            result = concurrent(engine, 30, now, workers)
+            assert result == expected
+            print(
+                f"{workers:>2} 个线程 {engine.calls} 次请求 (最大并发 {engine.max_concurrency}): "
+                f"{time.perf_counter() - start:6.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.2)
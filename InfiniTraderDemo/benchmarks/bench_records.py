@@ -0,0 +1,177 @@
+"""
+槽 (__slots__) 存储的 Tick 和 K 线记录 (CompactTickData, CompactKLineData) 的兼容性校验, 构造耗时和内存对比
+
+对照为 vtObject 中类属性声明默认值的 dataclass (VtTickData, KLineData)
+
+1. 通过 __dict__.update, __dict__ = d, from_dict 和关键字参数写入的记录, 各个字段的读取, __dict__, str 的 JSON,
+   pickle 和 copy 的结果与 dataclass 一致, 未声明的字段同样可以读取, dataclass 的 pickle 可以由槽记录读取\n
+2. 从引擎的 K 线字典 (缺少 vtSymbol 等字段, 多出 open_interest) 和完整的 Tick 字典构造, 对比 dataclass 的 __dict__.update,
+   槽记录的 __dict__.update 和 from_dict 的耗时, 以及读取字段和 str 的耗时\n
+3. 用 tracemalloc 统计每个对象的内存 (包括实例字典, 不包括共享的字段值)
+
+运行: python benchmarks/bench_records.py [count]
+"""
+import copy
+import gc
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vtObject import CompactKLineData, CompactTickData, KLineData, VtTickData  # noqa: E402
+
+
+def make_bar(index: int) -> dict:
+    """ctaEngine.getKLineData 的 K 线字典, 持仓量的键为 open_interest"""
+    _datetime = datetime(2024, 1, 2, 9) + timedelta(minutes=index)
+    return {
+        "date": _datetime.strftime("%Y%m%d"),
+        "time": _datetime.strftime("%H:%M:%S"),
+        "datetime": _datetime,
+        "open": 3500.0 + index % 7,
+        "high": 3503.0 + index % 7,
+        "low": 3498.0 + index % 7,
+        "close": 3501.0 + index % 7,
+        "volume": 100.0 + index % 13,
+        "open_interest": 100000.0
+    }
+
+
+def make_tick(index: int) -> dict:
+    """包含全部字段的 Tick 字典"""
+    _datetime = datetime(2024, 1, 2, 9) + timedelta(milliseconds=500 * index)
+    tick = {
+        key: value + index % 7 if isinstance(value, (int, float)) else value
+        for key, value in CompactTickData._defaults.items()
+    }
+    tick.update(
+        symbol="rb2410",
+        exchange="SHFE",
+        vtSymbol="rb2410.SHFE",
+        volume=1000 + index,
+        datetime=_datetime,
+        date=_datetime.strftime("%Y%m%d"),
+        time=_datetime.strftime("%H:%M:%S.%f")[:-5]
+    )
+    return tick
+
+
+def legacy(cls: type, payload: dict):
+    record = cls()
+    record.__dict__.update(payload)
+    return record
+
+
+def assert_same(record, expected) -> None:
+    """字段, __dict__, str, pickle 和 copy 与 dataclass 一致, __dict__ 和 str 另外包含未赋值的字段"""
+    defaults = type(record)._defaults
+    assert all(getattr(record, key) == getattr(expected, key, defaults[key]) for key in defaults), f"{record}"
+    assert all(getattr(record, key) == value for key, value in expected.__dict__.items())
+
+    """__dict__ 和 str 包含全部字段, 未赋值的为默认值"""
+    fields = dict(defaults, **expected.__dict__)
+    assert record.__dict__ == fields and dict(record.__dict__) == fields and len(record.__dict__) == len(fields)
+    assert json.loads(str(record)) == json.loads(json.dumps(fields, default=str))
+    assert json.loads(str(expected)).items() <= json.loads(str(record)).items()
+    assert pickle.loads(pickle.dumps(record)) == record == copy.copy(record) == copy.deepcopy(record)
+
+
+def check_consistency() -> None:
+    for cls, legacy_cls, payload in ((CompactKLineData, KLineData, make_bar(1)), (CompactTickData, VtTickData, make_tick(1))):
+        expected = legacy(legacy_cls, payload)
+
+        record = cls()
+        record.__dict__.update(payload)
+        assert_same(record, expected)
+        assert_same(cls.from_dict(payload), expected)
+        assert_same(cls(**payload), expected)
+
+        record = cls.from_dict({"close": 1.0, "lastPrice": 1.0, "symbol": "ag2412"})
+        record.__dict__ = payload
+        assert_same(record, expected)
+
+        """未赋值的字段为默认值, 属性赋值后 __dict__ 同步"""
+        record, expected = cls(), legacy_cls()
+        assert_same(record, expected)
+        record.symbol = expected.symbol = "rb2410"
+        assert_same(record, expected)
+
+        """dataclass 的 pickle 状态 (实例字典) 可以由槽记录读取"""
+        expected = legacy(legacy_cls, payload)
+        record = cls.__new__(cls)
+        record.__setstate__(pickle.loads(pickle.dumps(expected)).__dict__)
+        assert_same(record, expected)
+
+    kline = CompactKLineData.from_dict(make_bar(1), {"exchange": "SHFE", "symbol": "rb2410"})
+    assert kline.open_interest == 100000.0 and kline.openInterest == 0 and kline.symbol == "rb2410"
+
+    """未声明的字段保存在 _extra 中"""
+    kline.__dict__.update(turnover=1.0)
+    assert kline.turnover == 1.0 and kline.__dict__["turnover"] == 1.0 and json.loads(str(kline))["turnover"] == 1.0
+    assert pickle.loads(pickle.dumps(kline)).turnover == 1.0
+
+    """copy_from 复制全部字段, 包括未声明的字段"""
+    other = CompactKLineData()
+    other.copy_from(kline)
+    assert other == kline
+
+    print("__dict__.update, __dict__ = d, from_dict, 关键字参数: 字段, __dict__, str, pickle 和 copy 与 dataclass 一致")
+
+
+def best(func, count: int) -> float:
+    """3 次取最快, 每个对象的纳秒数, 与 timeit 相同计时时关闭垃圾回收"""
+    costs = []
+    gc.disable()
+    try:
+        for _ in range(3):
+            start = time.perf_counter()
+            func()
+            costs.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(costs) / count * 1e9
+
+
+def memory(func) -> float:
+    """func 返回的对象列表中每个对象的字节数"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = func()
+    size = (tracemalloc.get_traced_memory()[0] - before) / len(records)
+    tracemalloc.stop()
+    return size
+
+
+def bench(name: str, cls: type, legacy_cls: type, payloads: list, field: str) -> None:
+    count = len(payloads)
+
+    cases = {
+        "dataclass __dict__.update": lambda: [legacy(legacy_cls, payload) for payload in payloads],
+        "槽 __dict__.update": lambda: [legacy(cls, payload) for payload in payloads],
+        "槽 from_dict": lambda: list(map(cls.from_dict, payloads))
+    }
+
+    print(f"\n{count} 个{name}, 构造耗时和每个对象的内存 (3 次取最快):")
+    for case, func in cases.items():
+        print(f"{case:>26}: {best(func, count):6.0f}ns/个  {memory(func):6.0f}B/个")
+
+    old, new = cases["dataclass __dict__.update"](), cases["槽 from_dict"]()
+    for case, records in (("dataclass", old), ("槽", new)):
+        read = best(lambda: [getattr(record, field) for record in records], count)
+        dump = best(lambda: [str(record) for record in records[:count // 10]], count // 10)
+        print(f"{case:>26}: 读取 {field} {read:4.0f}ns/个  str {dump:6.0f}ns/个")
+
+
+def main(count: int = 100000) -> None:
+    check_consistency()
+    bench("K 线字典", CompactKLineData, KLineData, [make_bar(index) for index in range(count)], "close")
+    bench("Tick 字典", CompactTickData, VtTickData, [make_tick(index) for index in range(count)], "lastPrice")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,145 @@
+"""
+历史 K 线按段回放 (replay) 的一致性校验和耗时对比
+
+1. BarChunk.klines 转换的 K 线对象与原来逐根 __dict__.update 的结果完全相同, BarView 的各个属性与 K 线对象一致,
+   loadBar 的 K 线字典 (持仓量为 openInterest) 和 KLineProducer.worker 的 K 线字典 (持仓量为 open_interest) 都校验\n
+2. 回调读取开高低收和成交量时, 对比逐根创建 K 线对象, 逐根 BarView, 按段读取列 (向量化) 的耗时\n
+3. KLineProducer.worker 推送历史 K 线, 对比 views 为 False 与 True 的耗时, 两者的序列和指标必须一致
+
+运行: python benchmarks/bench_replay.py [bars]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_series import make_bars  # noqa: E402
+from replay import iter_klines, iter_views, replay  # noqa: E402
+from utils import KLineProducer  # noqa: E402
+from vtObject import KLineData  # noqa: E402
+
+FIELDS = ("symbol", "exchange", "date", "time", "datetime", "open", "high", "low", "close", "volume", "openInterest")
+
+
+def make_records(count: int, open_interest: str = "openInterest") -> list:
+    """合成的 K 线字典, 与 ctaEngine.getKLineData 的字段相同, 持仓量的键为 open_interest"""
+    open, high, low, close, volume, _, oi = make_bars(count)
+    start = datetime(2024, 1, 2, 9)
+    records = []
+    for i in range(count):
+        _datetime = start + timedelta(minutes=i)
+        records.append({
+            "date": _datetime.strftime("%Y%m%d"),
+            "time": _datetime.strftime("%H:%M:%S"),
+            "datetime": _datetime,
+            "open": float(open[i]),
+            "high": float(high[i]),
+            "low": float(low[i]),
+            "close": float(close[i]),
+            "volume": float(volume[i]),
+            open_interest: float(oi[i])
+        })
+    return records
+
+
+def legacy(records: list, **extra) -> list:
+    """原来逐根创建 K 线对象的做法, 给定 extra 时与 KLineProducer.worker 相同, 否则与 loadBar 相同"""
+    klines = []
+    for record in records:
+        kline = KLineData()
+        if extra:
+            kline.__dict__.update(dict(extra, **record, openInterest=record["open_interest"]))
+        else:
+            kline.__dict__.update(record)
+        klines.append(kline)
+    return klines
+
+
+def check_consistency() -> None:
+    for open_interest, extra in (("openInterest", {}), ("open_interest", {"exchange": "SHFE", "symbol": "rb2410"})):
+        records = make_records(3000, open_interest)
+        expected = legacy(records, **extra)
+        chunks = list(replay(records, 1000, extra, open_interest))
+
+        assert [kline.__dict__ for kline in iter_klines(chunks)] == [kline.__dict__ for kline in expected]
+        for view, kline in zip(iter_views(chunks), expected):
+            assert all(getattr(view, name) == getattr(kline, name) for name in FIELDS), f"{view} != {kline}"
+            assert view.to_kline().__dict__ == kline.__dict__
+            assert view.vtSymbol == kline.vtSymbol == ""
+
+        assert np.array_equal(np.concatenate([chunk.column("close") for chunk in chunks]), [k.close for k in expected])
+
+    print("按段回放转换的 K 线对象与逐根创建完全相同, BarView 的属性与 K 线对象一致")
+
+
+def bench_callbacks(count: int) -> None:
+    records = make_records(count)
+    total = [0.0]
+
+    def on_bar(bar) -> None:
+        total[0] += bar.open + bar.high + bar.low + bar.close + bar.volume
+
+    cases = {
+        "逐根创建 K 线对象": lambda: [on_bar(kline) for kline in legacy(records)],
+        "replay + klines": lambda: [on_bar(kline) for kline in iter_klines(replay(records))],
+        "replay + BarView": lambda: [on_bar(view) for view in iter_views(replay(records))],
+        "replay 按段读取列": lambda: [
+            total.__setitem__(0, total[0] + sum(
+                chunk.column(name).sum() for name in ("open", "high", "low", "close", "volume")
+            ))
+            for chunk in replay(records)
+        ]
+    }
+
+    print(f"\n{count} 根 K 线, 回调读取开高低收和成交量 (3 次取最快):")
+    results = {}
+    for name, func in cases.items():
+        costs = []
+        for _ in range(3):
+            total[0] = 0.0
+            start = time.perf_counter()
+            func()
+            costs.append(time.perf_counter() - start)
+        cost = min(costs)
+        results[name] = total[0]
+        print(f"{name:>16}: {cost * 1000:8.1f}ms  {cost / count * 1e9:6.0f}ns/根")
+
+    values = list(results.values())
+    assert np.allclose(values, values[0], rtol=1e-9)
+
+
+def bench_producer(count: int) -> None:
+    records = make_records(count, "open_interest")
+    received = []
+    results = []
+    print(f"\nKLineProducer.worker 推送 {count} 根历史 K 线:")
+
+    for views in (False, True):
+        producer = KLineProducer("SHFE", "rb2410", callback=lambda kline: received.append(kline.close),
+                                 history=False, views=views)
+        producer._get_data = lambda: records
+
+        start = time.perf_counter()
+        producer.worker()
+        cost = time.perf_counter() - start
+
+        results.append((producer.close.copy(), producer.volume.copy(), producer.streaming.sma(20)))
+        print(f"views={views!s:>5}: {cost * 1000:8.1f}ms  {cost / count * 1e6:6.2f}us/根")
+
+    (close, volume, sma), (_close, _volume, _sma) = results
+    assert np.array_equal(close, _close) and np.array_equal(volume, _volume) and sma == _sma
+    assert received[:count] == received[count:]
+
+
+def main(count: int = 100000) -> None:
+    check_consistency()
+    bench_callbacks(count)
+    bench_producer(count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
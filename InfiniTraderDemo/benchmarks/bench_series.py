@@ -0,0 +1,64 @@
+"""
+KLineSeries 追加性能测试
+
+对比 np.append 逐根追加与 KLineSeries 预分配追加 100k 根 K 线的耗时
+
+运行: python benchmarks/bench_series.py [bars]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series import KLineSeries  # noqa: E402
+
+
+def make_bars(count: int) -> tuple:
+    """生成随机游走的合成 K 线"""
+    rng = np.random.default_rng(0)
+    close = 4000 + rng.standard_normal(count).cumsum()
+    open = np.roll(close, 1)
+    high = np.maximum(open, close) + rng.random(count)
+    low = np.minimum(open, close) - rng.random(count)
+    volume = rng.integers(1, 500, count).astype(np.float64)
+    _datetime = np.datetime64("2024-01-02T09:00") + np.arange(count).astype("timedelta64[m]")
+    open_interest = 100000 + rng.integers(-50, 50, count).cumsum().astype(np.float64)
+    return open, high, low, close, volume, _datetime, open_interest
+
+
+def bench_np_append(bars: tuple) -> float:
+    """原 KLineProducer.append_data 的做法"""
+    columns = [np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0, "datetime64[us]")]
+    start = time.perf_counter()
+    for row in zip(*bars[:6]):
+        for i, value in enumerate(row):
+            columns[i] = np.append(columns[i], value)
+    return time.perf_counter() - start
+
+
+def bench_series(bars: tuple) -> float:
+    series = KLineSeries()
+    start = time.perf_counter()
+    for row in zip(*bars):
+        series.append(*row)
+    return time.perf_counter() - start
+
+
+def main(count: int = 100000) -> None:
+    bars = make_bars(count)
+
+    series_time = bench_series(bars)
+    print(f"KLineSeries.append  {count:>7} 根: {series_time:8.3f}s  {series_time / count * 1e6:8.2f}us/根")
+
+    #: np.append 为 O(n^2), 只测试一部分再按平方外推, 避免等待过久
+    sample = min(count, 20000)
+    append_time = bench_np_append(tuple(column[:sample] for column in bars))
+    estimate = append_time * (count / sample) ** 2
+    print(f"np.append           {sample:>7} 根: {append_time:8.3f}s  (外推 {count} 根约 {estimate:.1f}s)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
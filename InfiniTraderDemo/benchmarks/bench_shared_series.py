@@ -0,0 +1,112 @@
+"""
+SharedKLineSeries 写进程生命周期校验, 挂载耗时和内存测试
+
+1. 写进程存活时可以挂载, 正常关闭或异常退出 (不调用 close) 后不再挂载, 下一个进程可以成为写进程,
+   替换文件时仍映射旧文件的进程继续读到旧数据, 已有存活的写进程时不能再创建\n
+2. 对比每个策略进程各自持有 K 线字典列表, 与只读挂载共享映射文件两种方式,
+   单个额外策略进程的启动耗时 (不含网络获取) 和 Python 堆内存
+
+运行: python benchmarks/bench_shared_series.py [bars]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series import SharedKLineSeries  # noqa: E402
+
+
+def make_klines(count: int) -> list:
+    start = datetime(2024, 1, 2, 9, 0)
+    return [
+        {
+            "open": 3500.0 + i % 13,
+            "high": 3510.0 + i % 13,
+            "low": 3490.0 + i % 13,
+            "close": 3505.0 + i % 13,
+            "volume": float(i % 500),
+            "datetime": start + timedelta(minutes=i),
+            "open_interest": 100000.0 + i
+        }
+        for i in range(count)
+    ]
+
+
+def crash_writer(path: str) -> None:
+    """子进程成为写进程, 写入后不调用 close 直接退出"""
+    writer = SharedKLineSeries.create(path)
+    writer.extend(make_klines(100))
+    os._exit(0)
+
+
+def check_lifecycle(root: str) -> None:
+    path = os.path.join(root, "SHFE.rb2410.M1.kline")
+    klines = make_klines(300)
+
+    writer = SharedKLineSeries.create(path)
+    writer.extend(klines[:100])
+    reader = SharedKLineSeries.attach(path)
+    assert reader is not None and len(reader) == 100
+    assert SharedKLineSeries.create(path) is None, "已有存活的写进程时不能再创建"
+
+    writer.close()
+    assert SharedKLineSeries.attach(path) is None, "写进程关闭后不应再挂载"
+
+    if os.name != "nt":
+        """Windows 下旧文件仍被映射时不能替换"""
+        writer = SharedKLineSeries.create(path)
+        assert writer is not None and len(writer) == 0
+        writer.extend(klines[100:])
+        assert len(reader) == 100 and len(reader.snapshot()["close"]) == 100
+        assert len(SharedKLineSeries.attach(path)) == 200
+        writer.close()
+    reader.close()
+
+    process = multiprocessing.Process(target=crash_writer, args=(path,))
+    process.start()
+    process.join()
+    assert SharedKLineSeries.attach(path) is None, "写进程异常退出后不应再挂载"
+    writer = SharedKLineSeries.create(path)
+    assert writer is not None and len(writer) == 0
+    writer.close()
+
+    print("写进程存活时挂载, 关闭或异常退出后不再挂载, 下一个进程重新成为写进程, 仍映射旧文件的进程读到旧数据")
+
+
+def measure(func) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def main(count: int = 14400) -> None:
+    check_lifecycle(tempfile.mkdtemp())
+
+    path = os.path.join(tempfile.mkdtemp(), "SHFE.rb2410.M1.kline")
+    writer = SharedKLineSeries.create(path, capacity=count)
+    writer.extend(make_klines(count))
+
+    _, dict_time, dict_size = measure(lambda: make_klines(count))
+    shared, attach_time, attach_size = measure(lambda: SharedKLineSeries.attach(path))
+    _, snapshot_time, snapshot_size = measure(shared.snapshot)
+
+    print(f"{count} 根 K 线")
+    print(f"进程内字典列表: {dict_time * 1000:8.2f}ms  {dict_size / 1024 / 1024:8.2f}MB")
+    print(f"共享文件挂载:   {attach_time * 1000:8.2f}ms  {attach_size / 1024 / 1024:8.2f}MB")
+    print(f"挂载后取副本:   {snapshot_time * 1000:8.2f}ms  {snapshot_size / 1024 / 1024:8.2f}MB")
+
+    shared.close()
+    writer.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 14400)
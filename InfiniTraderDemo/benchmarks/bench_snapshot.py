@@ -0,0 +1,218 @@
+"""
+K 线和指标状态快照 (SnapshotStore) 的一致性校验和耗时对比
+
+1. KLineProducer 写入历史 K 线, 注册增量指标和声明的指标, 在有正在走的 K 线时保存快照, 恢复到新的 KLineProducer 后
+   序列, talib 指标, 增量指标和声明的指标一致, 之后继续写入相同的 K 线也一致, 紧凑存储同样校验\n
+2. MinKLineGenerator 在 K 线中间停止 (stop_push_scheduler 保存快照), 新的生成器恢复快照后继续合成,
+   推送的 K 线和最终的状态与不停止的生成器完全一致; 依赖无限易环境 (core, apscheduler), 导入失败时跳过\n
+3. 输出不同历史长度下快照的大小, 在 tick 线程复制状态的耗时, 保存 (pickle 和写入, 后台线程) 和恢复的耗时,
+   以及不使用快照时逐根推送和批量预热重建的耗时 (不含获取历史 K 线); 后台写入的快照与同步写入的一致
+
+运行: python benchmarks/bench_snapshot.py [bars]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_replay import make_records  # noqa: E402
+from bench_warmup import DECLARATIONS, assert_same, live, load  # noqa: E402
+from replay import BarChunk  # noqa: E402
+from snapshot import SnapshotStore  # noqa: E402
+from suite import EXCHANGE, INSTRUMENT, make_ticks, synthetic_ticks  # noqa: E402
+from validate_streaming import QUERIES  # noqa: E402
+from vtObject import KLineData  # noqa: E402
+
+
+def build(records: list, warmup: int = 0, **kwargs):
+    """历史 K 线写入新的 KLineProducer, 注册增量指标和声明的指标"""
+    from utils import KLineProducer
+
+    producer = KLineProducer(EXCHANGE, INSTRUMENT, history=False, warmup=warmup, **kwargs)
+    load(producer, records)
+    producer.worker()
+    register(producer)
+    return producer
+
+
+def register(producer) -> None:
+    producer.indicator_set = producer.declare(DECLARATIONS)
+    producer.indicator_set.values()
+    for query in QUERIES.values():
+        query(producer.streaming)
+
+
+def state(producer) -> dict:
+    """序列, talib 指标, 增量指标和声明的指标"""
+    indicator_set = producer.indicator_set
+    return {
+        "series": [getattr(producer, name).copy() for name in ("open", "high", "low", "close", "volume",
+                                                                "datetime", "open_interest")],
+        "talib": [producer.sma(20, array=True), producer.macd(array=True), producer.kdj(array=True)],
+        "streaming": {name: query(producer.streaming) for name, query in QUERIES.items()},
+        "declared": {name: indicator_set.array(name) for name in indicator_set.names}
+    }
+
+
+def kline(record: dict) -> KLineData:
+    _kline = KLineData()
+    _kline.__dict__.update(record, openInterest=record["open_interest"])
+    return _kline
+
+
+def check_producer(root: str) -> None:
+    records = make_records(3100, "open_interest")
+    for record in records:
+        """价格取 0.5 的整数倍, 紧凑存储时与原价格完全一致"""
+        record.update({name: round(record[name] * 2) / 2 for name in ("open", "high", "low", "close")})
+    history, forming, after = records[:3000], records[3000], records[3001:]
+
+    for kwargs in ({}, {"compact": True}, {"price_decimals": 1}):
+        store = SnapshotStore(os.path.join(root, f"producer_{len(kwargs)}_{kwargs.get('price_decimals')}"))
+        expected = build(history, **kwargs)
+        live(expected, records[2990:3000])
+        expected.update_provisional(kline(dict(forming, close=forming["close"] + 1)))
+
+        store.write(EXCHANGE, INSTRUMENT, "M1", expected.snapshot())
+        result = build([], **kwargs)
+        result.restore(store.read(EXCHANGE, INSTRUMENT, "M1")[0])
+        register(result)
+
+        """快照不包含正在走的 K 线"""
+        expected.update(kline(forming))
+        result.update(kline(forming))
+        assert_same(state(expected), state(result), str(kwargs))
+
+        live(expected, after)
+        live(result, after)
+        assert_same(state(expected), state(result), f"{kwargs} live")
+
+    print("有正在走的 K 线时保存快照, 普通和紧凑存储: 恢复后的序列和指标一致, 之后的实时更新也一致")
+
+
+def check_generator(root: str) -> None:
+    try:
+        from utils import MinKLineGenerator
+    except ImportError as error:
+        print(f"跳过 MinKLineGenerator 的校验: {error}")
+        return
+
+    ticks = make_ticks(synthetic_ticks(1200))
+    first_minute = ticks[0].datetime.replace(second=0, microsecond=0)
+    history = make_records(2000, "open_interest")
+    shift = first_minute - history[-1]["datetime"]
+    for record in history:
+        """历史 K 线的最后一根与第一个 tick 在同一分钟, 不触发补数据"""
+        record["datetime"] += shift
+
+    def generator(store: SnapshotStore = None, fill: bool = True):
+        pushed = []
+        _generator = MinKLineGenerator(
+            callback=lambda bar: pushed.append((bar.datetime, bar.open, bar.high, bar.low, bar.close, bar.volume)),
+            exchange=EXCHANGE,
+            instrument=INSTRUMENT,
+            real_time_callback=lambda bar: None,
+            snapshot=store
+        )
+        if fill:
+            _generator.producer.series.clear()
+            _generator.producer.ingest(BarChunk(history, open_interest="open_interest"))
+        register(_generator.producer)
+
+        """只比较由 tick 合成的 K 线, 不包括创建时推送的历史 K 线"""
+        pushed.clear()
+        return _generator, pushed
+
+    expected, expected_pushed = generator()
+    for tick in ticks:
+        expected.tick_to_kline(tick)
+    expected.stop_push_scheduler()
+
+    for stop in (130, 479, 601):
+        """
+        停止在 K 线中间, K 线的最后一个 tick 之前, 以及新 K 线的第一个 tick 之后, 重启后的第一个 tick 与快照中
+        正在合成的 K 线属于同一根 K 线; 不属于同一根时该 K 线由补数据获取, 需要行情接口, 这里不校验
+        """
+        store = SnapshotStore(os.path.join(root, f"generator_{stop}"))
+        first, pushed = generator(store)
+        for tick in ticks[:stop]:
+            first.tick_to_kline(tick)
+        first.stop_push_scheduler()
+
+        second, _pushed = generator(store, fill=False)
+        assert second._resumed is not None, "当前交易日的快照应当被恢复"
+        for tick in ticks[stop:]:
+            second.tick_to_kline(tick)
+        second.stop_push_scheduler()
+
+        assert pushed + _pushed == expected_pushed, f"第 {stop} 个 tick 之后停止, 推送的 K 线不一致"
+        assert_same(state(expected.producer), state(second.producer), f"stop {stop}")
+
+    print(f"在 130, 479, 601 个 tick 之后停止并恢复: 推送的 {len(expected_pushed)} 根 K 线和最终状态与不停止时一致")
+
+    """快照不是当前交易日写入的不使用"""
+    store.write(EXCHANGE, INSTRUMENT, "M1", {}, written=datetime.now() - timedelta(days=7))
+    assert generator(store)[0]._resumed is None
+    print("不是当前交易日写入的快照不恢复")
+
+
+def bench(root: str, sizes: tuple) -> None:
+    print("\n快照大小和耗时 (不含获取历史 K 线):")
+    store = SnapshotStore(os.path.join(root, "timing"))
+
+    for size in sizes:
+        records = make_records(size, "open_interest")
+        producer = build(records)
+
+        start = time.perf_counter()
+        snapshot = producer.snapshot()
+        copy_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.write(EXCHANGE, INSTRUMENT, "M1", snapshot)
+        write_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored = build([])
+        restored.restore(store.read(EXCHANGE, INSTRUMENT, "M1")[0])
+        register(restored)
+        read_cost = time.perf_counter() - start
+
+        """后台写入后继续追加 K 线, 写入的仍是调用时的状态"""
+        background = SnapshotStore(os.path.join(root, "background"))
+        background.write_async(EXCHANGE, INSTRUMENT, "M1", producer.snapshot())
+        for record in records[-50:]:
+            producer.update(kline(dict(record, datetime=record["datetime"] + timedelta(days=365))))
+        background.flush()
+        assert background.error is None
+        _restored = build([])
+        _restored.restore(background.read(EXCHANGE, INSTRUMENT, "M1")[0])
+        register(_restored)
+        assert_same(state(restored), state(_restored), f"{size} 根后台写入")
+
+        costs = {}
+        for name, warmup in (("逐根推送", None), ("批量预热", 0)):
+            start = time.perf_counter()
+            build(records, warmup)
+            costs[name] = time.perf_counter() - start
+
+        size_mb = os.path.getsize(store.path(EXCHANGE, INSTRUMENT, "M1")) / 2 ** 20
+        print(
+            f"{size:>7} 根: 快照 {size_mb:6.2f}MB, 复制 {copy_cost * 1000:5.1f}ms, 保存 {write_cost * 1000:7.1f}ms, "
+            f"恢复 {read_cost * 1000:7.1f}ms, "
+            + ", ".join(f"{name} {cost * 1000:8.1f}ms" for name, cost in costs.items())
+        )
+
+
+def main(count: int = 100000) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        check_producer(root)
+        check_generator(root)
+        bench(root, (count // 10, count))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,220 @@
+"""
+KLineProducer 历史 K 线批量预热 (warmup) 的一致性校验和耗时对比
+
+1. warmup 为 None 时逐根推送全部历史 K 线, 每根都触发回调计算指标; warmup 为 N 时之前的 K 线按列一次写入序列,
+   回调只收到最后 N 根, 两者结束时的序列, talib 指标, 增量指标和声明的指标 (IndicatorSet) 必须一致,
+   之后继续追加, 更新和正在走的 K 线也一致, 紧凑存储同样校验\n
+2. 历史 K 线大部分在共享文件 (SharedKLineSeries) 中时, 预热结果与全部在本地时一致\n
+3. StreamingIndicator.seed 向量化初始化的结果与逐根 update 一致\n
+4. 回调计算 DemoKC 所用的指标 (talib 全量计算或声明的指标), 对比逐根推送与预热的耗时
+
+运行: python benchmarks/bench_warmup.py [bars]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_replay import make_records  # noqa: E402
+from indicator_graph import IndicatorSet  # noqa: E402
+from series import SharedKLineSeries  # noqa: E402
+from streaming import StreamingIndicator, StreamingIndicators  # noqa: E402
+from utils import KLineProducer  # noqa: E402
+from validate_streaming import QUERIES, Source, make_bars  # noqa: E402
+from vtObject import KLineData  # noqa: E402
+
+DECLARATIONS = "macd=macd(); atr=atr(26); kdj=kdj(9, 3, 3); ma0=sma(5); ma1=sma(20); kc=keltner(20); std=std(20)"
+"""DemoKC 所用指标的声明"""
+
+
+class Strategy(object):
+    """
+    模拟策略, 回调中计算指标
+    ----
+        mode 为 talib 时每根 K 线用 Indicators 全量计算, 为 declared 时读取声明的指标
+
+    Args:
+        mode: talib 或 declared
+    """
+
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self.indicators: KLineProducer = None
+        self.indicator_set = None
+        self.received = []
+        self.values = None
+
+    def callback(self, kline: KLineData) -> None:
+        self.received.append(kline.datetime)
+        self.calc_indicator()
+
+    def calc_indicator(self) -> None:
+        if self.mode == "talib":
+            producer = self.indicators
+            self.values = (producer.macd(), producer.atr(26), producer.kdj(), producer.sma(5), producer.sma(20),
+                           producer.keltner(20), producer.std(20))
+        else:
+            self.values = self.indicator_set.values()
+
+
+def load(producer: KLineProducer, records: list, shared: SharedKLineSeries = None) -> None:
+    """替换 K 线容器中 producer 的历史 K 线, shared 为 records 之前的共享 K 线"""
+    container, key = producer.kline_container, (producer.exchange, producer.instrument, producer.style.name)
+    container.all_kline.setdefault(producer.exchange, {}).setdefault(producer.instrument, {})[key[2]] = records
+    container.shared_kline.pop(key, None)
+    if shared is not None:
+        container.shared_kline[key] = shared
+
+
+def run(records: list, mode: str, warmup: int = None, shared: SharedKLineSeries = None, **kwargs) -> Strategy:
+    strategy = Strategy(mode)
+    producer = KLineProducer("SHFE", "rb2410", callback=strategy.callback, history=False, warmup=warmup, **kwargs)
+    load(producer, records, shared)
+    strategy.indicator_set = producer.declare(DECLARATIONS)
+    producer.worker()
+    return strategy
+
+
+def snapshot(producer: KLineProducer, strategy: Strategy) -> dict:
+    streaming = {name: query(producer.streaming) for name, query in QUERIES.items()}
+    declared = {name: strategy.indicator_set.array(name) for name in strategy.indicator_set.names}
+    return {
+        "series": [getattr(producer, name).copy() for name in ("open", "high", "low", "close", "volume",
+                                                                "datetime", "open_interest")],
+        "talib": [producer.sma(20, array=True), producer.macd(array=True), producer.kdj(array=True)],
+        "streaming": streaming,
+        "declared": declared,
+        "last": strategy.indicator_set.values(shift=1)
+    }
+
+
+def assert_same(expected, result, path: str = "") -> None:
+    if isinstance(expected, dict):
+        assert expected.keys() == result.keys(), path
+        for key in expected:
+            assert_same(expected[key], result[key], f"{path}.{key}")
+    elif isinstance(expected, (list, tuple)) and not isinstance(expected, np.ndarray):
+        assert len(expected) == len(result), path
+        for index, (_expected, _result) in enumerate(zip(expected, result)):
+            assert_same(_expected, _result, f"{path}[{index}]")
+    elif np.asarray(expected).dtype.kind == "M":
+        assert np.array_equal(expected, result), path
+    else:
+        assert np.allclose(expected, result, rtol=1e-7, atol=1e-7, equal_nan=True), path
+
+
+def live(producer: KLineProducer, records: list) -> None:
+    """历史之后继续追加, 更新最后一根和正在走的 K 线"""
+    for index, record in enumerate(records):
+        kline = KLineData()
+        kline.__dict__.update(record, openInterest=record["open_interest"])
+        if index % 3 == 0:
+            producer.update_provisional(kline)
+        producer.update(kline)
+        if index % 4 == 0:
+            kline.close += 1
+            producer.update(kline)
+
+
+def check_consistency() -> None:
+    records = make_records(3060, "open_interest")
+    for record in records:
+        """价格取 0.5 的整数倍, 紧凑存储时与原价格完全一致"""
+        record.update({name: round(record[name] * 2) / 2 for name in ("open", "high", "low", "close")})
+    history, after = records[:3000], records[3000:]
+
+    for kwargs in ({}, {"compact": True}, {"price_decimals": 1}):
+        expected = run(history, "declared", **kwargs)
+        for warmup in (0, 1, 50):
+            result = run(history, "declared", warmup, **kwargs)
+
+            assert result.received == expected.received[len(expected.received) - warmup:]
+            assert_same(snapshot(expected.indicators, expected), snapshot(result.indicators, result), str(warmup))
+
+            live(expected.indicators, after)
+            live(result.indicators, after)
+            assert_same(snapshot(expected.indicators, expected), snapshot(result.indicators, result), f"{warmup} live")
+            expected = run(history, "declared", **kwargs)
+
+    print("warmup 为 0, 1, 50, 普通和紧凑存储: 序列, talib 指标, 增量指标和声明的指标与逐根推送一致, 之后的实时更新也一致")
+
+
+def check_shared() -> None:
+    records = make_records(3000, "open_interest")
+    path = os.path.join(tempfile.mkdtemp(), "SHFE.rb2410.M1.kline")
+    writer = SharedKLineSeries.create(path)
+    writer.extend(records[:2500])
+    shared = SharedKLineSeries.attach(path)
+
+    expected = run(records, "declared")
+    try:
+        for warmup in (0, 50, 1000):
+            result = run(records[2500:], "declared", warmup, shared)
+            assert result.received == expected.received[len(expected.received) - warmup:]
+            assert_same(snapshot(expected.indicators, expected), snapshot(result.indicators, result), f"{warmup} shared")
+    finally:
+        expected.indicators.kline_container.shared_kline.clear()
+        shared.close()
+        writer.close()
+
+    print("共享文件中的历史 K 线按列写入, 预热 0, 50, 1000 根的结果与全部在本地时一致")
+
+
+def check_seed() -> None:
+    """seed 与逐根 update 一致, 之后继续 update 和 replace 也一致"""
+    high, low, close = make_bars(1030)
+    original = StreamingIndicator.seed
+
+    def loop(self: StreamingIndicator, *inputs: np.ndarray) -> list:
+        return [self.update(*row) for row in zip(*(column.tolist() for column in inputs))]
+
+    def results(size: int) -> dict:
+        streaming = StreamingIndicators(Source(high[:size], low[:size], close[:size]))
+        indicator_set = IndicatorSet(streaming, DECLARATIONS)
+        query = lambda: {  # noqa: E731
+            **{name: query(streaming) for name, query in QUERIES.items()},
+            **{name: indicator_set.array(name) for name in indicator_set.names}
+        }
+
+        seeded = query()
+        for i in range(size, size + 30):
+            streaming.update(high[i] + 1, low[i] - 1, close[i])
+            streaming.replace(high[i], low[i], close[i])
+        return {"seeded": seeded, "updated": query()}
+
+    for size in (0, 1, 5, 30, 1000):
+        StreamingIndicator.seed = loop
+        try:
+            expected = results(size)
+        finally:
+            StreamingIndicator.seed = original
+        assert_same(expected, results(size), str(size))
+
+    print("seed 向量化初始化与逐根 update 一致, 之后的 update 和 replace 也一致")
+
+
+def bench(count: int) -> None:
+    records = make_records(count, "open_interest")
+    print(f"\n{count} 根历史 K 线, 回调计算 DemoKC 的指标:")
+
+    for mode in ("talib", "declared"):
+        for warmup in (None, 1):
+            start = time.perf_counter()
+            strategy = run(records, mode, warmup)
+            cost = time.perf_counter() - start
+            print(f"{mode:>8} warmup={warmup!s:>4}: {cost * 1000:9.1f}ms  回调 {len(strategy.received)} 次")
+
+
+def main(count: int = 10000) -> None:
+    check_consistency()
+    check_shared()
+    check_seed()
+    bench(count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
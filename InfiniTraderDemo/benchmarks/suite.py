@@ -0,0 +1,433 @@
+"""
+指标与 K 线流水线基准测试
+
+覆盖 Indicators 的各个指标方法, ArrayManager.updateBar, KLineProducer.update,
+KLineGenerator.tick_to_kline 和 MinKLineGenerator.tick_to_kline, 逐次调用计时,
+按历史长度输出单次调用耗时的分位数 (p50, p90, p99, 最大值) 和吞吐量 (次/秒)
+
+1. 默认使用固定随机种子的合成数据, 也可以用 --bars / --ticks 指定录制的 csv 数据, 不需要连接行情\n
+2. --save 把结果写入基准文件 (默认 benchmarks/baseline.json), 随代码一起提交\n
+3. --compare 与基准文件对比 p50, 超过 --threshold 倍的用例标记为退化, 存在退化时退出码为 1\n
+4. 依赖无限易环境 (core, ctaEngine) 或界面库的用例在导入失败时跳过, 并输出原因
+
+录制数据格式:
+    K 线: datetime,open,high,low,close,volume[,open_interest], 时间为 ISO 格式\n
+    tick: datetime,lastPrice,volume,openInterest, volume 为累计成交量
+
+运行:
+    python benchmarks/suite.py\n
+    python benchmarks/suite.py --sizes 1000 10000 --only indicators --compare\n
+    python benchmarks/suite.py --bars rb_m1.csv --ticks rb_tick.csv --save
+"""
+import argparse
+import csv
+import fnmatch
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import talib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import Indicators  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SIZES = (1000, 10000, 100000)
+
+EXCHANGE, INSTRUMENT = "SHFE", "rb2410"
+
+INDICATOR_CALLS = {
+    "sma": lambda o: o.sma(20),
+    "ema": lambda o: o.ema(12),
+    "std": lambda o: o.std(20),
+    "bbi": lambda o: o.bbi(),
+    "cci": lambda o: o.cci(14),
+    "rsi": lambda o: o.rsi(14),
+    "hhv": lambda o: o.hhv(30),
+    "llv": lambda o: o.llv(30),
+    "adx": lambda o: o.adx(14),
+    "sar": lambda o: o.sar(),
+    "kdj": lambda o: o.kdj(9, 3, 3),
+    "kd": lambda o: o.kd(),
+    "macdext": lambda o: o.macdext(),
+    "macd": lambda o: o.macd(12, 26, 9),
+    "atr": lambda o: o.atr(14),
+    "boll": lambda o: o.boll(20),
+    "donchian": lambda o: o.donchian(20)
+}
+"""Indicators 的用例, 取最后一根 K 线的指标, 即策略中最常见的用法"""
+
+
+class Bars(object):
+    """K 线数据, 各列为 numpy 数组"""
+
+    columns = ("open", "high", "low", "close", "volume", "datetime", "open_interest")
+
+    def __init__(self, **columns: np.ndarray) -> None:
+        for name in self.columns:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @classmethod
+    def synthetic(cls, count: int, seed: int = 0) -> "Bars":
+        """随机游走的 1 分钟 K 线, 价格取整到 0.2"""
+        rng = np.random.default_rng(seed)
+        close = np.round((4000 + rng.normal(0, 3, count).cumsum()) * 5) / 5
+        open = np.r_[close[0], close[:-1]]
+        return cls(
+            open=open,
+            high=np.maximum(open, close) + np.round(rng.random(count) * 25) / 5,
+            low=np.minimum(open, close) - np.round(rng.random(count) * 25) / 5,
+            close=close,
+            volume=rng.integers(1, 500, count).astype(np.float64),
+            datetime=np.datetime64("2024-01-02T09:01") + np.arange(count).astype("timedelta64[m]"),
+            open_interest=(100000 + rng.integers(-50, 50, count).cumsum()).astype(np.float64)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Bars":
+        """读取录制的 K 线 csv"""
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        columns = {
+            name: np.array([float(row.get(name) or 0) for row in rows])
+            for name in cls.columns if name != "datetime"
+        }
+        columns["datetime"] = np.array([row["datetime"] for row in rows], dtype="datetime64[us]")
+        return cls(**columns)
+
+    def head(self, count: int) -> "Bars":
+        return Bars(**{name: getattr(self, name)[:count] for name in self.columns})
+
+    def klines(self, start: int = 0, stop: int = None) -> list:
+        """转为 KLineData 列表"""
+        from vtObject import KLineData
+
+        result = []
+        for i in range(start, len(self) if stop is None else stop):
+            kline = KLineData()
+            kline.__dict__.update(
+                exchange=EXCHANGE,
+                symbol=INSTRUMENT,
+                open=float(self.open[i]),
+                high=float(self.high[i]),
+                low=float(self.low[i]),
+                close=float(self.close[i]),
+                volume=float(self.volume[i]),
+                openInterest=float(self.open_interest[i]),
+                datetime=self.datetime[i].astype(datetime)
+            )
+            result.append(kline)
+        return result
+
+
+def synthetic_ticks(count: int, seed: int = 0) -> List[Tuple[datetime, float, int, int]]:
+    """每 0.5 秒一个 tick, 从 09:00:00 开始, 返回 (时间, 最新价, 累计成交量, 持仓量)"""
+    rng = np.random.default_rng(seed)
+    prices = np.round((4000 + rng.normal(0, 0.4, count).cumsum()) * 5) / 5
+    volumes = 1000 + rng.integers(1, 20, count).cumsum()
+    start = datetime(2024, 1, 2, 9, 0, 0)
+    return [
+        (start + timedelta(milliseconds=500 * i), float(prices[i]), int(volumes[i]), 100000)
+        for i in range(count)
+    ]
+
+
+def load_ticks(path: str) -> List[Tuple[datetime, float, int, int]]:
+    """读取录制的 tick csv"""
+    with open(path, newline="") as f:
+        return [
+            (
+                datetime.fromisoformat(row["datetime"]),
+                float(row["lastPrice"]),
+                int(float(row["volume"])),
+                int(float(row.get("openInterest") or 0))
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def make_ticks(rows: List[Tuple[datetime, float, int, int]]) -> list:
+    """转为 TickData 列表"""
+    from vtObject import TickData
+
+    ticks = []
+    for _datetime, price, volume, open_interest in rows:
+        tick = TickData()
+        tick.__dict__.update(
+            symbol=INSTRUMENT,
+            exchange=EXCHANGE,
+            lastPrice=price,
+            volume=volume,
+            openInterest=open_interest,
+            datetime=_datetime,
+            date=_datetime.strftime("%Y%m%d"),
+            time=_datetime.strftime("%X")
+        )
+        ticks.append(tick)
+    return ticks
+
+
+class Source(Indicators):
+    """用 numpy 数组代替 KLineProducer 的数据序列"""
+
+    def __init__(self, bars: Bars) -> None:
+        super().__init__()
+        for name in Bars.columns:
+            setattr(self, name, getattr(bars, name))
+
+
+class Data(object):
+    """一次运行用到的数据, 用例按需取用"""
+
+    def __init__(self, bars: Bars, ticks: List[Tuple[datetime, float, int, int]], calls: int) -> None:
+        self.bars = bars
+        self.ticks = ticks
+        self.calls = calls
+
+
+Step = Callable[[int], Any]
+Setup = Callable[[Data, int], Step]
+
+CASES: Dict[str, Tuple[Setup, bool]] = {}
+"""用例名称: (准备函数, 是否按历史长度分别测试), 准备函数返回第 i 次调用执行的函数"""
+
+
+def case(name: str, sized: bool = True) -> Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        CASES[name] = (setup, sized)
+        return setup
+    return register
+
+
+def _indicator_case(method: str) -> Setup:
+    def setup(data: Data, size: int) -> Step:
+        source = Source(data.bars.head(size))
+        call = INDICATOR_CALLS[method]
+
+        def step(i: int) -> Any:
+            """每次调用前使缓存失效, 测量的是重新计算的耗时"""
+            source.invalidate()
+            return call(source)
+
+        return step
+    return setup
+
+
+for _method in INDICATOR_CALLS:
+    case(f"indicators.{_method}")(_indicator_case(_method))
+
+
+def _history(data: Data, size: int) -> Tuple[Bars, list]:
+    """前 size 根为历史 K 线, 之后 calls 根转为 KLineData 逐次写入"""
+    if len(data.bars) < size + data.calls:
+        raise ValueError(f"K 线数量 {len(data.bars)} 少于历史长度与调用次数之和 {size + data.calls}")
+    return data.bars.head(size), data.bars.klines(size, size + data.calls)
+
+
+@case("ArrayManager.updateBar")
+def setup_array_manager(data: Data, size: int) -> Step:
+    from ctaTemplate import ArrayManager
+
+    history, klines = _history(data, size)
+    array_manager = ArrayManager(size=size)
+    for kline in history.klines():
+        array_manager.updateBar(kline)
+
+    return lambda i: array_manager.updateBar(klines[i])
+
+
+def _fill(producer: Any, history: Bars) -> None:
+    """把历史 K 线直接写入 KLineProducer 的数据序列"""
+    producer.series.clear()
+    for row in zip(*(getattr(history, name) for name in Bars.columns)):
+        producer.series.append(*row)
+    producer.streaming.reset()
+    producer.invalidate()
+
+
+@case("KLineProducer.update")
+def setup_producer(data: Data, size: int) -> Step:
+    from utils import KLineProducer
+
+    history, klines = _history(data, size)
+    producer = KLineProducer(EXCHANGE, INSTRUMENT, history=False)
+    _fill(producer, history)
+
+    return lambda i: producer.update(klines[i])
+
+
+@case("KLineGenerator.tick_to_kline", sized=False)
+def setup_kline_generator(data: Data, size: int) -> Step:
+    from utils import KLineGenerator
+
+    ticks = make_ticks(data.ticks[:data.calls])
+    generator = KLineGenerator(callback=lambda kline: None, seconds=5)
+
+    return lambda i: generator.tick_to_kline(ticks[i])
+
+
+@case("MinKLineGenerator.tick_to_kline")
+def setup_min_kline_generator(data: Data, size: int) -> Step:
+    """第一个 tick 在准备阶段处理, 之后每个 tick 实时推送正在走的 K 线 (update_provisional)"""
+    from utils import MinKLineGenerator
+
+    ticks = make_ticks(data.ticks[:data.calls + 1])
+    first_minute = np.datetime64(ticks[0].datetime.replace(second=0, microsecond=0), "us")
+
+    generator = MinKLineGenerator(
+        callback=lambda kline: None,
+        exchange=EXCHANGE,
+        instrument=INSTRUMENT,
+        real_time_callback=lambda kline: None
+    )
+
+    """历史 K 线的最后一根与第一个 tick 在同一分钟, 不触发补数据"""
+    history = data.bars.head(size)
+    history.datetime = history.datetime - history.datetime[-1] + first_minute
+    _fill(generator.producer, history)
+
+    generator.tick_to_kline(ticks[0])
+    generator.stop_push_scheduler()
+
+    return lambda i: generator.tick_to_kline(ticks[i + 1])
+
+
+def measure(step: Step, calls: int) -> np.ndarray:
+    """逐次计时, 返回每次调用的纳秒数, 计时期间关闭垃圾回收"""
+    costs = np.empty(calls, dtype=np.int64)
+    clock = time.perf_counter_ns
+
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(calls):
+            start = clock()
+            step(i)
+            costs[i] = clock() - start
+    finally:
+        gc.enable()
+
+    return costs
+
+
+def summarize(costs: np.ndarray) -> Dict[str, float]:
+    """耗时统计, 单位为微秒, 吞吐量为每秒调用次数"""
+    p50, p90, p99 = np.percentile(costs, (50, 90, 99)) / 1000
+    return {
+        "calls": len(costs),
+        "mean_us": round(float(costs.mean()) / 1000, 3),
+        "p50_us": round(float(p50), 3),
+        "p90_us": round(float(p90), 3),
+        "p99_us": round(float(p99), 3),
+        "max_us": round(float(costs.max()) / 1000, 3),
+        "throughput": round(len(costs) / (costs.sum() / 1e9), 1)
+    }
+
+
+def environment(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "talib": talib.__version__,
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+        "calls": args.calls,
+        "bars": args.bars or "synthetic",
+        "ticks": args.ticks or "synthetic"
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    sizes = sorted(args.sizes)
+    bars = Bars.load(args.bars) if args.bars else Bars.synthetic(max(sizes) + args.calls)
+    ticks = load_ticks(args.ticks) if args.ticks else synthetic_ticks(args.calls + 1)
+    data = Data(bars, ticks, args.calls)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, (setup, sized) in CASES.items():
+        if args.only and not any(fnmatch.fnmatch(name, f"{pattern}*") for pattern in args.only):
+            continue
+
+        for size in (sizes if sized else [None]):
+            key = str(size) if sized else "-"
+            try:
+                step = setup(data, size)
+            except (ImportError, ValueError) as e:
+                print(f"{name:<34} {key:>7}  跳过: {e}")
+                results.setdefault(name, {})[key] = {"skipped": str(e)}
+                continue
+
+            stats = summarize(measure(step, args.calls))
+            results.setdefault(name, {})[key] = stats
+            print(
+                f"{name:<34} {key:>7}  p50 {stats['p50_us']:10.2f}us  p90 {stats['p90_us']:10.2f}us  "
+                f"p99 {stats['p99_us']:10.2f}us  max {stats['max_us']:10.2f}us  {stats['throughput']:>12,.0f} 次/秒"
+            )
+
+    return {"environment": environment(args), "results": results}
+
+
+def compare(report: Dict[str, Any], path: str, threshold: float) -> int:
+    """与基准文件对比 p50, 返回退化的用例数量"""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = 0
+    print(f"\n与基准 {path} 对比 (p50, 超过 {threshold:.2f} 倍视为退化):")
+
+    for name, sizes in report["results"].items():
+        for key, stats in sizes.items():
+            base = baseline.get(name, {}).get(key, {})
+            if "p50_us" not in stats or "p50_us" not in base:
+                continue
+
+            ratio = stats["p50_us"] / base["p50_us"] if base["p50_us"] else float("inf")
+            regressed = ratio > threshold
+            regressions += regressed
+            print(
+                f"{name:<34} {key:>7}  {base['p50_us']:10.2f}us -> {stats['p50_us']:10.2f}us  "
+                f"x{ratio:5.2f}{'  退化' if regressed else ''}"
+            )
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="指标与 K 线流水线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="历史 K 线数量")
+    parser.add_argument("--calls", type=int, default=500, help="每个用例每个历史长度的调用次数")
+    parser.add_argument("--only", nargs="+", help="只运行名称以此开头的用例, 支持通配符")
+    parser.add_argument("--bars", help="录制的 K 线 csv")
+    parser.add_argument("--ticks", help="录制的 tick csv")
+    parser.add_argument("--baseline", default=BASELINE, help="基准文件路径")
+    parser.add_argument("--save", action="store_true", help="把结果写入基准文件")
+    parser.add_argument("--compare", action="store_true", help="与基准文件对比")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 超过基准的倍数视为退化")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    regressions = compare(report, args.baseline, args.threshold) if args.compare else 0
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已写入基准文件 {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
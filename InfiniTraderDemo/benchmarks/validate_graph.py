@@ -0,0 +1,113 @@
+"""
+IndicatorSet (声明式指标图) 与 Indicators (talib) 一致性校验
+
+1. 按 DemoKC 所用指标的声明 (加上共用节点的 boll, donchian, bbi 等) 逐根追加 K 线, 每根 K 线用 provisional 模拟若干个 tick,
+   每个 tick 的结果与 talib 对包含正在走的 K 线的完整序列的计算结果对比\n
+2. 输出声明的指标数量与去重后的节点数量, 以及每根 K 线计算全部指标的耗时
+
+运行: python benchmarks/validate_graph.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicator_graph import IndicatorSet  # noqa: E402
+from streaming import StreamingIndicators  # noqa: E402
+from validate_streaming import Source, make_bars  # noqa: E402
+
+PARAMS = {"N": 9, "M1": 3, "M2": 3, "N2": 26, "N1": 5, "P1": 10}
+
+DECLARATIONS = """
+    macd=macd(12, 26, 9); atr=atr(N2); kdj=kdj(N, M1, M2); ma0=sma(P1); ma1=sma(N1); kc=keltner(N)
+    boll=boll(20); dc=donchian(N); bbi(); rsi(14); ema(N); atr(N)
+"""
+
+
+def expected(source: Source) -> dict:
+    """用 Indicators 的方法计算声明的指标, keltner 由 ema 和 atr 组合"""
+    atr_n = np.append(np.nan, source.atr(PARAMS["N"], array=True)[0])
+    return {
+        "macd": source.macd(12, 26, 9),
+        "atr": source.atr(PARAMS["N2"]),
+        "kdj": source.kdj(PARAMS["N"], PARAMS["M1"], PARAMS["M2"]),
+        "ma0": source.sma(PARAMS["P1"]),
+        "ma1": source.sma(PARAMS["N1"]),
+        "kc": (
+            source.ema(PARAMS["N"]) + atr_n[-1] * 2,
+            source.ema(PARAMS["N"]) - atr_n[-1] * 2
+        ),
+        "boll": source.boll(20),
+        "dc": source.donchian(PARAMS["N"]),
+        "bbi_3_6_12_24": source.bbi(),
+        "rsi_14": source.rsi(14),
+        "ema_9": source.ema(PARAMS["N"]),
+        "atr_9": (atr_n[-1], source.atr(PARAMS["N"])[1])
+    }
+
+
+def check(name: str, want, got) -> None:
+    assert np.allclose(np.array(got, dtype=float), np.array(want, dtype=float), rtol=1e-7, atol=1e-7, equal_nan=True), (
+        f"{name} 结果不一致: {got} != {want}"
+    )
+
+
+def main(count: int = 400, ticks: int = 3) -> None:
+    high, low, close = make_bars(count)
+    rng = np.random.default_rng(4)
+
+    history = Source(high[:60], low[:60], close[:60])
+    indicators = IndicatorSet(StreamingIndicators(history), DECLARATIONS, PARAMS)
+    graph = indicators.graph
+
+    for i in range(60, count):
+        for _ in range(ticks):
+            tick = (high[i] + rng.random(), low[i] - rng.random(), close[i] + rng.normal())
+            indicators.streaming.provisional(*tick)
+
+            source = Source(*(np.append(column[:i], value) for column, value in zip((high, low, close), tick)))
+            values = indicators.values()
+            for name, want in expected(source).items():
+                check(name, want, values[name])
+
+            check("shift", Source(high[:i], low[:i], close[:i]).sma(PARAMS["P1"]), indicators.value("ma0", shift=1))
+
+        indicators.streaming.update(high[i], low[i], close[i])
+        history.high, history.low, history.close = high[:i + 1], low[:i + 1], close[:i + 1]
+
+    source = Source(high, low, close)
+    check("attribute", source.kdj(PARAMS["N"], PARAMS["M1"], PARAMS["M2"]), indicators.kdj)
+    check("array", source.macd(12, 26, 9, array=True), indicators.array("macd"))
+
+    print(
+        f"{count - 60} 根 K 线 x {ticks} 个 tick, {len(indicators.names)} 个声明的指标与 talib 一致, "
+        f"去重后 {len(graph.nodes)} 个节点"
+    )
+
+    for size in (1000, 10000, 100000):
+        high, low, close = make_bars(size + 200)
+        source = Source(high[:size], low[:size], close[:size])
+        indicators = IndicatorSet(StreamingIndicators(source), DECLARATIONS, PARAMS)
+        indicators.values()
+
+        start = time.perf_counter()
+        for i in range(size, size + 200):
+            source.high, source.low, source.close = high[:i + 1], low[:i + 1], close[:i + 1]
+            source.invalidate()
+            expected(source)
+        talib_cost = (time.perf_counter() - start) / 200 * 1e6
+
+        start = time.perf_counter()
+        for i in range(size, size + 200):
+            indicators.streaming.update(high[i], low[i], close[i])
+            indicators.values()
+        graph_cost = (time.perf_counter() - start) / 200 * 1e6
+
+        print(f"历史 {size:>6} 根: Indicators 逐个计算 {talib_cost:9.1f}us/根, 指标图 {graph_cost:7.1f}us/根")
+
+
+if __name__ == "__main__":
+    main()
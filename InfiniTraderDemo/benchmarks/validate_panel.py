@@ -0,0 +1,175 @@
+"""
+KLinePanel 与逐合约 talib 计算的一致性校验和耗时对比
+
+1. 构造上市时间不同 (历史长度不同), 部分合约没有夜盘 (时间有缺口) 的多个合约,
+   面板中每个合约的指标与该合约自己的 K 线用 talib 计算的结果逐点对比\n
+2. 对比 60 个合约逐个用 talib 计算与面板一次计算全部合约最新指标的耗时
+
+运行: python benchmarks/validate_panel.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import talib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from panel import KLinePanel  # noqa: E402
+
+
+def make_klines(count: int, seed: int, night: bool = True) -> list:
+    """1 分钟 K 线, night 为 False 时跳过 21:00 - 次日 09:00"""
+    rng = np.random.default_rng(seed)
+    close = 4000 + rng.normal(0, 3, count).cumsum()
+    high = close + rng.random(count) * 5
+    low = close - rng.random(count) * 5
+
+    klines, moment = [], datetime(2024, 1, 2, 9, 1)
+    for i in range(count):
+        if not night and (moment.hour >= 21 or moment.hour < 9):
+            moment = moment.replace(hour=9, minute=1) + timedelta(days=moment.hour >= 21)
+        klines.append({
+            "datetime": moment,
+            "open": close[i - 1] if i else close[i],
+            "high": high[i],
+            "low": low[i],
+            "close": close[i],
+            "volume": float(rng.integers(1, 100))
+        })
+        moment += timedelta(minutes=1)
+    return klines
+
+
+def talib_indicators(klines: list) -> dict:
+    high = np.array([kline["high"] for kline in klines])
+    low = np.array([kline["low"] for kline in klines])
+    close = np.array([kline["close"] for kline in klines])
+    macd, signal, hist = talib.MACD(close, 12, 26, 9)
+    tr = talib.TRANGE(high, low, close)
+    atr = np.full(len(close), np.nan)
+    atr[1:] = talib.SMA(tr[1:], 14)
+    return {
+        "sma": talib.SMA(close, 20),
+        "ema": talib.EMA(close, 12),
+        "std": talib.STDDEV(close, 20) * np.sqrt(20 / 19),
+        "rsi": talib.RSI(close, 14),
+        "hhv": talib.MAX(high, 30),
+        "llv": talib.MIN(low, 30),
+        "atr": atr,
+        "macd": macd,
+        "signal": signal,
+        "hist": hist * 2
+    }
+
+
+def panel_indicators(panel: KLinePanel, array: bool = True) -> dict:
+    macd, signal, hist = panel.macd(12, 26, 9, array=array)
+    return {
+        "sma": panel.sma(20, array=array),
+        "ema": panel.ema(12, array=array),
+        "std": panel.std(20, array=array),
+        "rsi": panel.rsi(14, array=array),
+        "hhv": panel.hhv(30, array=array),
+        "llv": panel.llv(30, array=array),
+        "atr": panel.atr(14, array=array)[0],
+        "macd": macd,
+        "signal": signal,
+        "hist": hist
+    }
+
+
+def check() -> None:
+    lengths = [3000, 2500, 40, 1, 0, 1800]
+    instruments = [f"c{i}" for i in range(len(lengths))]
+    panel = KLinePanel(instruments, capacity=64)
+
+    histories = {}
+    for i, (instrument, length) in enumerate(zip(instruments, lengths)):
+        klines = make_klines(length, seed=i, night=i % 2 == 0)
+        histories[instrument] = klines
+        panel.extend(instrument, klines[:length // 2])
+        for j, kline in enumerate(klines[length // 2:]):
+            panel.append(instrument, kline["datetime"], kline["open"] + 1, kline["high"], kline["low"], 0, 0)
+            if j % 7 == 0:
+                """中途取指标, 之后的写入 (含覆盖正在走的 K 线) 走增量递推"""
+                panel_indicators(panel)
+                panel_indicators(panel, array=False)
+            panel.append(
+                instrument, kline["datetime"], kline["open"], kline["high"],
+                kline["low"], kline["close"], kline["volume"]
+            )
+
+    result, latest = panel_indicators(panel), panel_indicators(panel, array=False)
+    for row, instrument in enumerate(instruments):
+        klines = histories[instrument]
+        assert panel.counts[row] == len(klines), f"{instrument} K 线数量不一致"
+        if not klines:
+            continue
+
+        expected = talib_indicators(klines)
+        for name, values in expected.items():
+            actual = result[name][row, :len(klines)]
+            assert np.allclose(actual, values, rtol=1e-7, atol=1e-7, equal_nan=True), f"{instrument} {name} 结果不一致"
+            assert np.isclose(latest[name][row], values[-1], equal_nan=True), f"{instrument} {name} 最新值不一致"
+
+    for values in latest.values():
+        assert values.shape == (len(instruments),) and np.isnan(values[4])
+
+    axis, aligned = panel.aligned(panel.close)
+    assert len(axis) == len(np.unique(np.concatenate([
+        np.array([kline["datetime"] for kline in klines], dtype="datetime64[us]")
+        for klines in histories.values() if klines
+    ])))
+    assert np.count_nonzero(~np.isnan(aligned)) == sum(lengths)
+
+    try:
+        panel.append("c0", datetime(2000, 1, 1), 1, 1, 1, 1)
+        raise AssertionError("早于最后一根的 K 线应抛出 ValueError")
+    except ValueError:
+        pass
+
+    print(f"{len(instruments)} 个合约 (历史长度 {lengths}, 部分无夜盘) 的指标与 talib 一致")
+
+
+def benchmark(instruments: int = 60, bars: int = 2000, rounds: int = 50) -> None:
+    histories = [make_klines(bars, seed=i) for i in range(instruments)]
+    panel = KLinePanel([f"c{i}" for i in range(instruments)], capacity=bars + rounds)
+    arrays = []
+    for i, klines in enumerate(histories):
+        panel.extend(f"c{i}", klines[:-rounds])
+        arrays.append({name: np.array([kline[name] for kline in klines]) for name in ("high", "low", "close")})
+
+    start = time.perf_counter()
+    for step in range(rounds):
+        end = bars - rounds + step + 1
+        for array in arrays:
+            high, low, close = array["high"][:end], array["low"][:end], array["close"][:end]
+            talib.SMA(close, 20)[-1], talib.EMA(close, 12)[-1], talib.RSI(close, 14)[-1]
+            talib.MAX(high, 30)[-1], talib.MIN(low, 30)[-1], talib.MACD(close, 12, 26, 9)[2][-1]
+            talib.SMA(talib.TRANGE(high, low, close)[1:], 14)[-1]
+    loop_cost = (time.perf_counter() - start) / rounds * 1000
+
+    start = time.perf_counter()
+    for step in range(rounds):
+        for i, klines in enumerate(histories):
+            kline = klines[bars - rounds + step]
+            panel.append(
+                f"c{i}", kline["datetime"], kline["open"], kline["high"],
+                kline["low"], kline["close"], kline["volume"]
+            )
+        panel.sma(20), panel.ema(12), panel.rsi(14), panel.hhv(30), panel.llv(30)
+        panel.macd(12, 26, 9), panel.atr(14)
+    panel_cost = (time.perf_counter() - start) / rounds * 1000
+
+    print(
+        f"{instruments} 个合约 x {bars} 根: 逐合约 talib {loop_cost:.2f}ms/轮, "
+        f"面板 {panel_cost:.2f}ms/轮 (含写入)"
+    )
+
+
+if __name__ == "__main__":
+    check()
+    benchmark()
@@ -0,0 +1,160 @@
+"""
+StreamingIndicators 与 Indicators (talib) 一致性校验
+
+1. 逐根追加 K 线, 每根 K 线之前先用随机价格 replace 若干次 (模拟正在走的 K 线),
+   结束后与 Indicators 对完整序列的计算结果逐点对比\n
+2. 逐 tick 用 provisional 更新正在走的 K 线, 每个 tick 的临时值与 talib 对包含该 K 线的完整序列的计算结果对比,
+   K 线走完后 update 确认\n
+3. 输出不同历史长度下, 每根 K 线取一次全部指标的耗时, 以及每个 tick 更新正在走的 K 线并取全部指标的耗时
+
+运行: python benchmarks/validate_streaming.py [bars]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import Indicators  # noqa: E402
+from streaming import StreamingIndicators  # noqa: E402
+
+
+class Source(Indicators):
+    """用 numpy 数组代替 KLineProducer 的数据序列"""
+
+    def __init__(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> None:
+        super().__init__()
+        self.high, self.low, self.close = high, low, close
+
+
+def make_bars(count: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    close = 4000 + rng.normal(0, 3, count).cumsum()
+    high = close + rng.random(count) * 5
+    low = close - rng.random(count) * 5
+    return high, low, close
+
+
+QUERIES = {
+    "sma": lambda o: o.sma(20, array=True),
+    "ema": lambda o: o.ema(12, array=True),
+    "std": lambda o: o.std(20, array=True),
+    "rsi": lambda o: o.rsi(14, array=True),
+    "hhv": lambda o: o.hhv(30, array=True),
+    "llv": lambda o: o.llv(30, array=True),
+    "atr": lambda o: o.atr(14, array=True),
+    "macd": lambda o: o.macd(12, 26, 9, array=True),
+    "kdj": lambda o: o.kdj(9, 3, 3, array=True),
+    "donchian": lambda o: o.donchian(20)
+}
+
+LAST_QUERIES = [
+    lambda o: o.sma(20),
+    lambda o: o.ema(12),
+    lambda o: o.std(20),
+    lambda o: o.rsi(14),
+    lambda o: o.hhv(30),
+    lambda o: o.llv(30),
+    lambda o: o.atr(14),
+    lambda o: o.macd(12, 26, 9),
+    lambda o: o.kdj(9, 3, 3),
+    lambda o: o.donchian(20)
+]
+"""每根 K 线取最后一根的指标, 用于计时"""
+
+
+def check(name: str, expected, result) -> None:
+    expected, result = np.atleast_2d(expected), np.atleast_2d(result)
+    assert expected.shape == result.shape, f"{name} 长度不一致: {result.shape} != {expected.shape}"
+    assert np.allclose(result, expected, rtol=1e-7, atol=1e-7, equal_nan=True), f"{name} 结果不一致"
+
+
+def check_provisional(count: int = 500, ticks: int = 4) -> None:
+    """正在走的 K 线的临时值与 talib 一致, 之前 K 线的指标 (shift=1) 不受影响"""
+    high, low, close = make_bars(count)
+    rng = np.random.default_rng(2)
+
+    streaming = StreamingIndicators(Source(high[:50], low[:50], close[:50]))
+    for query in QUERIES.values():
+        query(streaming)
+
+    for i in range(50, count):
+        for _ in range(ticks):
+            tick = (high[i] + rng.random(), low[i] - rng.random(), close[i] + rng.normal())
+            streaming.provisional(*tick)
+
+            source = Source(*(np.append(column[:i], value) for column, value in zip((high, low, close), tick)))
+            for name, query in QUERIES.items():
+                check(name, query(source), query(streaming))
+            check("shift", source.sma(20, array=True)[-2], streaming.sma(20, shift=1))
+
+        streaming.update(high[i], low[i], close[i])
+
+    talib_source = Source(high, low, close)
+    for name, query in QUERIES.items():
+        check(name, query(talib_source), query(streaming))
+
+    print(f"{count - 50} 根 K 线 x {ticks} 个 tick 的临时值与 talib 一致")
+
+
+def main(count: int = 5000) -> None:
+    high, low, close = make_bars(count)
+    rng = np.random.default_rng(1)
+
+    streaming = StreamingIndicators(Source(high[:50], low[:50], close[:50]))
+    for query in QUERIES.values():
+        """前 50 根通过回放历史数据初始化"""
+        query(streaming)
+
+    for i in range(50, count):
+        streaming.update(high[i] + 9, low[i] - 9, close[i] + 1)
+        for _ in range(rng.integers(0, 3)):
+            streaming.replace(high[i] + rng.random(), low[i] - rng.random(), close[i] + rng.random())
+        streaming.replace(high[i], low[i], close[i])
+
+    talib_source = Source(high, low, close)
+    for name, query in QUERIES.items():
+        check(name, query(talib_source), query(streaming))
+
+    print(f"{count} 根 K 线, {len(QUERIES)} 个指标与 talib 一致 (含 replace)")
+
+    for size in (1000, 10000, 100000):
+        high, low, close = make_bars(size + 200)
+        source = Source(high[:size], low[:size], close[:size])
+        streaming = StreamingIndicators(source)
+        for query in QUERIES.values():
+            query(streaming)
+
+        start = time.perf_counter()
+        for i in range(size, size + 200):
+            source.high, source.low, source.close = high[:i + 1], low[:i + 1], close[:i + 1]
+            source.invalidate()
+            for query in LAST_QUERIES:
+                query(source)
+        talib_cost = (time.perf_counter() - start) / 200 * 1e6
+
+        start = time.perf_counter()
+        for i in range(size, size + 200):
+            streaming.update(high[i], low[i], close[i])
+            for query in LAST_QUERIES:
+                query(streaming)
+        streaming_cost = (time.perf_counter() - start) / 200 * 1e6
+
+        start = time.perf_counter()
+        for i in range(200):
+            streaming.provisional(high[-1] + i % 3, low[-1] - i % 5, close[-1] + i % 7)
+            for query in LAST_QUERIES:
+                query(streaming)
+        provisional_cost = (time.perf_counter() - start) / 200 * 1e6
+
+        print(
+            f"历史 {size:>6} 根: talib 全量重算 {talib_cost:9.1f}us/根, 增量更新 {streaming_cost:7.1f}us/根, "
+            f"正在走的 K 线 {provisional_cost:7.1f}us/tick"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+    check_provisional()
@@ -0,0 +1,151 @@
+"""
+ticks_to_klines 校验
+
+用 MinKLineGenerator.tick_to_kline 逐 tick 回放同一批 tick, 推送的 K 线与批量合成结果逐根对比, 并输出两者耗时\n
+生成器创建后行情接口替换为 LocalMarketCenter (没有 K 线快照, 补数据为空, M30 及以上周期的下一根 K 线时间按自然时间计算),
+M1 ~ M15 的 K 线时间由交易时段日历 (SESSIONS) 计算; 依赖无限易环境 (core, ctaEngine), 导入失败时跳过\n
+生成器的第一个 tick 只作为成交量基准 (没有 K 线快照时不计入第一根 K 线的价格), 第一根 K 线只对比时间和成交量;
+最后一根未走完的 K 线不推送, 批量合成使用 drop_last
+
+运行:
+    python benchmarks/validate_ticks_to_klines.py                   # 合成数据
+    python benchmarks/validate_ticks_to_klines.py ticks.csv M5      # 录制数据
+
+录制数据为 csv, 表头 datetime,last_price,volume,open_interest,
+datetime 格式 2024-01-02 09:00:00.500, tick 需在 SESSIONS 的交易时段内 (不含集合竞价)
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregation import (KLINE_DTYPE, TICK_DTYPE, style_seconds,  # noqa: E402
+                         ticks_to_klines)
+from sessions import PRODUCT_SESSIONS, SessionCalendar  # noqa: E402
+from suite import EXCHANGE, INSTRUMENT, make_ticks  # noqa: E402
+
+SESSIONS = PRODUCT_SESSIONS["rb"]
+"""INSTRUMENT 的交易时段"""
+
+
+class LocalMarketCenter(object):
+    """
+    MarketCenter 替身
+    ----
+        没有 K 线快照和历史 K 线, 下一根 K 线时间按自然时间计算, 收盘时间取交易时段日历
+    """
+
+    def __init__(self, calendar: SessionCalendar) -> None:
+        self.calendar = calendar
+
+    def get_kline_snapshot(self, **kwargs) -> dict:
+        return {}
+
+    def get_kline_data(self, **kwargs) -> list:
+        return []
+
+    def get_next_gen_time(self, exchange: str, instrument: str, tick_time: datetime, style) -> datetime:
+        period = timedelta(seconds=style_seconds(style))
+        epoch = datetime(1970, 1, 1)
+        return epoch + ((tick_time.replace(microsecond=0) - epoch) // period + 1) * period
+
+    def get_avl_close_time(self, instrument: str) -> list:
+        return []
+
+    def get_close_time(self, instrument: str) -> list:
+        return self.calendar.close_time_strings()
+
+
+def load_csv(path: str) -> np.ndarray:
+    rows = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding="utf-8")
+    ticks = np.zeros(len(rows), dtype=TICK_DTYPE)
+    ticks["timestamp"] = rows["datetime"].astype("datetime64[ms]")
+    ticks["last_price"] = rows["last_price"]
+    ticks["volume"] = rows["volume"]
+    ticks["open_interest"] = rows["open_interest"]
+    return ticks
+
+
+def make_synthetic(calendar: SessionCalendar, count: int = 20000) -> np.ndarray:
+    """生成半秒一笔, 带重复成交量和收盘 tick 的合成交易日, 只保留交易时段内的 tick"""
+    rng = np.random.default_rng(0)
+    ticks = np.zeros(count, dtype=TICK_DTYPE)
+    ticks["timestamp"] = np.datetime64("2024-01-02T09:00:00.000") + np.arange(count) * 500
+    ticks["last_price"] = 4000 + rng.integers(-2, 3, count).cumsum()
+    ticks["volume"] = 1000 + (rng.integers(0, 4, count) * (rng.random(count) > 0.2)).cumsum()
+    ticks["open_interest"] = 100000 + rng.integers(-5, 6, count).cumsum()
+    return ticks[[calendar.is_trading(timestamp.astype(datetime)) for timestamp in ticks["timestamp"]]]
+
+
+def stream_klines(ticks: np.ndarray, style: str, calendar: SessionCalendar) -> np.ndarray:
+    """MinKLineGenerator.tick_to_kline 逐 tick 合成, 返回推送的 K 线"""
+    from utils import MinKLineGenerator
+    from vtObject import KLineData
+
+    pushed = []
+    generator = MinKLineGenerator(
+        callback=lambda kline: pushed.append((
+            kline.datetime, kline.open, kline.high, kline.low, kline.close, kline.volume, kline.openInterest
+        )),
+        exchange=EXCHANGE,
+        instrument=INSTRUMENT,
+        style=style,
+        sessions=calendar.sessions,
+        holidays=calendar.holidays
+    )
+    generator.market_center = LocalMarketCenter(calendar)
+
+    """最后一根已有的 K 线与第一个 tick 在同一分钟, 不触发补数据"""
+    first_minute = ticks["timestamp"][0].astype(datetime).replace(second=0, microsecond=0)
+    kline = KLineData()
+    kline.__dict__.update(open=0, high=0, low=0, close=0, volume=0, openInterest=0, datetime=first_minute)
+    generator.producer.series.clear()
+    generator.producer.append_data(kline)
+
+    rows = [
+        (tick["timestamp"].astype(datetime), float(tick["last_price"]), int(tick["volume"]), float(tick["open_interest"]))
+        for tick in ticks
+    ]
+    tick_data = make_ticks(rows)
+
+    pushed.clear()
+    for tick in tick_data:
+        generator.tick_to_kline(tick)
+    generator.stop_push_scheduler()
+
+    return np.array(pushed, dtype=KLINE_DTYPE)
+
+
+def main() -> None:
+    calendar = SessionCalendar.get(SESSIONS, holidays=())
+    ticks = load_csv(sys.argv[1]) if len(sys.argv) > 1 else make_synthetic(calendar)
+    style = sys.argv[2] if len(sys.argv) > 2 else "M1"
+
+    try:
+        start = time.perf_counter()
+        expected = stream_klines(ticks, style, calendar)
+        stream_time = time.perf_counter() - start
+    except ImportError as error:
+        print(f"跳过 MinKLineGenerator 的校验: {error}")
+        return
+
+    start = time.perf_counter()
+    result = ticks_to_klines(ticks, style, close_time=calendar.close_time_strings(), drop_last=True)
+    batch_time = time.perf_counter() - start
+
+    assert len(result) == len(expected), f"K 线数量不一致: {len(result)} != {len(expected)}"
+    for name in KLINE_DTYPE.names:
+        compared = slice(None) if name in ("datetime", "volume") else slice(1, None)
+        mismatch = np.flatnonzero(result[name][compared] != expected[name][compared]) + (compared.start or 0)
+        assert not len(mismatch), f"{name} 第 {mismatch[0]} 根不一致: {result[mismatch[0]]} != {expected[mismatch[0]]}"
+
+    print(f"{len(ticks)} tick -> {len(result)} 根 {style} K 线, 与 MinKLineGenerator 推送的 K 线逐根一致")
+    print(f"逐 tick 合成 {stream_time:.3f}s, 批量合成 {batch_time:.4f}s, 加速 {stream_time / batch_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,6 @@ import os
 import sys
 import time
 from collections import OrderedDict, defaultdict
-from functools import reduce
 from threading import Thread, Timer
 from traceback import format_exc
 from typing import Any, Dict, List, Literal, Union
@@ -26,9 +25,15 @@ from PyQt5.QtGui import QCloseEvent, QIcon
 from PyQt5.QtWidgets import QApplication, QMessageBox, QVBoxLayout, QWidget
 
 import ctaEngine  # type: ignore
+import kernels
 import utils
 from ctaBase import *
+from bar_cache import BarCache
+from history import bar_time, bar_trading_day, dedupe_bars, fetch_history
 from models import Position
+from replay import replay
+from series import KLineRingSeries
+from sessions import SessionCalendar
 from uiKLine import KLineWidget
 from vtConstant import *
 from vtObject import (AccountData, ContractData, ContractStatusData, KLineData,
@@ -46,6 +51,8 @@ class CtaTemplate(object):
     qtsp: 'QtGuiSupport' = None
 
     name: str = ""  # 策略实例名称
+    loadBarWorkers: int = 4  # loadBar 同时获取历史 K 线的线程数, 为 1 时逐段获取
+    barCache: BarCache = None  # 历史 K 线的磁盘缓存, 为 None 时不缓存, 多个策略实例和进程可以共用同一个目录
 
     def __init__(self, ctaEngine=None, setting={}):
         self.base_param_list = [
@@ -811,30 +818,52 @@ class CtaTemplate(object):
         """撤单"""
         return ctaEngine.cancelOrder(vtOrderID)
 
-    def loadDay(self, years, symbol='', exchange='', func=None):
-        """载入日K线"""
+    def loadDay(self, years, symbol='', exchange='', func=None, view=False):
+        """载入日K线, 设置 barCache 后只载入已走完的交易日, 缓存完整时不再请求, view 为 True 时 func 收到 BarView"""
         symbol = self.vtSymbol if symbol == '' else symbol
         exchange = self.exchange if exchange == '' else exchange
-        bars = ctaEngine.getKLineData(symbol, exchange, datetime.datetime.now().strftime('%Y%m%d'), 0, years)
+        now = datetime.datetime.now()
+        fetch = lambda *_: ctaEngine.getKLineData(symbol, exchange, now.strftime('%Y%m%d'), 0, years)  # noqa: E731
+
+        if self.barCache is None:
+            bars = fetch()
+        else:
+            # 日 K 线只能按年数整体获取, 缓存不完整时重新获取全部, 当前交易日的日 K 线未走完, 不缓存也不载入
+            calendar = SessionCalendar.for_instrument(symbol)
+            day_of = lambda bar: datetime.datetime.strptime(bar["date"], "%Y%m%d").date()  # noqa: E731
+            last = calendar.previous_trading_day(calendar.trading_day(now))
+            first = now.date() - datetime.timedelta(days=round(365 * years))
+
+            days = [last]
+            while (day := calendar.previous_trading_day(days[-1])) >= first:
+                days.append(day)
+
+            bars = self.barCache.load(
+                exchange, symbol, "D1", days, fetch, day_of,
+                fresh=lambda written: calendar.trading_day(written) > last,
+                now=now
+            )
+
         func = self.onBar if func is None else func
         try:
-            for d in bars:
-                bar = KLineData()
-                bar.__dict__.update(d)
-                bar.datetime = datetime.datetime.strptime(d["date"], "%Y%m%d")
-                func(bar)
+            records = (dict(d, datetime=datetime.datetime.strptime(d["date"], "%Y%m%d")) for d in bars)
+            for chunk in replay(records):
+                for bar in (chunk if view else chunk.klines()):
+                    func(bar)
         except:
             self.output('历史数据获取失败，使用实盘数据初始化')
 
     @staticmethod
     def deleteDuplicate(lst: list) -> list:
-        """对列表里的字典去重"""
-        func = lambda x, y: x if y in x else x + [y]
-        lst = reduce(func, [[], ] + lst)
-        return lst
+        """对 K 线字典列表按 (date, time) 去重, 相同时间以后出现的为准, 线性时间"""
+        return list(dedupe_bars([lst]))
 
-    def loadBar(self, days: int, symbol=None, exchange=None, func=None, qt_gui=False) -> None:
-        """载入1分钟K线，不大于30天"""
+    def loadBar(self, days: int, symbol=None, exchange=None, func=None, qt_gui=False, view=False) -> None:
+        """
+        载入1分钟K线，不大于30天
+        ----
+            历史 K 线按段回放, view 为 True 时 func 收到 BarView, 只读取 K 线数据的回调不需要逐根创建 K 线对象
+        """
         if qt_gui:
             for _ in range(5):
                 #: 如果没有 K 线 UI 没加载全, 会导致线图为空
@@ -846,43 +875,75 @@ class CtaTemplate(object):
             self.output('最多预加载30天的历史1分钟K线数据，请修改参数')
             return
 
+        func = func or self.onBar
+        bars = self.loadKLineData(days, 1, symbol, exchange)
+
+        # 处理数据
+        try:
+            for chunk in replay(bars):
+                for bar in (chunk if view else chunk.klines()):
+                    func(bar)
+        except Exception as e:
+            self.output(format_exc())
+            self.output(f'历史数据获取失败，使用实盘数据初始化 {e}')
+
+    def loadKLineData(self, days: int, style: int = 1, symbol=None, exchange=None) -> List[dict]:
+        """
+        获取最近 days 个交易日的 style 分钟 K 线
+        ----
+            设置 barCache 后先读缓存, 已缓存的交易日不再请求, 当前交易日的缓存在没有新的 K 线走完之前有效
+
+        Args:
+            days: 交易日数, 包含当前交易日\n
+            style: K 线分钟数, 与 ctaEngine.getKLineData 的 style 相同\n
+            symbol: 合约, 默认为策略合约\n
+            exchange: 交易所, 默认为策略交易所
+
+        Returns:
+            升序去重的 K 线字典列表
+        """
         symbol = symbol or self.vtSymbol
         exchange = exchange or self.exchange
-        func = func or self.onBar
 
         if not all([symbol, exchange]):
             raise TypeError("错误：交易所或合约为空！")
 
-        # 将天数切割为3天以内的单元
-        time_gap = 3
-        divisor = int(days / time_gap)
-        days_list = [time_gap] * divisor
-        if (remainder:=days % time_gap) != 0:
-            days_list.insert(0, remainder)
-
-        # 分批次把历史数据取到本地，然后统一load
-        bars_list = []
-        now_time = datetime.datetime.now()
-        start_date = now_time.strftime('%Y%m%d')
-        start_time = now_time.strftime("%H:%M:%S")
-        for _days in days_list:
-            bars: list = ctaEngine.getKLineData(symbol, exchange, start_date, _days, 0, start_time, 1)
+        now = datetime.datetime.now()
+        calendar = SessionCalendar.for_instrument(symbol)
+
+        def fetch(start_date: str, start_time: str, _days: int) -> list:
+            bars: list = ctaEngine.getKLineData(symbol, exchange, start_date, _days, 0, start_time, style)
             if not bars:
                 raise ValueError(f"错误：请检查参数是否填写正确：[{exchange} {symbol}]")
-            bars.reverse()
-            bars_list.extend(bars)
-            start_date = bars[-1].get('date')
-            start_time = bars[-1].get('time')
-
-        # 处理数据
-        try:
-            for _bar in self.deleteDuplicate(bars_list[::-1]):
-                bar = KLineData()
-                bar.__dict__.update(_bar)
-                func(bar)
-        except Exception as e:
-            self.output(format_exc())
-            self.output(f'历史数据获取失败，使用实盘数据初始化 {e}')
+            return bars
+
+        def fetch_days(_days: int, before: dict = None) -> List[dict]:
+            # 将天数切割为3天以内的单元, 按交易日历预先算出每段的开始时间
+            # 多线程同时把各段历史数据取到本地，按时间顺序逐段去重, 各段边界重叠的 K 线以较新的一段为准
+            try:
+                chunks = fetch_history(
+                    days=_days,
+                    now=bar_time(before) if before else now,
+                    calendar=calendar,
+                    fetch=fetch,
+                    max_workers=self.loadBarWorkers
+                )
+            except ValueError:
+                if before is None:
+                    raise
+                # 缓存补齐更早的交易日时已经没有更早的 K 线
+                return []
+            return list(dedupe_bars(reversed(chunks)))
+
+        if self.barCache is None:
+            return fetch_days(days)
+
+        return self.barCache.load(
+            exchange, symbol, f"M{style}", calendar.recent_trading_days(now, days), fetch_days,
+            day_of=lambda bar: bar_trading_day(bar, calendar),
+            fresh=lambda written: (end := calendar.next_bar_time(written, style)) is not None and end > now,
+            now=now
+        )
 
     def getGui(self):
         """创建界面"""
@@ -1071,8 +1132,9 @@ CtaTemplate.setQtSp() #: 启动 QT 界面
 class BarManager(object):
     """K 线合成器, 即将弃用, 请使用 MinKLineGenerator"""
 
-    def __init__(self, onBar, xmin=0, onXminBar=None):
+    def __init__(self, onBar, xmin=0, onXminBar=None, calendar=None):
         self.bar = None  # 1分钟K线对象
+        self.calendar = calendar  # 交易时段日历 SessionCalendar, 为空时按合约品种获取
         self.onBar = onBar  # 1分钟K线回调函数
 
         self.xminBar = None  # X分钟K线对象
@@ -1162,9 +1224,10 @@ class BarManager(object):
 
         # X分钟已经走完
         if str(self.xmin).isdigit():
-            # X分钟已经走完
-            minutes = 60 * bar.datetime.hour + bar.datetime.minute
-            if not minutes % self.xmin:  # 可以用X整除
+            # X分钟已经走完, 按交易时段开盘时间对齐, 午休, 小节休息和跨越午夜的夜盘同样适用
+            if self.calendar is None:
+                self.calendar = SessionCalendar.for_instrument(bar.symbol)
+            if self.calendar.is_bar_end(bar.datetime, int(self.xmin)):
                 # 生成上一X分钟K线的时间戳
                 self.xminBar.datetime = bar.datetime
                 self.xminBar.datetime = self.xminBar.datetime.replace(second=0, microsecond=0)  # 将秒和微秒设为0
@@ -1197,18 +1260,15 @@ class BarManager(object):
 class ArrayManager(object):
     """K 线序列管理工具, 即将弃用, 请使用 MinKLineGenerator"""
 
-    def __init__(self, size=1000, maxsize=None):
+    def __init__(self, size=1000, maxsize=None, compact=False, price_decimals=None):
         self.count = 0  # 缓存计数
         self.size = size  # 缓存大小
         self.maxsize = maxsize or size
         self.inited = False  # True if count>=size
 
-        self.openArray = np.zeros(self.maxsize)  # OHLC
-        self.highArray = np.zeros(self.maxsize)
-        self.lowArray = np.zeros(self.maxsize)
-        self.closeArray = np.zeros(self.maxsize)
-        self.volumeArray = np.zeros(self.maxsize)
-        self.datetimeArray = np.zeros(self.maxsize)
+        # 环形缓冲, compact 为 True 或给定价格小数位数时使用紧凑存储, 序列属性在读取时转为 float64
+        # xxxArray 可整体赋值 (写回缓冲), 非紧凑模式下也可原地修改; 紧凑模式返回只读副本
+        self.series = KLineRingSeries(self.maxsize, compact=compact, price_decimals=price_decimals)
 
     def updateBar(self, bar: KLineData) -> bool:
         """更新K线序列"""
@@ -1216,44 +1276,93 @@ class ArrayManager(object):
         if not self.inited and self.count >= self.size:
             self.inited = True
 
-        self.openArray = np.append(np.delete(self.openArray, 0), bar.open)
-        self.highArray = np.append(np.delete(self.highArray, 0), bar.high)
-        self.lowArray = np.append(np.delete(self.lowArray, 0), bar.low)
-        self.closeArray = np.append(np.delete(self.closeArray, 0), bar.close)
-        self.volumeArray = np.append(np.delete(self.volumeArray, 0), bar.volume)
-        self.datetimeArray = np.append(np.delete(self.datetimeArray, 0), bar.datetime)
+        self.series.append(bar.open, bar.high, bar.low, bar.close, bar.volume, bar.datetime)
 
         return self.inited
 
+    @property
+    def openArray(self) -> np.ndarray:
+        """完整缓冲的开盘价序列"""
+        return self.series.window("open")
+
+    @openArray.setter
+    def openArray(self, values) -> None:
+        self.series.assign("open", values)
+
+    @property
+    def highArray(self) -> np.ndarray:
+        """完整缓冲的最高价序列"""
+        return self.series.window("high")
+
+    @highArray.setter
+    def highArray(self, values) -> None:
+        self.series.assign("high", values)
+
+    @property
+    def lowArray(self) -> np.ndarray:
+        """完整缓冲的最低价序列"""
+        return self.series.window("low")
+
+    @lowArray.setter
+    def lowArray(self, values) -> None:
+        self.series.assign("low", values)
+
+    @property
+    def closeArray(self) -> np.ndarray:
+        """完整缓冲的收盘价序列"""
+        return self.series.window("close")
+
+    @closeArray.setter
+    def closeArray(self, values) -> None:
+        self.series.assign("close", values)
+
+    @property
+    def volumeArray(self) -> np.ndarray:
+        """完整缓冲的成交量序列"""
+        return self.series.window("volume")
+
+    @volumeArray.setter
+    def volumeArray(self, values) -> None:
+        self.series.assign("volume", values)
+
+    @property
+    def datetimeArray(self) -> np.ndarray:
+        """完整缓冲的时间序列"""
+        return self.series.window("datetime")
+
+    @datetimeArray.setter
+    def datetimeArray(self, values) -> None:
+        self.series.assign("datetime", values)
+
     @property
     def open(self) -> np.ndarray:
         """获取开盘价序列"""
-        return self.openArray[-self.size:]
+        return self.series.window("open", self.size)
 
     @property
     def high(self) -> np.ndarray:
         """获取最高价序列"""
-        return self.highArray[-self.size:]
+        return self.series.window("high", self.size)
 
     @property
     def low(self) -> np.ndarray:
         """获取最低价序列"""
-        return self.lowArray[-self.size:]
+        return self.series.window("low", self.size)
 
     @property
     def close(self) -> np.ndarray:
         """获取收盘价序列"""
-        return self.closeArray[-self.size:]
+        return self.series.window("close", self.size)
 
     @property
     def volume(self) -> np.ndarray:
         """获取成交量序列"""
-        return self.volumeArray[-self.size:]
+        return self.series.window("volume", self.size)
 
     @property
     def datetime(self) -> np.ndarray:
         """获取时间序列"""
-        return self.datetimeArray[-self.size:]
+        return self.series.window("datetime", self.size)
 
 
     def sma(self, n, array=False):
@@ -1286,16 +1395,7 @@ class ArrayManager(object):
 
     def kd(self, nf=9, ns=3, array=False):
         """KD指标"""
-        c = self.close
-        hhv = self.hhv(nf, True)
-        llv = self.llv(nf, True)
-        shl = hhv - llv
-        scl = c - llv
-        shl = shl[~np.isnan(shl)]
-        scl = scl[~np.isnan(scl)]
-        rsv = 100 * scl / shl
-        k = self.sma1(rsv, ns, 1, 50)
-        d = self.sma1(k, ns, 1, 50)
+        k, d, _ = kernels.kdj_sma(self.close, self.hhv(nf, True), self.llv(nf, True), ns)
         if array:
             return k, d
         return k[-1], d[-1]
@@ -1319,31 +1419,14 @@ class ArrayManager(object):
 
     def kdj(self, n, s, f, array=False):
         """KDJ指标"""
-        c = self.close
-        hhv = self.hhv(n, True)
-        llv = self.llv(n, True)
-        shl = hhv - llv
-        scl = c - llv
-        shl = shl[~np.isnan(shl)]
-        scl = scl[~np.isnan(scl)]
-        rsv = 100 * scl / shl
-        k = self.sma1(rsv, s, 1, 50)
-        d = self.sma1(k, s, 1, 50)
-        j = 3 * k - 2 * d
+        k, d, j = kernels.kdj_sma(self.close, self.hhv(n, True), self.llv(n, True), s)
         if array:
             return k, d, j
         return k[-1], d[-1], j[-1]
 
     def sma1(self, arr: np.ndarray, n: int, m: int, inity: int):
         """移动平均"""
-        y = inity
-        result = []
-        for x in arr:
-            if np.isnan(x):
-                continue
-            y = (m * x + (n - m) * y) / n
-            result.append(y)
-        return np.array(result)
+        return kernels.sma1(arr, n, m, inity)
 
     def macdext(self, fastPeriod, slowPeriod, signalPeriod, array=False):
         """MACD指标"""
@@ -1356,13 +1439,7 @@ class ArrayManager(object):
 
     def atr(self, n, array=False):
         """ATR指标"""
-        c = self.close[:-1]
-        high = self.high[1:]
-        low = self.low[1:]
-        hl = high-low
-        cl = abs(c - low)
-        ch = abs(c - high)
-        tr = self.arr_max(hl, cl, ch)
+        tr = kernels.true_range(self.high, self.low, self.close)
         atr = talib.SMA(tr, n)
 
         if array:
@@ -1371,18 +1448,15 @@ class ArrayManager(object):
 
     def xmax(self, arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
         """交错最大值"""
-        result = list(map(max, zip(arr1[1:], arr2[:-1])))
-        return np.array(result)
+        return kernels.xmax(arr1, arr2)
 
     def xmin(self, arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
         """交错最小值"""
-        result = list(map(min, zip(arr1[1:], arr2[:-1])))
-        return np.array(result)
+        return kernels.xmin(arr1, arr2)
 
     def arr_max(self, *array: np.ndarray) -> np.ndarray:
         """多数组取最值构成新数组"""
-        result = list(map(max, zip(*array)))
-        return np.array(result)
+        return kernels.arr_max(*array)
 
 
     def rsi(self, n, array=False):
@@ -1481,6 +1555,8 @@ class KLWidget(QWidget):
     load_data_signal = QtCore.pyqtSignal()
     set_xrange_event_signal = QtCore.pyqtSignal()
 
+    compact: bool = False  # K 线图是否使用紧凑存储
+
     def __init__(self, strategy, parent=None):
         super().__init__(parent)
         self.strategy: CtaTemplate = strategy # 策略实例 CTATemplate
@@ -1508,7 +1584,7 @@ class KLWidget(QWidget):
     def init_ui(self):
         """初始化界面"""
         self.setWindowTitle(f"策略-{self.strategy.name}")
-        self.uiKLine = KLineWidget(self)
+        self.uiKLine = KLineWidget(self, compact=self.compact)
 
         # 整合布局
         vbox = QVBoxLayout()
@@ -17,6 +17,8 @@ import scipy.stats as sps
 import talib
 
 from ctaBase import *
+from series import KLineRingSeries
+from sessions import SessionCalendar
 from vtConstant import *
 from vtObject import *
 
@@ -1045,9 +1047,10 @@ class BarManager(object):
     """
 
     # ----------------------------------------------------------------------
-    def __init__(self, onBar, xmin=0, onXminBar=None):
+    def __init__(self, onBar, xmin=0, onXminBar=None, calendar=None):
         """Constructor"""
         self.bar = None  # 1分钟K线对象
+        self.calendar = calendar  # 交易时段日历 SessionCalendar, 为空时按合约品种获取
         self.onBar = onBar  # 1分钟K线回调函数
 
         self.xminBar = None  # X分钟K线对象
@@ -1137,9 +1140,10 @@ class BarManager(object):
 
         # X分钟已经走完
         if str(self.xmin).isdigit():
-            # X分钟已经走完
-            minutes = 60 * bar.datetime.hour + bar.datetime.minute
-            if not minutes % self.xmin:  # 可以用X整除
+            # X分钟已经走完, 按交易时段开盘时间对齐, 午休, 小节休息和跨越午夜的夜盘同样适用
+            if self.calendar is None:
+                self.calendar = SessionCalendar.for_instrument(bar.symbol)
+            if self.calendar.is_bar_end(bar.datetime, int(self.xmin)):
                 # 生成上一X分钟K线的时间戳
                 self.xminBar.datetime = bar.datetime
                 self.xminBar.datetime = self.xminBar.datetime.replace(second=0, microsecond=0)  # 将秒和微秒设为0
@@ -1177,7 +1181,7 @@ class ArrayManager(object):
     """
 
     # ----------------------------------------------------------------------
-    def __init__(self, size=100, maxsize=None, bars=None):
+    def __init__(self, size=100, maxsize=None, bars=None, compact=False, price_decimals=None):
         """Constructor"""
 
         # 一次性载入
@@ -1193,11 +1197,12 @@ class ArrayManager(object):
 
         self.maxsize = size if maxsize is None else maxsize
 
-        self.openArray = np.zeros(self.maxsize)  # OHLC
-        self.highArray = np.zeros(self.maxsize)
-        self.lowArray = np.zeros(self.maxsize)
-        self.closeArray = np.zeros(self.maxsize)
-        self.volumeArray = np.zeros(self.maxsize)
+        self.series = KLineRingSeries(
+            self.maxsize,
+            columns=("open", "high", "low", "close", "volume"),
+            compact=compact,
+            price_decimals=price_decimals
+        )  # 环形缓冲, 可选紧凑存储
 
     # ----------------------------------------------------------------------
     def updateBar(self, bar):
@@ -1205,48 +1210,84 @@ class ArrayManager(object):
         self.count += 1
         if not self.inited and self.count >= self.size:
             self.inited = True
-        self.openArray[0:self.maxsize - 1] = self.openArray[1:self.maxsize]
-        self.highArray[0:self.maxsize - 1] = self.highArray[1:self.maxsize]
-        self.lowArray[0:self.maxsize - 1] = self.lowArray[1:self.maxsize]
-        self.closeArray[0:self.maxsize - 1] = self.closeArray[1:self.maxsize]
-        self.volumeArray[0:self.maxsize - 1] = self.volumeArray[1:self.maxsize]
-
-        self.openArray[-1] = bar.open
-        self.highArray[-1] = bar.high
-        self.lowArray[-1] = bar.low
-        self.closeArray[-1] = bar.close
-        self.volumeArray[-1] = bar.volume
+        self.series.append(bar.open, bar.high, bar.low, bar.close, bar.volume)
         return self.inited
 
+    # ----------------------------------------------------------------------
+    @property
+    def openArray(self):
+        """完整缓冲的开盘价序列"""
+        return self.series.window("open")
+
+    @openArray.setter
+    def openArray(self, values):
+        self.series.assign("open", values)
+
+    @property
+    def highArray(self):
+        """完整缓冲的最高价序列"""
+        return self.series.window("high")
+
+    @highArray.setter
+    def highArray(self, values):
+        self.series.assign("high", values)
+
+    @property
+    def lowArray(self):
+        """完整缓冲的最低价序列"""
+        return self.series.window("low")
+
+    @lowArray.setter
+    def lowArray(self, values):
+        self.series.assign("low", values)
+
+    @property
+    def closeArray(self):
+        """完整缓冲的收盘价序列"""
+        return self.series.window("close")
+
+    @closeArray.setter
+    def closeArray(self, values):
+        self.series.assign("close", values)
+
+    @property
+    def volumeArray(self):
+        """完整缓冲的成交量序列"""
+        return self.series.window("volume")
+
+    @volumeArray.setter
+    def volumeArray(self, values):
+        self.series.assign("volume", values)
+
     # ----------------------------------------------------------------------
     @property
     def open(self):
         """获取开盘价序列"""
-        return self.openArray[-self.size:]
+        return self.series.window("open", self.size)
 
     # ----------------------------------------------------------------------
     @property
     def high(self):
         """获取最高价序列"""
-        return self.highArray[-self.size:]
+        return self.series.window("high", self.size)
 
     # ----------------------------------------------------------------------
     @property
     def low(self):
         """获取最低价序列"""
-        return self.lowArray[-self.size:]
+        return self.series.window("low", self.size)
 
     # ----------------------------------------------------------------------
     @property
     def close(self):
         """获取收盘价序列"""
-        return self.closeArray[-self.size:]
+        return self.series.window("close", self.size)
 
     # ----------------------------------------------------------------------
     @property
     def volume(self):
         """获取成交量序列"""
-        return self.volumeArray[-self.size:]
+        return self.series.window("volume", self.size)
 
     # ----------------------------------------------------------------------
     # ：技术指标
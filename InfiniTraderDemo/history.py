@@ -0,0 +1,172 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from sessions import SessionCalendar
+
+ChunkType = Tuple[str, str, int]
+"""分段请求 (开始日期 %Y%m%d, 开始时间 %H:%M:%S, 交易日数), 从开始时间往前获取"""
+
+FetchType = Callable[[str, str, int], list]
+"""按分段请求获取 K 线, 返回升序的 K 线字典列表"""
+
+
+def split_days(days: int, chunk_days: int = 3) -> List[int]:
+    """把天数切分为不大于 chunk_days 的单元, 余数为最近的一段"""
+    days_list = [chunk_days] * (days // chunk_days)
+    if remainder := days % chunk_days:
+        days_list.insert(0, remainder)
+    return days_list
+
+
+def bar_time(bar: dict) -> datetime:
+    """K 线字典的 date 和 time 转为时间"""
+    return datetime.strptime(f"{bar['date']} {bar['time'][:8]}", "%Y%m%d %H:%M:%S")
+
+
+def bar_trading_day(bar: dict, calendar: SessionCalendar) -> date:
+    """K 线所属的交易日, K 线时间为周期开始或结束时间均可"""
+    return calendar.trading_day(bar_time(bar) - timedelta(seconds=1))
+
+
+def plan_chunks(
+    days_list: List[int],
+    now: datetime,
+    calendar: SessionCalendar,
+    offset: timedelta = timedelta(minutes=1)
+) -> List[ChunkType]:
+    """
+    按交易日历预先计算分段请求的边界
+    ----
+        原来逐段获取时, 下一段从上一段最早的一根 K 线往前获取, 每段都要等上一段返回\n
+        这里按交易日历直接算出每一段最早的交易日, 下一段从该交易日的第一根 K 线往前获取, 各段互不依赖, 可以同时请求
+
+    Args:
+        days_list: 每段的交易日数, 从最近到最早\n
+        now: 当前时间, 第一段从该时间往前获取\n
+        calendar: 合约的交易时段日历\n
+        offset: 交易日第一根 K 线相对开盘时间的偏移, K 线时间为周期结束时间时为 1 分钟
+
+    Returns:
+        分段请求, 从最近到最早排列
+    """
+    chunks: List[ChunkType] = []
+    anchor = now
+    day = calendar.trading_day(now)
+
+    for _days in days_list:
+        chunks.append((anchor.strftime("%Y%m%d"), anchor.strftime("%H:%M:%S"), _days))
+
+        """该段最早的交易日, 与逐段获取一致, 下一段的第一天即为该交易日"""
+        for _ in range(_days - 1):
+            day = calendar.previous_trading_day(day)
+        anchor = calendar.trading_day_open(day) + offset
+
+    return chunks
+
+
+def fetch_chunks(chunks: List[ChunkType], fetch: FetchType, max_workers: int = 4) -> List[list]:
+    """
+    用有界线程池同时获取各段 K 线
+
+    Args:
+        chunks: 分段请求, 见 plan_chunks\n
+        fetch: 获取一段 K 线的函数\n
+        max_workers: 最大线程数, 为 1 时按顺序逐段获取
+
+    Returns:
+        与 chunks 顺序相同的各段 K 线, 某一段抛出的异常在这里重新抛出
+    """
+    if max_workers <= 1 or len(chunks) <= 1:
+        return [fetch(*chunk) for chunk in chunks]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        return list(executor.map(lambda chunk: fetch(*chunk), chunks))
+
+
+def fetch_history(
+    days: int,
+    now: datetime,
+    calendar: SessionCalendar,
+    fetch: FetchType,
+    max_workers: int = 4,
+    chunk_days: int = 3
+) -> List[list]:
+    """
+    分段获取 days 个交易日的 K 线, 结果与逐段获取完全一致
+    ----
+        按 plan_chunks 的计划同时获取各段, 之后按顺序核对每一段的开始时间是否等于上一段最早的 K 线,
+        不一致时 (日历缺少节假日, K 线时间的约定不同等) 丢弃该段及之后的结果,
+        从上一段最早的 K 线重新计划剩余的段, 每一轮至少确定一段\n
+        每一轮最多计划 max_workers 段, 与线程池每批能同时获取的段数相同, 计划失效时浪费的请求不超过一批,
+        max_workers 为 1 时与逐段获取相同
+
+    Args:
+        days: 交易日数\n
+        now: 当前时间\n
+        calendar: 合约的交易时段日历\n
+        fetch: 获取一段 K 线的函数, 不能返回空列表\n
+        max_workers: 最大线程数\n
+        chunk_days: 每段的交易日数
+
+    Returns:
+        各段升序的 K 线, 从最近到最早排列
+    """
+    days_list = split_days(days, chunk_days)
+    results: List[list] = []
+    start: Tuple[str, str] = None
+    offset = timedelta(minutes=1)
+
+    while len(results) < len(days_list):
+        chunks = plan_chunks(days_list[len(results):len(results) + max(max_workers, 1)], now, calendar, offset)
+        if start:
+            """第一段使用上一段最早的 K 线的原始日期和时间"""
+            chunks[0] = (*start, chunks[0][2])
+
+        for chunk, bars in zip(chunks, fetch_chunks(chunks, fetch, max_workers)):
+            if results and chunk[:2] != start:
+                break
+            results.append(bars)
+            start = (bars[0]["date"], bars[0]["time"])
+
+        now = bar_time(results[-1][0])
+        if timedelta(0) <= (delta := now - calendar.trading_day_open(calendar.trading_day(now))) < timedelta(hours=1):
+            """按实际的第一根 K 线修正偏移"""
+            offset = delta
+
+    return results
+
+
+def bar_key(bar: dict) -> Tuple[str, str]:
+    """K 线去重的键 (日期, 时间), 格式为 %Y%m%d 和 %H:%M:%S 时按字符串比较即为时间先后"""
+    return bar["date"], bar["time"]
+
+
+def dedupe_bars(chunks: Iterable[list]) -> Iterator[dict]:
+    """
+    按 (日期, 时间) 合并去重, 相同时间的 K 线以后出现的为准
+    ----
+        chunks 为升序的各段 K 线, 从最早到最近排列, 可以是逐段产生的迭代器\n
+        每收到一段, 早于该段第一根的 K 线不会再被覆盖, 立即输出, 只保留与下一段可能重叠的部分,
+        每根 K 线只做常数次字典操作, 总耗时与 K 线数量成正比\n
+        被覆盖的 K 线保留原来的位置, 即输出顺序与输入一致
+    """
+    pending: Dict[Tuple[str, str], dict] = {}
+
+    for bars in chunks:
+        if bars and pending:
+            first = bar_key(bars[0])
+            for key in list(pending):
+                if key >= first:
+                    break
+                yield pending.pop(key)
+
+        for bar in bars:
+            pending[bar_key(bar)] = bar
+
+    yield from pending.values()
+
+
+def merge_chunks(results: List[list]) -> List[dict]:
+    """把从最近到最早排列的各段升序 K 线合并为一个升序列表, 边界重叠的 K 线保留"""
+    return [bar for bars in reversed(results) for bar in bars]
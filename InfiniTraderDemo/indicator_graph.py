@@ -0,0 +1,493 @@
+import ast
+import inspect
+import re
+from math import nan
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from streaming import (CLOSE, EMA, HHV, HIGH, LLV, LOW, MACD, RSI, SMA, STD,
+                       KDJSmooth, StreamingIndicator, StreamingIndicators,
+                       TrueRange)
+
+Ref = Tuple[Optional["Node"], Optional[int]]
+"""节点输出的引用 (节点, 下标), 节点为 None 时下标为 K 线字段 HIGH, LOW, CLOSE; 下标为 None 时为节点的全部输出"""
+
+Output = Union[Ref, Tuple[Ref, ...]]
+
+Declaration = Tuple[str, str, tuple]
+"""(名称, 指标, 参数)"""
+
+
+class Node(object):
+    """
+    指标图中的节点
+    ----
+        indicator 为增量指标 (有状态), function 为无状态的计算, 二者只有一个\n
+        有状态的节点在输入第一次全部有效之前不更新, 输出 nan, 与 talib 跳过开头的 nan 一致
+
+    Args:
+        key: 运算, 参数和输入确定的键, 键相同的节点只创建一个\n
+        inputs: 输入的引用\n
+        indicator: 增量指标\n
+        function: 无状态的计算\n
+        width: 输出数量\n
+        skip_nan: 是否跳过开头的 nan
+    """
+
+    def __init__(
+        self,
+        key: tuple,
+        inputs: Tuple[Ref, ...],
+        indicator: StreamingIndicator = None,
+        function: Callable[..., Any] = None,
+        width: int = 1,
+        skip_nan: bool = True
+    ) -> None:
+        self.key = key
+        self.inputs = inputs
+        self.indicator = indicator
+        self.function = function
+        self.skip_nan = skip_nan
+
+        self._empty: Any = nan if width == 1 else (nan,) * width
+        self.value: Any = self._empty
+
+        self._started: bool = False
+        self._fed: bool = False
+        self._saved_started: bool = False
+
+    def update(self, args: Tuple[float, ...]) -> None:
+        if self.indicator is None:
+            self.value = self.function(*args)
+            return
+
+        self._fed = self._started or not self.skip_nan or all(arg == arg for arg in args)
+
+        if not self._fed:
+            self.value = self._empty
+            return
+
+        self._saved_started, self._started = self._started, True
+        self.value = self.indicator.update(*args)
+
+    def undo(self) -> None:
+        if self._fed:
+            self.indicator.undo()
+            self._started, self._fed = self._saved_started, False
+
+    def bulk(self, args: Tuple[np.ndarray, ...]) -> Any:
+        """
+        批量计算整段输入, 返回输出的数组 (多个输出时为数组的元组), value 为最后一根的输出
+
+        Args:
+            args: 各个输入的数组
+        """
+        if self.indicator is None:
+            output = self.function(*args)
+            self.value = tuple(column[-1] for column in output) if isinstance(output, tuple) else output[-1]
+            return output
+
+        size = len(args[0])
+        valid = np.ones(size, dtype=bool)
+        if self.skip_nan:
+            for arg in args:
+                valid &= ~np.isnan(arg)
+        start = int(valid.argmax()) if valid.any() else size
+
+        rows = self.indicator._bulk(*(arg[start:] for arg in args))
+        self._started = start < size
+        self.value = rows[-1] if rows else self._empty
+
+        if isinstance(self._empty, tuple):
+            columns = tuple(zip(*rows)) or ((),) * len(self._empty)
+            return tuple(np.r_[np.full(start, nan), column] for column in columns)
+        return np.r_[np.full(start, nan), rows]
+
+
+class IndicatorGraph(StreamingIndicator):
+    """
+    指标依赖图
+    ----
+        把声明的指标拆成节点 (真实波幅, 均线, 移动最高最低等), 相同运算和参数的节点只创建一个,
+        如 keltner(20) 与 ema(20), atr(20) 共用 EMA 和 ATR 节点, 多个 atr 共用真实波幅节点,
+        kdj(9) 与 donchian(9) 共用移动最高最低节点\n
+        每根 K 线按拓扑顺序把每个节点计算一次, update 返回与声明顺序一致的结果元组\n
+        指标方法与 Indicators 一致, 返回值的结构也一致 (如 atr 返回 (atr, tr), macd 的柱状值乘以 2)
+
+    Args:
+        declarations: 声明列表, 由 parse_declarations 生成
+    """
+
+    def __init__(self, declarations: List[Declaration]) -> None:
+        self.declarations = declarations
+        self.nodes: Dict[tuple, Node] = {}
+        """全部节点, 插入顺序即拓扑顺序"""
+
+        self.outputs: Dict[str, Output] = {}
+        for name, method, args in declarations:
+            self.outputs[name] = getattr(self, method)(*args)
+
+        self._order: List[Node] = list(self.nodes.values())
+        self._reversed: List[Node] = self._order[::-1]
+
+    def __getstate__(self) -> dict:
+        """节点的计算函数不能序列化, 只保存声明和各节点的状态"""
+        return {
+            "declarations": self.declarations,
+            "nodes": {
+                key: (node.indicator, node.value, node._started, node._fed, node._saved_started)
+                for key, node in self.nodes.items()
+            }
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        """按声明重建节点后恢复各节点的状态"""
+        self.__init__(state["declarations"])
+        for key, (indicator, value, started, fed, saved_started) in state["nodes"].items():
+            node = self.nodes[key]
+            node.indicator, node.value = indicator, value
+            node._started, node._fed, node._saved_started = started, fed, saved_started
+
+    @staticmethod
+    def _ref_key(ref: Ref) -> tuple:
+        node, index = ref
+        return ("field" if node is None else node.key, index)
+
+    def _node(
+        self,
+        name: str,
+        params: tuple,
+        inputs: Tuple[Ref, ...],
+        factory: Callable[[], StreamingIndicator] = None,
+        function: Callable[..., Any] = None,
+        width: int = 1,
+        skip_nan: bool = True
+    ) -> Node:
+        """按键获取节点, 不存在时创建"""
+        key = (name, params, tuple(self._ref_key(ref) for ref in inputs))
+
+        if key not in self.nodes:
+            self.nodes[key] = Node(
+                key,
+                inputs,
+                indicator=factory() if factory else None,
+                function=function,
+                width=width,
+                skip_nan=skip_nan
+            )
+
+        return self.nodes[key]
+
+    def _value(self, ref: Ref, bar: Tuple[float, float, float] = None) -> Any:
+        node, index = ref
+        if node is None:
+            return bar[index]
+        return node.value if index is None else node.value[index]
+
+    def _result(self, output: Output) -> Any:
+        if isinstance(output[0], tuple):
+            return tuple(self._value(ref) for ref in output)
+        return self._value(output)
+
+    def update(self, high: float, low: float, close: float) -> tuple:
+        bar = (high, low, close)
+        for node in self._order:
+            node.update(tuple(self._value(ref, bar) for ref in node.inputs))
+        return tuple(self._result(output) for output in self.outputs.values())
+
+    def undo(self) -> None:
+        for node in self._reversed:
+            node.undo()
+
+    def _bulk(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> list:
+        """按拓扑顺序每个节点对整段输入计算一次, 有状态的节点由增量指标的 _bulk 向量化计算"""
+        if not len(close):
+            return []
+
+        bar = (high, low, close)
+        columns: Dict[tuple, Any] = {}
+
+        def column(ref: Ref) -> np.ndarray:
+            node, index = ref
+            if node is None:
+                return bar[index]
+            return columns[node.key] if index is None else columns[node.key][index]
+
+        for node in self._order:
+            columns[node.key] = node.bulk(tuple(column(ref) for ref in node.inputs))
+
+        results = [
+            list(zip(*(column(ref).tolist() for ref in output))) if isinstance(output[0], tuple)
+            else column(output).tolist()
+            for output in self.outputs.values()
+        ]
+        return list(zip(*results))
+
+    def _sma(self, ref: Ref, timeperiod: int) -> Ref:
+        return self._node("sma", (timeperiod,), (ref,), lambda: SMA(timeperiod)), None
+
+    def _ema(self, ref: Ref, timeperiod: int) -> Ref:
+        return self._node("ema", (timeperiod,), (ref,), lambda: EMA(timeperiod)), None
+
+    def _tr(self) -> Ref:
+        return self._node("tr", (), ((None, HIGH), (None, LOW), (None, CLOSE)), TrueRange), None
+
+    def _band(self, mid: Ref, width: Ref, multiple: float) -> Tuple[Ref, Ref]:
+        node = self._node(
+            "band",
+            (multiple,),
+            (mid, width),
+            function=lambda m, w: (m + w * multiple, m - w * multiple),
+            width=2
+        )
+        return (node, 0), (node, 1)
+
+    def sma(self, timeperiod: int = 9) -> Ref:
+        """简单均线"""
+        return self._sma((None, CLOSE), timeperiod)
+
+    def ema(self, timeperiod: int = 12) -> Ref:
+        """EXPMA 指标"""
+        return self._ema((None, CLOSE), timeperiod)
+
+    def std(self, timeperiod: int = 5) -> Ref:
+        """标准差"""
+        return self._node(
+            "std",
+            (timeperiod,),
+            ((None, CLOSE),),
+            lambda: STD(timeperiod, np.sqrt(timeperiod / (timeperiod - 1)))
+        ), None
+
+    def bbi(self, n1: int = 3, n2: int = 6, n3: int = 12, n4: int = 24) -> Ref:
+        """BBI 多空指标"""
+        refs = tuple(self.sma(n) for n in (n1, n2, n3, n4))
+        return self._node("bbi", (), refs, function=lambda *values: sum(values) / 4), None
+
+    def rsi(self, timeperiod: int = 14) -> Ref:
+        """RSI 相对强弱指数"""
+        return self._node("rsi", (timeperiod,), ((None, CLOSE),), lambda: RSI(timeperiod)), None
+
+    def hhv(self, timeperiod: int = 30) -> Ref:
+        """移动最高"""
+        return self._node("hhv", (timeperiod,), ((None, HIGH),), lambda: HHV(timeperiod)), None
+
+    def llv(self, timeperiod: int = 30) -> Ref:
+        """移动最低"""
+        return self._node("llv", (timeperiod,), ((None, LOW),), lambda: LLV(timeperiod)), None
+
+    def kdj(self, fastk_period: int = 9, slowk_period: int = 3, slowd_period: int = 3) -> Tuple[Ref, Ref, Ref]:
+        """KDJ 指标"""
+        node = self._node(
+            "kdj",
+            (slowk_period, slowd_period),
+            ((None, CLOSE), self.hhv(fastk_period), self.llv(fastk_period)),
+            lambda: KDJSmooth(slowk_period, slowd_period),
+            width=3,
+            skip_nan=False
+        )
+        return (node, 0), (node, 1), (node, 2)
+
+    def kd(self, fastk_period: int = 9, slowk_period: int = 3, slowd_period: int = 3) -> Tuple[Ref, Ref]:
+        """KD 指标"""
+        return self.kdj(fastk_period, slowk_period, slowd_period)[:2]
+
+    def macd(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9) -> Tuple[Ref, Ref, Ref]:
+        """MACD 指标, 柱状值与 Indicators.macd 一致乘以 2"""
+        node = self._node(
+            "macd",
+            (fast_period, slow_period, signal_period),
+            ((None, CLOSE),),
+            lambda: MACD(fast_period, slow_period, signal_period),
+            width=3
+        )
+        hist = self._node("scale", (2,), ((node, 2),), function=lambda value: value * 2)
+        return (node, 0), (node, 1), (hist, None)
+
+    def tr(self) -> Ref:
+        """真实波幅"""
+        return self._tr()
+
+    def atr(self, timeperiod: int = 14) -> Tuple[Ref, Ref]:
+        """真实波幅均值, 返回 (atr, tr)"""
+        return self._sma(self._tr(), timeperiod), self._tr()
+
+    def boll(self, timeperiod: int = 20, deviation: int = 2) -> Tuple[Ref, Ref]:
+        """布林通道, 返回 (上轨, 下轨)"""
+        return self._band(self.sma(timeperiod), self.std(timeperiod), deviation)
+
+    def keltner(self, timeperiod: int = 20, multiple: int = 2) -> Tuple[Ref, Ref]:
+        """肯特纳通道, 返回 (上轨, 下轨)"""
+        atr, _ = self.atr(timeperiod)
+        return self._band(self.ema(timeperiod), atr, multiple)
+
+    def donchian(self, timeperiod: int = 20) -> Tuple[Ref, Ref]:
+        """唐奇安通道, 返回 (上轨, 下轨)"""
+        return self.hhv(timeperiod), self.llv(timeperiod)
+
+
+INDICATORS = (
+    "sma", "ema", "std", "bbi", "rsi", "hhv", "llv", "kdj", "kd",
+    "macd", "tr", "atr", "boll", "keltner", "donchian"
+)
+"""可以声明的指标"""
+
+
+def _resolve(node: ast.AST, namespace: Any, expression: str) -> Any:
+    """参数只能是数字或 namespace 中的名称 (如 Params 的字段)"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+
+    if isinstance(node, ast.Name) and namespace is not None:
+        if isinstance(namespace, Mapping):
+            if node.id in namespace:
+                return namespace[node.id]
+        elif hasattr(namespace, node.id):
+            return getattr(namespace, node.id)
+
+    raise ValueError(f"指标声明 {expression} 的参数只能是数字或参数名称")
+
+
+def parse_declarations(
+    declarations: Union[str, Mapping[str, str]],
+    namespace: Any = None
+) -> List[Declaration]:
+    """
+    解析指标声明
+    ----
+        字典为 {名称: 指标表达式}, 字符串为 "名称=指标表达式" 用分号或换行分隔, 省略名称时以指标和参数命名, 如 sma_20\n
+        指标表达式与 Indicators 的方法调用一致 (不含 array), 参数可以是数字或 namespace 中的名称
+
+    Args:
+        declarations: 指标声明, 如 "kc=keltner(N); ma0=sma(P1); atr(26)"\n
+        namespace: 参数名称的取值对象, 如策略的 params_map 或字典
+
+    Returns:
+        [(名称, 指标, 参数), ...], 参数已补全默认值
+    """
+    if isinstance(declarations, str):
+        items = []
+        for item in re.split(r"[;\n]", declarations):
+            if not (item := item.strip()):
+                continue
+            name, _, expression = item.rpartition("=") if re.match(r"^\w+\s*=", item) else ("", "", item)
+            items.append((name.strip(), expression.strip()))
+    else:
+        items = list(declarations.items())
+
+    result: List[Declaration] = []
+    for name, expression in items:
+        try:
+            call = ast.parse(expression, mode="eval").body
+        except SyntaxError as error:
+            raise ValueError(f"无法解析指标声明 {expression}") from error
+
+        if not (
+            isinstance(call, ast.Call)
+            and isinstance(call.func, ast.Name)
+            and call.func.id in INDICATORS
+        ):
+            raise ValueError(f"未知的指标声明 {expression}, 可用指标: {', '.join(INDICATORS)}")
+
+        method = call.func.id
+        signature = inspect.signature(getattr(IndicatorGraph, method))
+        try:
+            bound = signature.bind(
+                None,
+                *(_resolve(arg, namespace, expression) for arg in call.args),
+                **{keyword.arg: _resolve(keyword.value, namespace, expression) for keyword in call.keywords}
+            )
+        except TypeError as error:
+            raise ValueError(f"指标声明 {expression} 的参数错误: {error}") from error
+
+        bound.apply_defaults()
+        args = tuple(bound.arguments.values())[1:]
+        name = name or "_".join([method, *map(str, args)])
+
+        if name in (declared for declared, _, _ in result):
+            raise ValueError(f"指标名称 {name} 重复")
+
+        result.append((name, method, args))
+
+    return result
+
+
+class IndicatorSet(object):
+    """
+    声明式指标集合
+    ----
+        一次声明策略用到的全部指标, 由 IndicatorGraph 去重后每根 K 线计算一次, 结果按声明的名称发布为属性\n
+        图作为一个增量指标注册到 StreamingIndicators, 第一次查询时回放历史数据,
+        正在走的 K 线的结果为临时值 (每个 tick 整张图计算一次), K 线走完后确认\n
+        属性值为最后一根 K 线的指标, value(name, shift) 取向前偏移的值, values(shift) 一次取全部指标, array(name) 取完整序列
+
+    Args:
+        streaming: 增量指标, 如 KLineProducer.streaming\n
+        declarations: 指标声明, 见 parse_declarations\n
+        namespace: 参数名称的取值对象, 如策略的 params_map
+    """
+
+    def __init__(
+        self,
+        streaming: StreamingIndicators,
+        declarations: Union[str, Mapping[str, str]],
+        namespace: Any = None
+    ) -> None:
+        self.streaming = streaming
+        self.declarations = parse_declarations(declarations, namespace)
+        self.names: List[str] = [name for name, _, _ in self.declarations]
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self._key = ("graph", tuple(self.declarations))
+
+    def _factory(self) -> IndicatorGraph:
+        return IndicatorGraph(self.declarations)
+
+    def _row(self, shift: int = 0) -> Optional[tuple]:
+        return self.streaming.select(self._key, self._factory, (HIGH, LOW, CLOSE), False, shift)
+
+    @property
+    def graph(self) -> IndicatorGraph:
+        """当前的指标图"""
+        self._row()
+        return self.streaming.indicators[self._key][0]
+
+    def _empty(self, name: str) -> Any:
+        output = self.graph.outputs[name]
+        return tuple(np.float64(nan) for _ in output) if isinstance(output[0], tuple) else np.float64(nan)
+
+    @staticmethod
+    def _convert(value: Any) -> Any:
+        return tuple(map(np.float64, value)) if isinstance(value, tuple) else np.float64(value)
+
+    def value(self, name: str, shift: int = 0) -> Any:
+        """name 指标向前偏移 shift 根 K 线的值, 数据不足时为 nan"""
+        row = self._row(shift)
+        return self._empty(name) if row is None else self._convert(row[self._index[name]])
+
+    def values(self, shift: int = 0) -> Dict[str, Any]:
+        """全部指标向前偏移 shift 根 K 线的值"""
+        row = self._row(shift)
+        if row is None:
+            return {name: self._empty(name) for name in self.names}
+        return {name: self._convert(value) for name, value in zip(self.names, row)}
+
+    def array(self, name: str) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+        """name 指标的完整序列, 与 K 线对齐"""
+        rows = self.streaming.select(self._key, self._factory, (HIGH, LOW, CLOSE), True)
+        column = [row[self._index[name]] for row in rows]
+        output = self.graph.outputs[name]
+
+        if isinstance(output[0], tuple):
+            return tuple(np.array(values, dtype=np.float64) for values in zip(*column)) if column else tuple(
+                np.array([], dtype=np.float64) for _ in output
+            )
+        return np.array(column, dtype=np.float64)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name not in self.__dict__.get("_index", ()):
+            raise AttributeError(name)
+        return self.value(name)
+
+    def __dir__(self) -> List[str]:
+        return [*super().__dir__(), *self.names]
@@ -1,30 +1,129 @@
-from typing import Tuple, Union
+import inspect
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple, Union
 
 import numpy as np
 import talib
 
+import kernels
+
+
+def _copy(result: Any) -> Any:
+    """复制缓存的数组, 调用方修改返回的数组不影响缓存"""
+    if isinstance(result, tuple):
+        return tuple(item.copy() if isinstance(item, np.ndarray) else item for item in result)
+    return result.copy() if isinstance(result, np.ndarray) else result
+
+
+def memoize(func: Callable) -> Callable:
+    """
+    指标结果缓存
+    ----
+        以 (方法名, 参数) 为键缓存指标结果, 数据版本 data_version 变化后清空\n
+        参数按位置与预先取出的默认值拼成键, 关键字参数按参数名的位置填入, 不逐次绑定签名\n
+        带 array 参数的指标只缓存完整数组, array 为 False 时从数组取最后一个值,
+        因此 sma(20) 和 sma(20, array=True) 共用同一个缓存\n
+        array 为 True 时返回缓存数组的副本, 与不缓存时一样可以修改
+    """
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values())[1:]
+    names: Dict[str, int] = {parameter.name: i for i, parameter in enumerate(parameters)}
+    defaults: tuple = tuple(parameter.default for parameter in parameters)
+    array_index: int = names.get("array")
+
+    if any(default is inspect.Parameter.empty for default in defaults) or any(
+        parameter.kind is not parameter.POSITIONAL_OR_KEYWORD for parameter in parameters
+    ):
+        raise TypeError(f"{func.__name__} 的参数必须都有默认值, 且不能是可变参数")
+
+    @wraps(func)
+    def wrapper(self: "Indicators", *args, **kwargs) -> Any:
+        if len(args) > len(defaults):
+            signature.bind(self, *args, **kwargs)
+
+        values = args + defaults[len(args):]
+
+        if kwargs:
+            values = list(values)
+            for name, value in kwargs.items():
+                if (index := names.get(name)) is None or index < len(args):
+                    """未知参数或重复传入, 由签名抛出相同的 TypeError"""
+                    signature.bind(self, *args, **kwargs)
+                values[index] = value
+            values = tuple(values)
+
+        if self._cache_version != self.data_version:
+            self._cache.clear()
+            self._cache_version = self.data_version
+
+        if array_index is None:
+            array, key = False, (func.__name__, *values)
+        else:
+            array = values[array_index]
+            values = values[:array_index] + (True,) + values[array_index + 1:]
+            key = (func.__name__, *values[:array_index], *values[array_index + 1:])
+
+        if key in self._cache:
+            self.cache_hits += 1
+            result = self._cache[key]
+        else:
+            self.cache_misses += 1
+            result = self._cache[key] = func(self, *values)
+
+        if array_index is not None and not array:
+            return tuple(item[-1] for item in result) if isinstance(result, tuple) else result[-1]
+
+        return _copy(result)
+
+    return wrapper
+
 
 class Indicators(object):
     """技术指标
     ----
 
     需配合 KLineProducer 使用
-        所有的 array 参数代表是否返回 numpy 数组, 默认为 False, 即返回最后一根线的指标
+        所有的 array 参数代表是否返回 numpy 数组, 默认为 False, 即返回最后一根线的指标\n
+        同一数据版本内相同参数的指标只计算一次, 数据变化时需调用 invalidate
     """
 
     def __init__(self) -> None:
         np.seterr(divide="ignore", invalid="ignore")
 
+        self.data_version: int = 0
+        """数据版本, 每次 K 线数据变化加 1"""
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+
+        self._cache: Dict[tuple, Any] = {}
+        self._cache_version: int = 0
+
+    def invalidate(self) -> None:
+        """数据已变化, 之后的指标查询重新计算"""
+        self.data_version += 1
+
+    def cache_stats(self) -> Dict[str, int]:
+        """指标缓存命中统计"""
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._cache),
+            "version": self.data_version
+        }
+
+    @memoize
     def sma(self, timeperiod: int = 9, array: bool = False) -> Union[np.float64, np.ndarray]:
         """简单均线"""
         result: np.ndarray = talib.SMA(self.close, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def ema(self, timeperiod: int = 12, array: bool = False) -> Union[np.float64, np.ndarray]:
         """EXPMA 指标"""
         result: np.ndarray = talib.EMA(self.close, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def std(self, timeperiod: int = 5, array: bool = False) -> Union[np.float64, np.ndarray]:
         """标准差"""
         result: np.ndarray = talib.STDDEV(
@@ -34,6 +133,7 @@ class Indicators(object):
         )
         return result if array else result[-1]
 
+    @memoize
     def bbi(
         self,
         n1: int = 3,
@@ -47,31 +147,37 @@ class Indicators(object):
         bbi = (_sma(n1) + _sma(n2) + _sma(n3) + _sma(n4)) / 4
         return bbi if array else bbi[-1]
 
+    @memoize
     def cci(self, timeperiod: int = 14, array: bool = False) -> Union[np.float64, np.ndarray]:
         """CCI 顺势指标"""
         result = talib.CCI(self.high, self.low, self.close, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def rsi(self, timeperiod: int = 14, array: bool = False) -> Union[np.float64, np.ndarray]:
         """RSI 相对强弱指数, 和无限易有细微差距, 可忽略"""
         result = talib.RSI(self.close, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def hhv(self, timeperiod: int = 30, array: bool = False) -> Union[np.float64, np.ndarray]:
         """移动最高"""
         result = talib.MAX(self.high, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def llv(self, timeperiod: int = 30, array: bool = False) -> Union[np.float64, np.ndarray]:
         """移动最低"""
         result = talib.MIN(self.low, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def adx(self, timeperiod: int = 14, array: bool = False):
         """ADX 指标"""
         result = talib.ADX(self.high, self.low, self.close, timeperiod)
         return result if array else result[-1]
 
+    @memoize
     def sar(
         self,
         acceleration: float = 0.02,
@@ -88,6 +194,7 @@ class Indicators(object):
 
         return result if array else result[-1]
 
+    @memoize
     def kdj(
         self,
         fastk_period: int = 9,
@@ -99,15 +206,16 @@ class Indicators(object):
         Tuple[np.ndarray, np.ndarray, np.ndarray]
     ]:
         """KDJ 指标"""
-        scl = self.close - (llv := self.llv(fastk_period, True))
-        shl = self.hhv(fastk_period, True) - llv
-        rsv = scl / shl * 100
-        k = talib.EMA(rsv, slowk_period * 2 - 1)
-        k[np.isnan(k)] = 0.0
-        d = talib.EMA(k, slowd_period * 2 - 1)
-        j = k * 3 - d * 2
+        k, d, j = kernels.kdj_ema(
+            self.close,
+            self.hhv(fastk_period, True),
+            self.llv(fastk_period, True),
+            slowk_period,
+            slowd_period
+        )
         return (k, d, j) if array else (k[-1], d[-1], j[-1])
 
+    @memoize
     def kd(
         self,
         fastk_period: int = 9,
@@ -127,6 +235,7 @@ class Indicators(object):
         )
         return (k, d) if array else (k[-1], d[-1])
 
+    @memoize
     def macdext(
         self,
         fast_period: int = 12,
@@ -171,6 +280,7 @@ class Indicators(object):
 
         return (macd, signal, hist * 2) if array else (macd[-1], signal[-1], hist[-1] * 2)
 
+    @memoize
     def macd(
         self,
         fast_period: int = 12,
@@ -199,22 +309,18 @@ class Indicators(object):
         
         return (macd, signal, hist * 2) if array else (macd[-1], signal[-1], hist[-1] * 2)
 
+    @memoize
     def atr(self, timeperiod: int = 14, array: bool = False) -> Union[
         Tuple[np.float64, np.float64],
         Tuple[np.ndarray, np.ndarray]
     ]:
         """真实波幅均值, ATR"""
-        close = self.close[:-1]
-        high = self.high[1:]
-        low = self.low[1:]
-        hl = high - low
-        cl = abs(close - low)
-        ch = abs(close - high)
-        tr = self.arr_max(hl, cl, ch)
+        tr = kernels.true_range(self.high, self.low, self.close)
         atr = talib.SMA(tr, timeperiod)
 
         return (atr, tr) if array else (atr[-1], tr[-1])
 
+    @memoize
     def boll(self, timeperiod: int = 20, deviation: int = 2) -> Tuple[np.float64, np.float64]:
         """布林通道"""
         mid = self.sma(timeperiod)
@@ -225,6 +331,7 @@ class Indicators(object):
 
         return upper_band, lower_band
 
+    @memoize
     def keltner(self, timeperiod: int = 20, multiple: int = 2) -> Tuple[np.float64, np.float64]:
         """肯特纳通道 (Keltner Channels, KC)"""
         mid = self.ema(timeperiod)
@@ -235,6 +342,7 @@ class Indicators(object):
 
         return upper_envelope, lower_envelope
 
+    @memoize
     def donchian(self, timeperiod: int = 20) -> Tuple[np.float64, np.float64]:
         """唐奇安通道 (Donchian Channels, DC)"""
         upper_channel = talib.MAX(self.high, timeperiod)
@@ -243,5 +351,4 @@ class Indicators(object):
 
     def arr_max(self, *array: np.ndarray) -> np.ndarray:
         """多数组取最值构成新数组"""
-        result = list(map(max, zip(*array)))
-        return np.array(result)
+        return kernels.arr_max(*array)
@@ -0,0 +1,144 @@
+from math import floor, log10
+from typing import Tuple, Union
+
+import numpy as np
+import talib
+
+
+def _python_extreme(function: np.ufunc, arrays: Tuple[np.ndarray, ...]) -> np.ndarray:
+    """
+    逐元素取最值, 结果与 list(map(max/min, zip(*arrays))) 一致
+    ----
+        Python 的 max/min 只在第一个值为 nan 时返回 nan, 其他位置的 nan 被忽略,
+        因此用忽略 nan 的 fmax/fmin 计算后, 把第一个数组为 nan 的位置设回 nan\n
+        长度不同时与 zip 一样按最短的数组截断
+    """
+    size = min(len(array) for array in arrays)
+    arrays = [np.asarray(array[:size], dtype=np.float64) for array in arrays]
+
+    result = function.reduce(arrays) if len(arrays) > 1 else arrays[0].copy()
+    result[np.isnan(arrays[0])] = np.nan
+    return result
+
+
+def arr_max(*arrays: np.ndarray) -> np.ndarray:
+    """多数组取最大值构成新数组"""
+    return _python_extreme(np.fmax, arrays)
+
+
+def arr_min(*arrays: np.ndarray) -> np.ndarray:
+    """多数组取最小值构成新数组"""
+    return _python_extreme(np.fmin, arrays)
+
+
+def xmax(arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
+    """交错最大值, arr1 的当前值与 arr2 的上一个值取最大"""
+    return arr_max(arr1[1:], arr2[:-1])
+
+
+def xmin(arr1: np.ndarray, arr2: np.ndarray) -> np.ndarray:
+    """交错最小值, arr1 的当前值与 arr2 的上一个值取最小"""
+    return arr_min(arr1[1:], arr2[:-1])
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """真实波幅, 从第二根 K 线开始, 长度比输入少 1"""
+    prev_close = close[:-1]
+    high, low = high[1:], low[1:]
+    return arr_max(high - low, abs(prev_close - low), abs(prev_close - high))
+
+
+def ewm(values: np.ndarray, alpha: float, init: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    沿最后一个轴递推 Y_t = alpha * X_t + (1 - alpha) * Y_(t-1), Y_(-1) = init
+    ----
+        递推展开为 Y_k = b^(k+1) * (init + alpha * sum(X_i / b^(i+1))), b = 1 - alpha,
+        按 b 的幂不下溢的长度分块, 每块用一次 cumsum 计算\n
+        values 可以是二维数组 (品种 x 时间), init 为每行的初值
+
+    Args:
+        values: 输入, 沿最后一个轴递推\n
+        alpha: 平滑系数\n
+        init: 初值, 标量或形状为 values.shape[:-1] 的数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    decay = 1 - alpha
+    result = np.empty_like(values)
+    y = np.asarray(init, dtype=np.float64)
+
+    if not values.shape[-1]:
+        return result
+
+    if decay == 0:
+        return values * alpha
+
+    if abs(decay) >= 1:
+        """不收敛的参数, 逐列递推"""
+        for i in range(values.shape[-1]):
+            y = alpha * values[..., i] + decay * y
+            result[..., i] = y
+        return result
+
+    block = max(1, min(512, floor(200 / -log10(abs(decay)))))
+    powers = decay ** np.arange(1, block + 1)
+
+    for start in range(0, values.shape[-1], block):
+        chunk = values[..., start:start + block]
+        scale = powers[:chunk.shape[-1]]
+        result[..., start:start + chunk.shape[-1]] = scale * (
+            y[..., None] + alpha * np.cumsum(chunk / scale, axis=-1)
+        )
+        y = result[..., start + chunk.shape[-1] - 1]
+
+    return result
+
+
+def sma1(arr: np.ndarray, n: int, m: int, inity: float) -> np.ndarray:
+    """
+    通达信 SMA(X, N, M), 即 Y = (M * X + (N - M) * Y') / N, Y 的初值为 inity
+    ----
+        跳过 nan, 返回的数组只包含非 nan 输入对应的结果
+    """
+    values = np.asarray(arr, dtype=np.float64)
+    return ewm(values[~np.isnan(values)], m / n, inity)
+
+
+def rsv(close: np.ndarray, hhv: np.ndarray, llv: np.ndarray) -> np.ndarray:
+    """未成熟随机值, 最高价等于最低价时为 nan"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (close - llv) / (hhv - llv) * 100
+
+
+def kdj_sma(
+    close: np.ndarray,
+    hhv: np.ndarray,
+    llv: np.ndarray,
+    period: int,
+    init: float = 50
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ArrayManager 的 KDJ, K 和 D 为 sma1(X, period, 1, init)
+    ----
+        无效的 RSV (数据不足或最高价等于最低价) 被跳过, 返回数组只包含有效 RSV 对应的结果
+    """
+    k = sma1(rsv(close, hhv, llv), period, 1, init)
+    d = sma1(k, period, 1, init)
+    return k, d, 3 * k - 2 * d
+
+
+def kdj_ema(
+    close: np.ndarray,
+    hhv: np.ndarray,
+    llv: np.ndarray,
+    slowk_period: int,
+    slowd_period: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Indicators 的 KDJ, K 为 RSV 的 2 * slowk_period - 1 周期 EMA, D 为 K 的 2 * slowd_period - 1 周期 EMA
+    ----
+        K 中的 nan 视为 0
+    """
+    k = talib.EMA(rsv(close, hhv, llv), slowk_period * 2 - 1)
+    np.nan_to_num(k, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    d = talib.EMA(k, slowd_period * 2 - 1)
+    return k, d, k * 3 - d * 2
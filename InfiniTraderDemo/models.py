@@ -1,11 +1,43 @@
 import json
+from collections.abc import MutableMapping
 from datetime import datetime
-from typing import List, Literal, Union
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterator, List, Literal, Tuple, Union
 
 DateTimeType = datetime
 
 
+def _compile_setter(names: tuple):
+    """生成按顺序写入 names 各个槽的函数, 一条赋值语句比逐个 setattr 快, names 只能是声明的字段"""
+    scope: dict = {}
+    exec(f"def setter(self, values):\n    {''.join(f'self.{name}, ' for name in names)}= values\n", scope)
+    return scope["setter"]
+
+
+def _compile_loader(keys: tuple, fields: Dict[str, Any], full: bool):
+    """
+    生成写入字典 (键为 keys) 的函数
+    ----
+        每个声明的字段一条 self.name = payload["name"], 不经过 setattr 和中间的元组, 未声明的键写入 _extra;
+        full 为 True 时 keys 以外声明的字段同时写入默认值, 即一次写入全部字段\n
+        字典缺少 keys 中的键时抛出 KeyError, 已写入的都是字典中的值
+    """
+    lines = [
+        f"    self.{key} = payload[{key!r}]\n" for key in keys if key in fields
+    ]
+    if full:
+        lines += [f"    self.{name} = defaults[{name!r}]\n" for name in fields if name not in keys]
+    if extra := [key for key in keys if key not in fields]:
+        lines.append("    extra = self._extra\n    if extra is None:\n        extra = self._extra = {}\n")
+        lines += [f"    extra[{key!r}] = payload[{key!r}]\n" for key in extra]
+    scope: dict = {"defaults": fields}
+    exec("def loader(self, payload):\n" + ("".join(lines) or "    pass\n"), scope)
+    return scope["loader"]
+
+
 class Base(object):
+    __slots__ = ()
+
     def __str__(self) -> str:
         model_dict = self.__dict__.copy()
         for key, value in model_dict.items():
@@ -14,6 +46,252 @@ class Base(object):
         return json.dumps(model_dict, ensure_ascii=False)
 
 
+class RecordMeta(type):
+    """
+    记录类的元类
+    ----
+        类体中不以下划线开头的非方法类属性为字段, 类属性的值为默认值, 字段从类属性中移除, 改为槽 (__slots__),
+        另外加一个槽 _extra 保存未声明的字段\n
+        子类继承父类的字段, 只声明新增的槽; 下划线开头的类属性仍为类属性\n
+        每个类生成按字段顺序整体读取和写入全部字段的函数, 供构造, copy_from 和 to_dict 使用,
+        从字典写入的函数按字典的键生成, 按 (是否写入全部字段, 键的数量) 分组缓存 (_loaders)
+    """
+
+    def __new__(mcs, name: str, bases: tuple, namespace: dict) -> "RecordMeta":
+        defaults: Dict[str, Any] = {}
+        for base in reversed(bases):
+            defaults.update(getattr(base, "_defaults", {}))
+
+        fields = {
+            key: value for key, value in namespace.items()
+            if not key.startswith("_") and not callable(value) and not isinstance(value, (property, classmethod))
+        }
+        for key in fields:
+            del namespace[key]
+        slots = tuple(key for key in fields if key not in defaults)
+        defaults.update(fields)
+
+        namespace["__slots__"] = slots if any(hasattr(base, "_defaults") for base in bases) else slots + ("_extra",)
+        namespace["_defaults"] = defaults
+        namespace["_values"] = tuple(defaults.values())
+        namespace["_loaders"] = {}
+        cls = super().__new__(mcs, name, bases, namespace)
+
+        if len(defaults) > 1:
+            names = tuple(defaults)
+            cls._get_attrs = staticmethod(attrgetter(*names))
+            cls._set_all = _compile_setter(names)
+        return cls
+
+
+def compact_record(cls: type, name: str = None, **extra_fields) -> RecordMeta:
+    """
+    按 cls 的字段生成槽存储的记录类
+    ----
+        字段和默认值取 cls 中不以下划线开头的非方法类属性, 生成的类与 cls 没有继承关系\n
+        赋值给模块中同名的变量后可以 pickle
+
+    Args:
+        cls: 类属性声明默认值的类, 如 vtObject.KLineData\n
+        name: 类名, 默认为 Compact 加 cls 的类名\n
+        extra_fields: 另外声明的字段和默认值, 如引擎字典中固定出现的其他键, 避免写入 _extra
+    """
+    name = name or f"Compact{cls.__name__}"
+    fields = {
+        key: value for key, value in vars(cls).items()
+        if not key.startswith("_") and not callable(value) and not isinstance(value, (property, classmethod))
+    }
+    return RecordMeta(name, (Record,), dict(
+        fields,
+        **extra_fields,
+        __module__=cls.__module__,
+        __qualname__=name,
+        __doc__=f"{cls.__doc__}, 字段存放在槽中, 见 models.Record"
+    ))
+
+
+class RecordDict(MutableMapping):
+    """
+    记录的字段字典视图
+    ----
+        记录没有实例字典, __dict__ 返回该视图, 原来通过 __dict__ 读写字段的代码 (__dict__.update, __dict__[key],
+        bar.__dict__ = d) 不需要修改, 写入直接修改记录的槽\n
+        包含全部声明的字段 (未赋值的为默认值) 和未声明的字段, 删除声明的字段时恢复为默认值
+    """
+
+    __slots__ = ("_record",)
+
+    def __init__(self, record: "Record") -> None:
+        self._record = record
+
+    def __getitem__(self, key: str) -> Any:
+        record = self._record
+        if key in record._defaults:
+            return getattr(record, key)
+        if record._extra and key in record._extra:
+            return record._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._record._load({key: value})
+
+    def __delitem__(self, key: str) -> None:
+        record = self._record
+        if key in record._defaults:
+            setattr(record, key, record._defaults[key])
+        elif record._extra and key in record._extra:
+            del record._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._record.to_dict())
+
+    def __len__(self) -> int:
+        return len(self._record._defaults) + len(self._record._extra or ())
+
+    def __repr__(self) -> str:
+        return repr(self._record.to_dict())
+
+    def update(self, *args, **kwargs) -> None:
+        """与 dict.update 相同, 直接写入槽"""
+        for payload in args:
+            self._record._load(payload if isinstance(payload, dict) else dict(payload))
+        if kwargs:
+            self._record._load(kwargs)
+
+    def copy(self) -> dict:
+        return self._record.to_dict()
+
+
+class Record(Base, metaclass=RecordMeta):
+    """
+    字段存放在槽 (__slots__) 中的记录
+    ----
+        vtObject 中的 Tick 和 K 线仍为类属性声明默认值的 dataclass, 需要时用 compact_record 生成字段相同的记录类,
+        如 vtObject.CompactKLineData, 实例不再有实例字典, 内存约为原来的 40%, 属性读取与普通属性相同\n
+        构造时全部字段写入默认值; 未声明的字段 (引擎字典中的其他键) 可以通过 from_dict 或 __dict__ 写入, 读取与普通属性
+        相同, 但不能直接用属性赋值新增\n
+        from_dict 和 __dict__ 写入字典时, 按字典的键生成一个逐字段赋值的函数, 缓存在 _loaders 中,
+        引擎推送的字典每次的键相同, 只在第一次生成\n
+        查找时不构造键的元组, 依次调用键的数量相同的函数, 字典的键全部存在 (没有 KeyError) 即键相同;
+        同一数量超过 _max_loaders 个不同的键时逐个 setattr
+    """
+
+    _max_loaders = 8
+    """每组 (是否写入全部字段, 键的数量) 缓存的写入函数数量上限"""
+
+    _defaults: Dict[str, Any] = {}
+    _values: tuple = ()
+    _loaders: Dict[Tuple[bool, int], List[Callable]] = {}
+
+    def __init__(self, **fields) -> None:
+        self._set_all(self._values)
+        self._extra = None
+        if fields:
+            self._load(fields)
+
+    @classmethod
+    def from_dict(cls, payload: dict = None, *payloads: dict) -> "Record":
+        """
+        从字典构造, 多个字典依次写入, 后面的覆盖前面的
+
+        Args:
+            payload: 字段字典, 如 ctaEngine 推送的 Tick 和 K 线字典\n
+            payloads: 之后依次写入的字典
+        """
+        record = cls.__new__(cls)
+        record._extra = None
+        record._load(payload or {}, True)
+        for payload in payloads:
+            record._load(payload)
+        return record
+
+    def _load(self, payload: dict, full: bool = False) -> None:
+        """
+        写入字典, 未声明的字段写入 _extra
+
+        Args:
+            payload: 字段字典\n
+            full: 是否同时把字典中没有的字段写入默认值
+        """
+        loaders = self._loaders.get((full, len(payload)))
+        if loaders is None:
+            loaders = self._loaders[(full, len(payload))] = []
+
+        for loader in loaders:
+            try:
+                return loader(self, payload)
+            except KeyError:
+                pass
+
+        if len(loaders) < self._max_loaders and all(isinstance(key, str) for key in payload):
+            loader = _compile_loader(tuple(payload), self._defaults, full)
+            loaders.insert(0, loader)
+            return loader(self, payload)
+
+        if full:
+            self._set_all(self._values)
+        for key, value in payload.items():
+            try:
+                setattr(self, key, value)
+            except (AttributeError, TypeError):
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def copy_from(self, other: "Record") -> None:
+        """复制另一条记录的全部字段"""
+        self._set_all(self._get_attrs(other))
+        self._extra = dict(other._extra) if other._extra else None
+
+    def __getattr__(self, name: str) -> Any:
+        """只在槽没有赋值 (如 pickle 恢复之前) 或者字段未声明时调用"""
+        if name == "_extra":
+            return None
+        if name in self._defaults:
+            return self._defaults[name]
+        if self._extra and name in self._extra:
+            return self._extra[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def __dict__(self) -> RecordDict:
+        return RecordDict(self)
+
+    @__dict__.setter
+    def __dict__(self, payload: dict) -> None:
+        self._extra = None
+        self._load(payload if isinstance(payload, dict) else dict(payload), full=True)
+
+    def to_dict(self) -> dict:
+        """全部字段, 按声明顺序, 最后为未声明的字段"""
+        result = dict(zip(self._defaults, self._get_attrs(self)))
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def __getstate__(self) -> dict:
+        return self.to_dict()
+
+    def __setstate__(self, state: dict) -> None:
+        """兼容 dataclass 的 pickle (状态为实例字典)"""
+        self.__dict__ = state
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={value!r}' for key, value in self.to_dict().items())})"
+
+    def __str__(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+
+
 class Position(object):
     """合约持仓数据"""
     _direction_map = {"多": "long", "空": "short"}
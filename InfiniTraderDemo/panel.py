@@ -0,0 +1,488 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import kernels
+
+DateTimeType = datetime
+"""类中定义了 datetime 属性, 类型注解使用别名"""
+
+
+class KLinePanel(object):
+    """
+    多合约 K 线面板
+    ----
+        所有合约的 K 线存放在同一组二维数组 (合约 x K 线) 中, 指标对全部合约一次计算\n
+        每个合约一行, 从第 0 列开始按时间顺序存放自己的 K 线, 行长度由 counts 记录, 不足部分为 nan,
+        因此上市时间不同 (历史长度不同) 以及交易时段不同 (如没有夜盘) 的合约, 指标都只在自己的 K 线上滚动计算\n
+        aligned 把任意行矩阵按时间对齐到全部合约 K 线时间的并集上, 缺失的 K 线为 nan\n
+        指标方法与 Indicators 一致, array 为 False 时返回每个合约最后一根 K 线的指标 (一维数组, 按 instruments 顺序),
+        为 True 时返回行矩阵; 同一数据版本内相同参数的指标只计算一次,
+        只取最新值的窗口类指标只计算每个合约最后一个窗口, 递推类指标 (EMA, RSI, MACD) 保存状态矩阵, 写入后只递推新增或被覆盖的 K 线
+
+    Args:
+        instruments: 合约代码列表\n
+        capacity: 每个合约的初始容量
+    """
+
+    columns = ("open", "high", "low", "close", "volume")
+
+    def __init__(self, instruments: Iterable[str], capacity: int = 1024) -> None:
+        self.instruments: List[str] = list(instruments)
+        self.index: Dict[str, int] = {instrument: i for i, instrument in enumerate(self.instruments)}
+
+        if len(self.index) != len(self.instruments):
+            raise ValueError("合约代码不能重复")
+
+        shape = (len(self.instruments), max(1, capacity))
+        self._data: Dict[str, np.ndarray] = {name: np.full(shape, np.nan) for name in self.columns}
+        self._times = np.full(shape, np.datetime64("NaT"), dtype="datetime64[us]")
+
+        self.counts = np.zeros(len(self.instruments), dtype=np.int64)
+        """每个合约的 K 线数量"""
+
+        self.data_version: int = 0
+        self._cache: Dict[tuple, np.ndarray] = {}
+        self._cache_version: int = 0
+        self._states: Dict[tuple, dict] = {}
+        """递推类指标 (EMA, RSI, MACD) 的状态矩阵, 写入后只重算变化的部分"""
+
+    @property
+    def capacity(self) -> int:
+        return self._times.shape[1]
+
+    @property
+    def width(self) -> int:
+        """最长的合约 K 线数量, 即行矩阵的列数"""
+        return int(self.counts.max()) if len(self.counts) else 0
+
+    def _reserve(self, width: int) -> None:
+        if width <= self.capacity:
+            return
+
+        capacity = self.capacity
+        while capacity < width:
+            capacity *= 2
+
+        for name, array in self._data.items():
+            grown = np.full((len(self.instruments), capacity), np.nan)
+            grown[:, :array.shape[1]] = array
+            self._data[name] = grown
+
+        times = np.full((len(self.instruments), capacity), np.datetime64("NaT"), dtype="datetime64[us]")
+        times[:, :self._times.shape[1]] = self._times
+        self._times = times
+
+    def append(
+        self,
+        instrument: str,
+        _datetime: DateTimeType,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float = 0
+    ) -> None:
+        """
+        写入一根 K 线
+        ----
+            时间与该合约最后一根相同则覆盖 (正在走的 K 线), 更晚则追加, 更早则抛出 ValueError
+        """
+        row = self.index[instrument]
+        count = int(self.counts[row])
+        _datetime = np.datetime64(_datetime, "us")
+
+        if count and _datetime < self._times[row, count - 1]:
+            raise ValueError(f"{instrument} K 线时间 {_datetime} 早于最后一根 K 线")
+
+        if not count or _datetime > self._times[row, count - 1]:
+            self._reserve(count + 1)
+            count += 1
+            self.counts[row] = count
+
+        column = count - 1
+        self._touch(row, column)
+        self._times[row, column] = _datetime
+        for name, value in zip(self.columns, (open, high, low, close, volume)):
+            self._data[name][row, column] = value
+
+        self.data_version += 1
+
+    def _touch(self, row: int, column: int) -> None:
+        """记录递推状态需要从 column 开始重算"""
+        for state in self._states.values():
+            if column < state["dirty"][row]:
+                state["dirty"][row] = column
+
+    def append_kline(self, kline) -> None:
+        """写入一根 KLineData, 合约代码取 kline.symbol"""
+        self.append(kline.symbol, kline.datetime, kline.open, kline.high, kline.low, kline.close, kline.volume)
+
+    def extend(self, instrument: str, klines: List[dict]) -> None:
+        """批量追加 K 线, 字段与 KLineContainer 中的 K 线一致, 不晚于最后一根的 K 线以及空 K 线忽略"""
+        row = self.index[instrument]
+        count = int(self.counts[row])
+
+        klines = [kline for kline in klines if kline.get("open")]
+        if count:
+            last = self._times[row, count - 1]
+            klines = [kline for kline in klines if np.datetime64(kline["datetime"], "us") > last]
+
+        if not klines:
+            return
+
+        self._reserve(count + len(klines))
+        end = count + len(klines)
+
+        self._times[row, count:end] = [kline["datetime"] for kline in klines]
+        for name in self.columns:
+            self._data[name][row, count:end] = [kline[name] for kline in klines]
+
+        self.counts[row] = end
+        self.data_version += 1
+
+    def field(self, name: str) -> np.ndarray:
+        """字段的行矩阵视图 (合约 x K 线)"""
+        return self._data[name][:, :self.width]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.field("open")
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.field("high")
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.field("low")
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.field("close")
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.field("volume")
+
+    @property
+    def datetime(self) -> np.ndarray:
+        """K 线时间行矩阵, 不足部分为 NaT"""
+        return self._times[:, :self.width]
+
+    @property
+    def last_datetime(self) -> np.ndarray:
+        """每个合约最后一根 K 线的时间, 没有 K 线为 NaT"""
+        return self.latest(self.datetime)
+
+    def latest(self, matrix: np.ndarray) -> np.ndarray:
+        """取每个合约最后一根 K 线对应的值"""
+        rows = np.arange(len(self.instruments))
+        columns = np.maximum(self.counts - 1, 0)
+        result = matrix[rows, columns] if matrix.shape[1] else np.full(len(rows), np.nan, dtype=matrix.dtype)
+        empty = self.counts == 0
+        if empty.any():
+            result = result.copy()
+            result[empty] = np.datetime64("NaT") if result.dtype.kind == "M" else np.nan
+        return result
+
+    def to_dict(self, values: np.ndarray) -> Dict[str, float]:
+        """按合约代码取出 latest 或 array=False 的结果"""
+        return dict(zip(self.instruments, values.tolist()))
+
+    def aligned(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        把行矩阵按时间对齐
+        ----
+            时间轴为全部合约 K 线时间的并集, 合约在某个时间没有 K 线 (未上市, 休市, 断线) 时为 nan
+
+        Returns:
+            (时间轴, 对齐后的矩阵 合约 x 时间轴)
+        """
+        times = self.datetime
+        valid = ~np.isnat(times)
+        axis = np.unique(times[valid])
+
+        result = np.full((len(self.instruments), len(axis)), np.nan)
+        rows, columns = np.nonzero(valid)
+        result[rows, np.searchsorted(axis, times[valid])] = matrix[rows, columns]
+        return axis, result
+
+    def _cached(self, key: tuple, func: Callable[[], np.ndarray]) -> Union[np.ndarray, tuple]:
+        if self._cache_version != self.data_version:
+            self._cache.clear()
+            self._cache_version = self.data_version
+
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+
+    def _tail(self, matrix: np.ndarray, length: int) -> np.ndarray:
+        """每个合约最后 length 根 K 线对应的值, 按行末对齐, K 线不足的部分为 nan"""
+        columns = self.counts[:, None] - length + np.arange(length)
+        if not matrix.shape[1]:
+            return np.full(columns.shape, np.nan)
+
+        rows = np.arange(len(self.instruments))[:, None]
+        result = matrix[rows, np.clip(columns, 0, matrix.shape[1] - 1)]
+        result[columns < 0] = np.nan
+        return result
+
+    @staticmethod
+    def _rolling(matrix: np.ndarray, timeperiod: int, reduce: Callable[..., np.ndarray]) -> np.ndarray:
+        """沿时间滚动, 前 timeperiod - 1 列为 nan"""
+        result = np.full(matrix.shape, np.nan)
+        if matrix.shape[1] >= timeperiod:
+            result[:, timeperiod - 1:] = reduce(sliding_window_view(matrix, timeperiod, axis=1), axis=-1)
+        return result
+
+    def _window(
+        self,
+        name: str,
+        matrix: np.ndarray,
+        timeperiod: int,
+        reduce: Callable[..., np.ndarray],
+        array: bool
+    ) -> np.ndarray:
+        """窗口类指标, 只取最新值时只计算每个合约最后一个窗口"""
+        if array:
+            return self._cached((name, timeperiod), lambda: self._rolling(matrix, timeperiod, reduce))
+        return self._cached(
+            (name, timeperiod, "latest"),
+            lambda: reduce(self._tail(matrix, timeperiod), axis=-1)
+        )
+
+    @staticmethod
+    def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        """沿时间计算真实波幅, 第一列为 nan"""
+        result = np.full(close.shape, np.nan)
+        prev_close = close[:, :-1]
+        result[:, 1:] = np.maximum.reduce([
+            high[:, 1:] - low[:, 1:],
+            np.abs(prev_close - low[:, 1:]),
+            np.abs(prev_close - high[:, 1:])
+        ])
+        return result
+
+    @staticmethod
+    def _ema(matrix: np.ndarray, timeperiod: int) -> np.ndarray:
+        """talib 的 EMA, 以前 timeperiod 个值的均值为初值"""
+        result = np.full(matrix.shape, np.nan)
+        if matrix.shape[1] >= timeperiod:
+            seed = matrix[:, :timeperiod].mean(axis=1)
+            result[:, timeperiod - 1] = seed
+            result[:, timeperiod:] = kernels.ewm(matrix[:, timeperiod:], 2 / (timeperiod + 1), seed)
+        return result
+
+    def _recursive(
+        self,
+        key: tuple,
+        seed: int,
+        full: Callable[[], Tuple[np.ndarray, ...]],
+        step: Callable[[np.ndarray, np.ndarray, Tuple[np.ndarray, ...]], Tuple[np.ndarray, ...]]
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        递推类指标的状态矩阵
+        ----
+            第一次计算调用 full 得到全部状态矩阵, 之后只对有新写入的合约, 从最早写入的列开始调用 step 递推,
+            递推的初值为状态矩阵中前一列的值
+
+            有合约的重算起点不晚于 seed 列 (新合约历史不足) 时重新全量计算
+
+        Args:
+            key: 指标及参数
+
+            seed: 状态矩阵中第一个有效值所在的列
+
+            full: 全量计算, 返回与 K 线对齐的状态矩阵
+
+            step: step(rows, columns, previous) 计算 rows 行在 columns 列 (行 x 列) 上的状态, previous 为前一列的状态
+        """
+        counts, width = self.counts, self.width
+        state = self._states.get(key)
+
+        if state is not None:
+            rows = np.nonzero(state["dirty"] < counts)[0]
+            if not len(rows):
+                return tuple(matrix[:, :width] for matrix in state["values"])
+
+            length = int((counts[rows] - state["dirty"][rows]).max())
+            starts = counts[rows] - length
+            if starts.min() > seed:
+                values = state["values"]
+                if values[0].shape[1] < width:
+                    padding = np.full((len(counts), self.capacity - values[0].shape[1]), np.nan)
+                    values = state["values"] = [np.hstack([matrix, padding]) for matrix in values]
+
+                columns = starts[:, None] + np.arange(length)
+                previous = tuple(matrix[rows, starts - 1] for matrix in values)
+                for matrix, result in zip(values, step(rows[:, None], columns, previous)):
+                    matrix[rows[:, None], columns] = result
+
+                state["dirty"] = counts.copy()
+                return tuple(matrix[:, :width] for matrix in values)
+
+        self._states[key] = {"values": list(full()), "dirty": counts.copy()}
+        return tuple(self._states[key]["values"])
+
+    def sma(self, timeperiod: int = 9, array: bool = False) -> np.ndarray:
+        """简单均线"""
+        return self._window("sma", self.close, timeperiod, np.mean, array)
+
+    def ema(self, timeperiod: int = 12, array: bool = False) -> np.ndarray:
+        """EXPMA 指标"""
+        close, alpha = self.close, 2 / (timeperiod + 1)
+        (result,) = self._recursive(
+            ("ema", timeperiod),
+            timeperiod - 1,
+            lambda: (self._ema(close, timeperiod),),
+            lambda rows, columns, previous: (kernels.ewm(close[rows, columns], alpha, previous[0]),)
+        )
+        return result if array else self.latest(result)
+
+    def std(self, timeperiod: int = 5, array: bool = False) -> np.ndarray:
+        """标准差, 与 Indicators.std 一致为样本标准差"""
+        return self._window(
+            "std", self.close, timeperiod, lambda window, axis: window.std(axis=axis, ddof=1), array
+        )
+
+    def hhv(self, timeperiod: int = 30, array: bool = False) -> np.ndarray:
+        """移动最高"""
+        return self._window("hhv", self.high, timeperiod, np.max, array)
+
+    def llv(self, timeperiod: int = 30, array: bool = False) -> np.ndarray:
+        """移动最低"""
+        return self._window("llv", self.low, timeperiod, np.min, array)
+
+    def rsi(self, timeperiod: int = 14, array: bool = False) -> np.ndarray:
+        """RSI 相对强弱指数, Wilder 平滑, 与 talib.RSI 一致"""
+        close, alpha = self.close, 1 / timeperiod
+
+        def full() -> Tuple[np.ndarray, np.ndarray]:
+            avg_gain = np.full(close.shape, np.nan)
+            avg_loss = np.full(close.shape, np.nan)
+            if close.shape[1] > timeperiod:
+                change = np.diff(close, axis=1)
+                gain, loss = np.maximum(change, 0), np.maximum(-change, 0)
+                avg_gain[:, timeperiod] = gain[:, :timeperiod].mean(axis=1)
+                avg_loss[:, timeperiod] = loss[:, :timeperiod].mean(axis=1)
+                avg_gain[:, timeperiod + 1:] = kernels.ewm(gain[:, timeperiod:], alpha, avg_gain[:, timeperiod])
+                avg_loss[:, timeperiod + 1:] = kernels.ewm(loss[:, timeperiod:], alpha, avg_loss[:, timeperiod])
+            return avg_gain, avg_loss
+
+        def step(rows: np.ndarray, columns: np.ndarray, previous: tuple) -> Tuple[np.ndarray, np.ndarray]:
+            change = close[rows, columns] - close[rows, columns - 1]
+            return (
+                kernels.ewm(np.maximum(change, 0), alpha, previous[0]),
+                kernels.ewm(np.maximum(-change, 0), alpha, previous[1])
+            )
+
+        avg_gain, avg_loss = self._recursive(("rsi", timeperiod), timeperiod, full, step)
+        if not array:
+            avg_gain, avg_loss = self.latest(avg_gain), self.latest(avg_loss)
+
+        def compute() -> np.ndarray:
+            total = avg_gain + avg_loss
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = np.where(np.abs(total) < 1e-8, 0.0, 100 * avg_gain / total)
+            result[np.isnan(total)] = np.nan
+            return result
+
+        return self._cached(("rsi", timeperiod, array), compute)
+
+    def tr(self, array: bool = False) -> np.ndarray:
+        """真实波幅, 第一根 K 线为 nan"""
+        if array:
+            return self._cached(("tr",), lambda: self._true_range(self.high, self.low, self.close))
+        return self._cached(
+            ("tr", "latest"),
+            lambda: self._true_range(*(self._tail(matrix, 2) for matrix in (self.high, self.low, self.close)))[:, -1]
+        )
+
+    def atr(self, timeperiod: int = 14, array: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        真实波幅均值, 与 Indicators.atr 一致为真实波幅的简单均值
+
+        Returns:
+            (atr, tr), 与 K 线对齐, 第一列为 nan
+        """
+        if not array:
+            def latest() -> np.ndarray:
+                tails = (self._tail(matrix, timeperiod + 1) for matrix in (self.high, self.low, self.close))
+                return self._true_range(*tails)[:, 1:].mean(axis=1)
+
+            return self._cached(("atr", timeperiod, "latest"), latest), self.tr()
+
+        tr = self.tr(array=True)
+
+        def compute() -> np.ndarray:
+            result = np.full(tr.shape, np.nan)
+            result[:, 1:] = self._rolling(tr[:, 1:], timeperiod, np.mean)
+            return result
+
+        return self._cached(("atr", timeperiod), compute), tr
+
+    def macd(
+        self,
+        fast_period: int = 12,
+        slow_period: int = 26,
+        signal_period: int = 9,
+        array: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """MACD 指标, 与 talib.MACD 一致, 柱状值与 Indicators.macd 一致乘以 2"""
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+
+        close = self.close
+        start = slow_period - 1
+        alphas = (2 / (fast_period + 1), 2 / (slow_period + 1), 2 / (signal_period + 1))
+
+        def full() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+            fast = np.full(close.shape, np.nan)
+            slow = np.full(close.shape, np.nan)
+            signal = np.full(close.shape, np.nan)
+
+            if close.shape[1] > start:
+                """快线在慢线的第一个有效值处以最近 fast_period 个收盘价的均值为初值"""
+                slow = self._ema(close, slow_period)
+                fast[:, start] = close[:, start - fast_period + 1:start + 1].mean(axis=1)
+                fast[:, start + 1:] = kernels.ewm(close[:, start + 1:], alphas[0], fast[:, start])
+                signal[:, start:] = self._ema(fast[:, start:] - slow[:, start:], signal_period)
+
+            return fast, slow, signal
+
+        def step(rows: np.ndarray, columns: np.ndarray, previous: tuple) -> Tuple[np.ndarray, ...]:
+            values = close[rows, columns]
+            fast = kernels.ewm(values, alphas[0], previous[0])
+            slow = kernels.ewm(values, alphas[1], previous[1])
+            return fast, slow, kernels.ewm(fast - slow, alphas[2], previous[2])
+
+        fast, slow, signal = self._recursive(
+            ("macd", fast_period, slow_period, signal_period), start + signal_period - 1, full, step
+        )
+
+        if not array:
+            fast, slow, signal = (self.latest(matrix) for matrix in (fast, slow, signal))
+
+        def compute() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+            macd = fast - slow
+            macd[np.isnan(signal)] = np.nan
+            return macd, signal, (macd - signal) * 2
+
+        return self._cached(("macd", fast_period, slow_period, signal_period, array), compute)
+
+    def boll(self, timeperiod: int = 20, deviation: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """布林通道, 每个合约最后一根 K 线的 (上轨, 下轨)"""
+        mid, std = self.sma(timeperiod), self.std(timeperiod)
+        return mid + std * deviation, mid - std * deviation
+
+    def keltner(self, timeperiod: int = 20, multiple: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """肯特纳通道, 每个合约最后一根 K 线的 (上轨, 下轨)"""
+        mid, (atr, _) = self.ema(timeperiod), self.atr(timeperiod)
+        return mid + atr * multiple, mid - atr * multiple
+
+    def donchian(self, timeperiod: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """唐奇安通道, 每个合约最后一根 K 线的 (上轨, 下轨)"""
+        return self.hhv(timeperiod), self.llv(timeperiod)
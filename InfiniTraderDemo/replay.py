@@ -0,0 +1,178 @@
+from itertools import chain, islice, repeat
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from vtObject import KLineData
+
+
+class BarView(object):
+    """
+    历史 K 线的轻量视图
+    ----
+        开高低收, 成交量, 持仓量和时间放在槽 (__slots__) 中, 读取与普通属性相同, 不创建实例字典\n
+        其他字段 (date, time, symbol 等) 按需依次从原始 K 线字典, BarChunk 的 extra 和 KLineData 的默认值中读取,
+        与 K 线对象的属性访问一致\n
+        需要修改其他字段或长期保存时用 to_kline 转为 K 线对象
+    """
+
+    __slots__ = ("_chunk", "_record", "open", "high", "low", "close", "volume", "openInterest", "datetime")
+
+    def __init__(self, chunk: "BarChunk", record: dict) -> None:
+        self._chunk = chunk
+        self._record = record
+        self.open = record["open"]
+        self.high = record["high"]
+        self.low = record["low"]
+        self.close = record["close"]
+        self.volume = record["volume"]
+        self.openInterest = record.get(chunk.open_interest, 0)
+        self.datetime = record.get("datetime")
+
+    def __getattr__(self, name: str):
+        if name in self._record:
+            return self._record[name]
+        if name in self._chunk.extra:
+            return self._chunk.extra[name]
+        return getattr(KLineData, name)
+
+    def __repr__(self) -> str:
+        return f"BarView({self._record})"
+
+    def to_kline(self) -> KLineData:
+        """转为 K 线对象, 与逐根 __dict__.update 的结果相同"""
+        return self._chunk.to_kline(self._record)
+
+
+class BarChunk(object):
+    """
+    一段历史 K 线的列式缓冲
+    ----
+        保存一段原始 K 线字典, 迭代时逐根生成 BarView\n
+        column 按需把一列转为 numpy 数组并缓存, 按段处理的调用方 (批量写入序列, 向量化计算指标) 不需要逐根访问\n
+        from_columns 由列数据创建, 第一次逐根访问时才转为 K 线字典
+
+    Args:
+        records: 升序的 K 线字典\n
+        extra: 每根 K 线共同的字段, 如 exchange, symbol\n
+        open_interest: 持仓量在 K 线字典中的键\n
+        kline_class: to_kline 生成的 K 线类, 需要长期保存大量 K 线对象时可以用 CompactKLineData
+    """
+
+    __slots__ = ("_records", "extra", "open_interest", "kline_class", "_columns")
+
+    def __init__(
+        self,
+        records: List[dict],
+        extra: dict = None,
+        open_interest: str = "openInterest",
+        kline_class: type = KLineData
+    ) -> None:
+        self._records = records
+        self.extra: dict = extra or {}
+        self.open_interest = open_interest
+        self.kline_class = kline_class
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: Dict[str, np.ndarray],
+        extra: dict = None,
+        open_interest: str = "openInterest",
+        kline_class: type = KLineData
+    ) -> "BarChunk":
+        """
+        由列数据创建, 如共享 K 线的快照
+
+        Args:
+            columns: 升序的各列数据, 列名与 K 线字典的键一致, 需包含 datetime
+        """
+        chunk = cls(None, extra, open_interest, kline_class)
+        chunk._columns = {
+            ("openInterest" if name == open_interest else name): column for name, column in columns.items()
+        }
+        return chunk
+
+    @property
+    def records(self) -> List[dict]:
+        """原始 K 线字典, 由列数据创建时第一次读取才逐根转换"""
+        if self._records is None:
+            keys = [self.open_interest if name == "openInterest" else name for name in self._columns]
+            self._records = [
+                dict(zip(keys, row)) for row in zip(*(column.tolist() for column in self._columns.values()))
+            ]
+        return self._records
+
+    def __len__(self) -> int:
+        if self._records is None:
+            return len(self._columns["datetime"])
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[BarView]:
+        return map(BarView, repeat(self), self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        一列数据, 第一次读取时转换后缓存
+
+        Args:
+            name: open, high, low, close, volume, openInterest 为 float64, datetime 为 datetime64[us], 其他列为 object
+        """
+        if name not in self._columns:
+            key = self.open_interest if name == "openInterest" else name
+            if name == "datetime":
+                column = np.array([record["datetime"] for record in self.records], dtype="datetime64[us]")
+            elif name in ("open", "high", "low", "close", "volume", "openInterest"):
+                column = np.fromiter((record.get(key, 0) for record in self.records), np.float64, len(self.records))
+            else:
+                column = np.array([record.get(key) for record in self.records], dtype=object)
+            self._columns[name] = column
+        return self._columns[name]
+
+    def to_kline(self, record: dict) -> KLineData:
+        """K 线字典转为 K 线对象, 先写入 extra, 持仓量的键不是 openInterest 时同时写入 openInterest"""
+        kline = self.kline_class()
+        kline.__dict__.update(self.extra)
+        kline.__dict__.update(record)
+        if self.open_interest != "openInterest":
+            kline.openInterest = record[self.open_interest]
+        return kline
+
+    def klines(self) -> Iterator[KLineData]:
+        """逐根转为 K 线对象, 给需要 K 线对象的旧回调使用"""
+        return map(self.to_kline, self.records)
+
+
+def replay(
+    records: Iterable[dict],
+    chunk_size: int = 1024,
+    extra: dict = None,
+    open_interest: str = "openInterest",
+    kline_class: type = KLineData
+) -> Iterator[BarChunk]:
+    """
+    按段回放历史 K 线
+    ----
+        records 可以是生成器, 每次只取出 chunk_size 根组成 BarChunk, 调用方可以按段处理, 也可以逐根迭代 BarView
+
+    Args:
+        records: 升序的 K 线字典\n
+        chunk_size: 每段 K 线数量\n
+        extra: 每根 K 线共同的字段\n
+        open_interest: 持仓量在 K 线字典中的键\n
+        kline_class: 转换后的 K 线类, 见 BarChunk
+    """
+    iterator = iter(records)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield BarChunk(chunk, extra, open_interest, kline_class)
+
+
+def iter_views(chunks: Iterable[BarChunk]) -> Iterator[BarView]:
+    """逐根迭代各段的 BarView"""
+    return chain.from_iterable(chunks)
+
+
+def iter_klines(chunks: Iterable[BarChunk]) -> Iterator[KLineData]:
+    """逐根迭代各段转换后的 K 线对象"""
+    return chain.from_iterable(chunk.klines() for chunk in chunks)
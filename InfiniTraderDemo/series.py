@@ -0,0 +1,646 @@
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+DateTimeType = datetime
+
+PRICE_COLUMNS = ("open", "high", "low", "close")
+
+
+def _try_lock(fd: int) -> bool:
+    """非阻塞获取文件的独占锁, 已被其他进程 (或同一进程的其他文件描述符) 持有时返回 False, 进程退出时由操作系统释放"""
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def compact_dtype(name: str, price_decimals: int = None) -> Union[np.dtype, None]:
+    """
+    紧凑存储的列类型
+    ----
+        价格为 float32, 给定 price_decimals 时为放大 10 ** price_decimals 倍的 int32, 转回 float64 后与原价格完全一致\n
+        成交量和持仓量为 int32, 其他列 (时间) 返回 None, 沿用原类型
+    """
+    if name in PRICE_COLUMNS:
+        return np.dtype(np.float32 if price_decimals is None else np.int32)
+    if name in ("volume", "open_interest"):
+        return np.dtype(np.int32)
+    return None
+
+
+def decode(array: np.ndarray, scale: int = None) -> np.ndarray:
+    """紧凑存储的列转为 float64, scale 为价格的放大倍数"""
+    if scale is None:
+        return array.astype(np.float64)
+    return array / scale
+
+
+class KLineSeries(object):
+    """K 线列式存储
+    ----
+        预分配的开高低收, 成交量, 时间, 持仓量七列数组, 容量不足时按倍数扩容\n
+        追加为均摊 O(1), 乱序 K 线原地插入, 不重新分配内存\n
+        各列属性返回长度为当前 K 线数量的连续视图 (零拷贝), 可以直接传给 talib\n
+        紧凑模式下价格, 成交量和持仓量按 compact_dtype 存储, 每根 K 线由 56 字节降为 32 字节,
+        各列属性在第一次读取时转为 float64 并缓存到下一次写入, 只有读取的列产生 float64 副本
+
+    Note:
+        视图只在下一次写入之前有效, 扩容后旧视图不会再随新数据更新\n
+        紧凑模式下各列属性为副本, 修改不会写回序列
+
+    Args:
+        capacity: 初始容量\n
+        compact: 是否使用紧凑存储\n
+        price_decimals: 价格小数位数, 给定时价格按放大后的 int32 存储 (隐含 compact), 否则为 float32
+    """
+
+    columns = ("open", "high", "low", "close", "volume", "datetime", "open_interest")
+
+    def __init__(self, capacity: int = 2048, compact: bool = False, price_decimals: int = None) -> None:
+        if capacity < 1:
+            raise ValueError("容量必须大于 0")
+
+        self.compact: bool = compact or price_decimals is not None
+        self._scales: Dict[str, int] = (
+            {name: 10 ** price_decimals for name in PRICE_COLUMNS}
+            if price_decimals is not None else {}
+        )
+        """价格列的放大倍数"""
+
+        self._size: int = 0
+        self._capacity: int = capacity
+        self._data = {
+            name: np.zeros(capacity, dtype=self._column_dtype(name, price_decimals))
+            for name in self.columns
+        }
+        self._decoded: Dict[str, np.ndarray] = {}
+        """紧凑模式下已转为 float64 的列, 写入时清空"""
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _dtype(name: str) -> Union[str, np.dtype]:
+        """列的数据类型"""
+        return "datetime64[us]" if name == "datetime" else np.float64
+
+    def _column_dtype(self, name: str, price_decimals: int = None) -> Union[str, np.dtype]:
+        if self.compact and (dtype := compact_dtype(name, price_decimals)) is not None:
+            return dtype
+        return self._dtype(name)
+
+    @property
+    def capacity(self) -> int:
+        """当前容量"""
+        return self._capacity
+
+    @property
+    def nbytes(self) -> int:
+        """已分配内存字节数"""
+        return sum(array.nbytes for array in self._data.values())
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        内存占用
+        ----
+            nbytes 为已分配的字节数, float64 为同样容量的非紧凑存储的字节数, decoded 为当前缓存的 float64 副本的字节数
+        """
+        return {
+            "nbytes": self.nbytes,
+            "float64": self._capacity * np.dtype(np.float64).itemsize * len(self.columns),
+            "decoded": sum(array.nbytes for array in self._decoded.values())
+        }
+
+    def raw(self, name: str) -> np.ndarray:
+        """按存储类型返回列的视图, 紧凑模式下不转换"""
+        return self._data[name][:self._size]
+
+    def _view(self, name: str) -> np.ndarray:
+        if not self.compact or name == "datetime":
+            return self._data[name][:self._size]
+
+        if (array := self._decoded.get(name)) is None:
+            array = self._decoded[name] = decode(self._data[name][:self._size], self._scales.get(name))
+        return array
+
+    @property
+    def open(self) -> np.ndarray:
+        """开盘价序列"""
+        return self._view("open")
+
+    @property
+    def high(self) -> np.ndarray:
+        """最高价序列"""
+        return self._view("high")
+
+    @property
+    def low(self) -> np.ndarray:
+        """最低价序列"""
+        return self._view("low")
+
+    @property
+    def close(self) -> np.ndarray:
+        """收盘价序列"""
+        return self._view("close")
+
+    @property
+    def volume(self) -> np.ndarray:
+        """成交量序列"""
+        return self._view("volume")
+
+    @property
+    def datetime(self) -> np.ndarray:
+        """时间序列"""
+        return self._view("datetime")
+
+    @property
+    def open_interest(self) -> np.ndarray:
+        """持仓量序列"""
+        return self._view("open_interest")
+
+    def reserve(self, capacity: int) -> None:
+        """扩容至不小于 capacity, 已有数据复制到新数组"""
+        if capacity <= self._capacity:
+            return
+
+        for name, array in self._data.items():
+            new_array = np.zeros(capacity, dtype=array.dtype)
+            new_array[:self._size] = array[:self._size]
+            self._data[name] = new_array
+
+        self._capacity = capacity
+
+    def _grow(self) -> None:
+        if self._size == self._capacity:
+            self.reserve(self._capacity * 2)
+
+    def _write(self, index: int, values: tuple) -> None:
+        scales = self._scales
+        for name, value in zip(self.columns, values):
+            self._data[name][index] = round(value * scales[name]) if name in scales else value
+        self._decoded.clear()
+
+    def append(
+        self,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        datetime: DateTimeType,
+        open_interest: float = 0
+    ) -> None:
+        """在末尾追加一根 K 线"""
+        self._grow()
+        self._write(self._size, (open, high, low, close, volume, datetime, open_interest))
+        self._size += 1
+
+    def extend(
+        self,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        datetime: np.ndarray,
+        open_interest: np.ndarray = 0
+    ) -> None:
+        """
+        在末尾批量追加 K 线, 各列按数组一次写入, 容量不足时一次扩容到足够的大小
+
+        Args:
+            datetime: 时间数组, 调用方保证升序且晚于最后一根 K 线
+        """
+        size = len(close)
+        capacity = self._capacity
+        while capacity < self._size + size:
+            capacity *= 2
+        self.reserve(capacity)
+
+        scales = self._scales
+        end = self._size + size
+        for name, value in zip(self.columns, (open, high, low, close, volume, datetime, open_interest)):
+            self._data[name][self._size:end] = np.round(np.asarray(value) * scales[name]) if name in scales else value
+
+        self._size = end
+        self._decoded.clear()
+
+    def insert(
+        self,
+        index: int,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        datetime: DateTimeType,
+        open_interest: float = 0
+    ) -> None:
+        """
+        在 index 之前原地插入一根 K 线, 语义与 np.insert 相同
+
+        Args:
+            index: 插入位置, 支持负数索引
+        """
+        if index < 0:
+            index += self._size
+
+        if not 0 <= index <= self._size:
+            raise IndexError(f"插入位置 {index} 超出范围, 当前 K 线数量 {self._size}")
+
+        self._grow()
+
+        for array in self._data.values():
+            array[index + 1:self._size + 1] = array[index:self._size]
+
+        self._write(index, (open, high, low, close, volume, datetime, open_interest))
+        self._size += 1
+
+    def update_last(
+        self,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        datetime: DateTimeType,
+        open_interest: float = 0
+    ) -> None:
+        """更新最后一根 K 线"""
+        if not self._size:
+            raise IndexError("序列为空, 无法更新最后一根 K 线")
+
+        self._write(self._size - 1, (open, high, low, close, volume, datetime, open_interest))
+
+    def search(self, _datetime: DateTimeType) -> int:
+        """二分查找时间在序列中的位置, 即 np.searchsorted 的左侧插入位置"""
+        return int(np.searchsorted(self.datetime, np.datetime64(_datetime, "us")))
+
+    def contains(self, _datetime: DateTimeType) -> bool:
+        """序列中是否已有该时间的 K 线, O(log n)"""
+        index = self.search(_datetime)
+        return index < self._size and self._data["datetime"][index] == np.datetime64(_datetime, "us")
+
+    def upsert(
+        self,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        datetime: DateTimeType,
+        open_interest: float = 0
+    ) -> None:
+        """按时间写入一根 K 线, 已有相同时间则覆盖, 否则插入到有序位置"""
+        values = (open, high, low, close, volume, datetime, open_interest)
+        index = self.search(datetime)
+
+        if index == self._size:
+            self.append(*values)
+        elif self._data["datetime"][index] == np.datetime64(datetime, "us"):
+            self._write(index, values)
+        else:
+            self.insert(index, *values)
+
+    def missing_ranges(self, expected: np.ndarray) -> List[Tuple[DateTimeType, DateTimeType]]:
+        """
+        查找缺失的 K 线, 连续缺失的合并为一段
+
+        Args:
+            expected: 应有的 K 线时间, 升序, 通常由 SessionCalendar.bar_times 生成
+
+        Returns:
+            [(缺失开始时间, 缺失结束时间), ...], 均为 K 线时间
+        """
+        expected = np.asarray(expected, dtype="datetime64[us]")
+        if not len(expected):
+            return []
+
+        index = np.searchsorted(self.datetime, expected)
+        found = self._data["datetime"][np.minimum(index, max(self._size - 1, 0))] == expected
+        found &= index < self._size
+
+        missing = np.flatnonzero(~found)
+        if not len(missing):
+            return []
+
+        breaks = np.flatnonzero(np.diff(missing) > 1)
+        starts = np.r_[missing[0], missing[breaks + 1]]
+        ends = np.r_[missing[breaks], missing[-1]]
+
+        return [
+            (expected[start].astype(DateTimeType), expected[end].astype(DateTimeType))
+            for start, end in zip(starts, ends)
+        ]
+
+    def clear(self) -> None:
+        """清空序列, 保留已分配的内存"""
+        self._size = 0
+        self._decoded.clear()
+
+
+class KLineRingSeries(object):
+    """K 线环形缓冲
+    ----
+        固定长度的环形序列, 写指针循环覆盖最旧的 K 线, 每根 K 线只写入不分配内存\n
+        底层为两倍长度的镜像数组, 每个值同时写入 i 和 i + maxsize 两个位置,
+        因此任意时刻最近 maxsize 根 K 线都是一段连续内存, 可零拷贝交给 talib\n
+        window 返回的视图可原地修改, 写指针回绕时后半段同步回前半段, 修改不会因回绕丢失\n
+        紧凑模式与 KLineSeries 相同, window 返回的 float64 副本缓存到下一次写入, 副本只读, 修改请使用 assign
+
+    Args:
+        maxsize: 缓冲长度\n
+        columns: 列名\n
+        compact: 是否使用紧凑存储\n
+        price_decimals: 价格小数位数, 给定时价格按放大后的 int32 存储 (隐含 compact)
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        columns: tuple = ("open", "high", "low", "close", "volume", "datetime"),
+        compact: bool = False,
+        price_decimals: int = None
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("缓冲长度必须大于 0")
+
+        self.maxsize = maxsize
+        self.columns = columns
+        self.compact: bool = compact or price_decimals is not None
+        self._scales: Dict[str, int] = (
+            {name: 10 ** price_decimals for name in PRICE_COLUMNS if name in columns}
+            if price_decimals is not None else {}
+        )
+
+        self._cursor: int = 0
+        self._buffer = {
+            #: 时间列沿用原 ArrayManager 的 object 数组, 初始值为 0.0
+            name: np.zeros(maxsize * 2).astype(self._column_dtype(name, price_decimals))
+            for name in columns
+        }
+        self._decoded: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def _column_dtype(self, name: str, price_decimals: int = None) -> Union[type, np.dtype]:
+        if name == "datetime":
+            return object
+        if self.compact and (dtype := compact_dtype(name, price_decimals)) is not None:
+            return dtype
+        return np.float64
+
+    def append(self, *values) -> None:
+        """按列顺序写入一根 K 线, 覆盖最旧的一根"""
+        cursor, mirror = self._cursor, self._cursor + self.maxsize
+        scales = self._scales
+
+        for name, value in zip(self.columns, values):
+            buffer = self._buffer[name]
+            buffer[cursor] = buffer[mirror] = round(value * scales[name]) if name in scales else value
+
+        self._cursor = (cursor + 1) % self.maxsize
+        self._decoded.clear()
+
+        # 回绕后窗口从后半段移到前半段, 后半段可能有经 window 视图原地修改的值
+        if not self._cursor:
+            for buffer in self._buffer.values():
+                buffer[:self.maxsize] = buffer[self.maxsize:]
+
+    def assign(self, name: str, values) -> None:
+        """
+        按时间顺序覆盖一列最近的 K 线
+        ----
+            values 右对齐到最新一根, 超过缓冲长度时只取最后 maxsize 个, 同时写入镜像数组的两半
+
+        Args:
+            name: 列名\n
+            values: 新的序列
+        """
+        values = np.asarray(values)[-self.maxsize:]
+        buffer = self._buffer[name]
+
+        logical = buffer[self._cursor:self._cursor + self.maxsize].copy()
+        if values.size:
+            logical[-values.size:] = (
+                np.round(values * self._scales[name]) if name in self._scales else values
+            )
+
+        buffer[:self.maxsize] = buffer[self.maxsize:] = np.roll(logical, self._cursor)
+        self._decoded.clear()
+
+    @property
+    def nbytes(self) -> int:
+        """已分配内存字节数, 时间列只计算指针"""
+        return sum(array.nbytes for array in self._buffer.values())
+
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用, 字段与 KLineSeries.memory_usage 相同"""
+        return {
+            "nbytes": self.nbytes,
+            "float64": self.maxsize * 2 * np.dtype(np.float64).itemsize * len(self.columns),
+            "decoded": sum(array.nbytes for array in self._decoded.values())
+        }
+
+    def window(self, name: str, size: int = None) -> np.ndarray:
+        """
+        按时间顺序返回最近 size 根 K 线的连续视图
+
+        Args:
+            name: 列名\n
+            size: 长度, 默认为整个缓冲
+        """
+        end = self._cursor + self.maxsize
+        size = self.maxsize if size is None else min(size, self.maxsize)
+
+        if not self.compact or name == "datetime":
+            return self._buffer[name][end - size:end]
+
+        if (array := self._decoded.get((name, size))) is None:
+            array = self._decoded[name, size] = decode(self._buffer[name][end - size:end], self._scales.get(name))
+            # 副本在多次读取间共享, 只读以免原地修改静默丢失
+            array.flags.writeable = False
+        return array
+
+
+class SharedKLineSeries(object):
+    """跨进程共享的 K 线列式存储
+    ----
+        基于内存映射文件, 同一份历史 K 线只保存一份, 多个策略进程只读挂载, 由唯一的写进程追加新 K 线\n
+        文件头为 4 个 int64: 魔数, 版本号, K 线数量, 容量, 之后按列存放 7 列数据\n
+        写入时版本号先变为奇数, 写完再变为偶数, 读进程版本号为奇数或前后不一致时重读\n
+        写进程在 .lock 文件上持有操作系统的独占锁 (flock / msvcrt.locking), 关闭或退出 (包括异常退出) 时自动释放;
+        只读挂载前检查该锁仍被持有, 写进程已退出的文件不再挂载, 由下一个进程重新获取历史 K 线并成为写进程\n
+        写进程先写临时文件再用 os.replace 替换, 不截断其他进程仍在映射的旧文件
+
+    Args:
+        path: 映射文件路径\n
+        writer: 是否为写进程, 由 create 创建
+    """
+
+    _MAGIC = 0x4B4C494E45
+    _HEADER = 4
+
+    columns = KLineSeries.columns
+
+    def __init__(self, path: str, writer: bool = False) -> None:
+        self.path = path
+        self.writer = writer
+        self._lock_fd: int = None
+
+        self._memmap = np.memmap(path, dtype=np.int64, mode="r+" if writer else "r")
+        if self._memmap[0] != self._MAGIC:
+            raise ValueError(f"{path} 不是 K 线共享文件")
+
+        self._header = self._memmap[:self._HEADER]
+        capacity = int(self._header[3])
+
+        self._data = {
+            name: self._memmap[
+                self._HEADER + i * capacity:self._HEADER + (i + 1) * capacity
+            ].view(KLineSeries._dtype(name))
+            for i, name in enumerate(self.columns)
+        }
+
+    @staticmethod
+    def writer_alive(path: str) -> bool:
+        """是否有存活的写进程持有 .lock 文件的锁"""
+        try:
+            fd = os.open(f"{path}.lock", os.O_RDWR)
+        except OSError:
+            return False
+
+        try:
+            return not _try_lock(fd)
+        finally:
+            """关闭即释放刚获取的锁"""
+            os.close(fd)
+
+    @classmethod
+    def attach(cls, path: str) -> Union["SharedKLineSeries", None]:
+        """只读挂载, 文件不存在或写进程已退出 (文件不再更新) 时返回 None"""
+        if not os.path.exists(path) or not os.path.getsize(path) or not cls.writer_alive(path):
+            return None
+
+        try:
+            return cls(path)
+        except (OSError, ValueError):
+            """写进程正在替换文件"""
+            return None
+
+    @classmethod
+    def create(cls, path: str, capacity: int = 14400) -> Union["SharedKLineSeries", None]:
+        """
+        以写进程身份创建, 已有存活的写进程时返回 None
+        ----
+            旧文件 (写进程已退出) 被替换为新的空文件, 仍映射旧文件的进程继续读到旧数据, 不会因截断出错;
+            Windows 下旧文件仍被映射时无法替换, 返回 None
+
+        Args:
+            capacity: 容量, 写满后丢弃最旧的一半
+        """
+        fd = os.open(f"{path}.lock", os.O_CREAT | os.O_RDWR)
+        if not _try_lock(fd):
+            os.close(fd)
+            return None
+
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            memmap = np.memmap(temp, dtype=np.int64, mode="w+", shape=(cls._HEADER + capacity * len(cls.columns),))
+            memmap[:cls._HEADER] = (cls._MAGIC, 0, 0, capacity)
+            memmap.flush()
+            del memmap
+
+            os.replace(temp, path)
+            shared = cls(path, writer=True)
+        except OSError:
+            os.close(fd)
+            if os.path.exists(temp):
+                os.remove(temp)
+            return None
+
+        shared._lock_fd = fd
+        return shared
+
+    def __len__(self) -> int:
+        return int(self._header[2])
+
+    @property
+    def capacity(self) -> int:
+        """容量"""
+        return int(self._header[3])
+
+    def _begin_write(self) -> None:
+        if not self.writer:
+            raise PermissionError("只读挂载的共享存储不能写入")
+        self._header[1] += 1
+
+    def _end_write(self, size: int) -> None:
+        self._header[2] = size
+        self._header[1] += 1
+
+    def extend(self, data: List[dict]) -> None:
+        """批量追加 K 线, 字段与 KLineContainer 中的 K 线一致, 不晚于最后一根的 K 线忽略"""
+        if len(self):
+            last = self._data["datetime"][len(self) - 1]
+            data = [kline for kline in data if np.datetime64(kline["datetime"], "us") > last]
+
+        if not data:
+            return
+
+        data = data[-self.capacity:]
+        self._begin_write()
+
+        size = len(self)
+        if size + len(data) > self.capacity:
+            """写满后保留较新的 K 线"""
+            keep = max(0, min(size, self.capacity // 2, self.capacity - len(data)))
+            for array in self._data.values():
+                array[:keep] = array[size - keep:size]
+            size = keep
+
+        for name in self.columns:
+            self._data[name][size:size + len(data)] = [kline[name] for kline in data]
+
+        self._end_write(size + len(data))
+
+    def snapshot(self) -> dict:
+        """获取一致的数据副本, 写进程正在写入时重读"""
+        while True:
+            version = int(self._header[1])
+            if version % 2:
+                continue
+
+            size = len(self)
+            data = {name: np.array(array[:size]) for name, array in self._data.items()}
+
+            if int(self._header[1]) == version:
+                return data
+
+    def iter_klines(self) -> Iterator[dict]:
+        """逐根返回 K 线字典"""
+        data = self.snapshot()
+        for row in zip(*(data[name] for name in self.columns)):
+            kline = dict(zip(self.columns, row))
+            kline["datetime"] = kline["datetime"].astype(datetime)
+            yield kline
+
+    def close(self) -> None:
+        """解除映射, 写进程同时释放锁, 之后的进程不再挂载该文件"""
+        if self.writer:
+            self._memmap.flush()
+        del self._memmap, self._header, self._data
+
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
@@ -0,0 +1,407 @@
+import re
+import warnings
+from datetime import date, datetime, time, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+SessionType = Tuple[str, str]
+
+DEFAULT_SESSIONS: Tuple[SessionType, ...] = (
+    ("21:00", "23:00"),
+    ("09:00", "10:15"),
+    ("10:30", "11:30"),
+    ("13:30", "15:00")
+)
+"""默认交易时段 (开始, 结束), 结束时间不大于开始时间表示跨越午夜"""
+
+_DAY_SESSIONS: Tuple[SessionType, ...] = (("09:00", "10:15"), ("10:30", "11:30"), ("13:30", "15:00"))
+
+_PRODUCT_GROUPS: Tuple[Tuple[Tuple[SessionType, ...], str], ...] = (
+    ((("21:00", "02:30"),) + _DAY_SESSIONS, "au ag sc"),
+    ((("21:00", "01:00"),) + _DAY_SESSIONS, "cu al zn pb ni sn ss bc ao"),
+    (
+        (("21:00", "23:00"),) + _DAY_SESSIONS,
+        "rb hc bu ru fu sp lu nr br "
+        "a b m y p c cs i j jm l v pp eg eb pg rr "
+        "sr cf cy ta ma rm oi fg sa pf px sh zc"
+    ),
+    (_DAY_SESSIONS, "wr ap cj ur sf sm pk jd lh fb bb"),
+    ((("09:30", "11:30"), ("13:00", "15:00")), "if ic ih im"),
+    ((("09:30", "11:30"), ("13:00", "15:15")), "t tf ts tl")
+)
+
+PRODUCT_SESSIONS: Dict[str, Tuple[SessionType, ...]] = {
+    product: sessions
+    for sessions, products in _PRODUCT_GROUPS
+    for product in products.split()
+}
+"""品种交易时段, 键为小写品种代码, 未列出的品种使用 DEFAULT_SESSIONS 并发出警告"""
+
+HOLIDAYS: Set[date] = set()
+"""默认节假日, 由 set_holidays 设置, 日历未传入 holidays 时使用"""
+
+
+def _parse_time(value: str) -> time:
+    return datetime.strptime(value, "%H:%M").time()
+
+
+def session_bar_times(
+    start: datetime,
+    end: datetime,
+    period: int,
+    sessions: Tuple[SessionType, ...] = DEFAULT_SESSIONS,
+    holidays: Optional[Iterable[date]] = None
+) -> np.ndarray:
+    """
+    start 到 end (均包含) 之间应有的 K 线时间, 见 SessionCalendar.bar_times
+
+    Args:
+        start: 开始时间\n
+        end: 结束时间\n
+        period: K 线周期秒数\n
+        sessions: 交易时段\n
+        holidays: 节假日, 默认为 set_holidays 设置的 HOLIDAYS
+
+    Returns:
+        datetime64[us] 升序数组
+    """
+    return SessionCalendar.get(sessions, holidays).bar_times(start, end, period)
+
+
+def set_holidays(holidays: Iterable[date]) -> None:
+    """
+    设置默认节假日
+    ----
+        之后创建的未传入 holidays 的日历 (SessionCalendar.get, for_instrument, MinKLineGenerator, BarManager) 都使用这些日期\n
+        未设置时节假日和节假日前的夜盘按开市处理, 应在策略启动时从交易所日历设置
+
+    Args:
+        holidays: 节假日
+    """
+    HOLIDAYS.clear()
+    HOLIDAYS.update(holidays)
+
+
+def product_of(instrument: str) -> str:
+    """合约代码的小写品种代码, 如 rb2410 为 rb"""
+    return re.match(r"[A-Za-z]*", instrument).group().lower()
+
+
+def product_sessions(instrument: str) -> Tuple[SessionType, ...]:
+    """
+    合约所属品种的交易时段
+    ----
+        PRODUCT_SESSIONS 中没有的品种使用包含夜盘的 DEFAULT_SESSIONS 并发出警告, 应通过 sessions 参数传入实际的交易时段
+
+    Args:
+        instrument: 合约代码, 如 rb2410, SR405
+    """
+    product = product_of(instrument)
+    if product not in PRODUCT_SESSIONS:
+        warnings.warn(f"品种 {product} 不在 PRODUCT_SESSIONS 中, 使用默认交易时段 {DEFAULT_SESSIONS}", stacklevel=2)
+        return DEFAULT_SESSIONS
+    return PRODUCT_SESSIONS[product]
+
+
+class SessionCalendar(object):
+    """
+    交易时段日历
+    ----
+        创建时把交易时段展开为按当日分钟数 (0 ~ 1439) 索引的整数查找表,
+        之后的 K 线结束时间, 交易时段开收盘时间, 是否交易时间都只需一次下标查询
+
+        K 线按交易时段开盘时间对齐, 每 period 分钟一根, 时段最后一根为时段结束时间, K 线时间为周期结束时间
+
+        开盘前 auction 分钟内的 tick (集合竞价) 归入时段第一根 K 线, 收盘时间整分的 tick 归入时段最后一根 K 线
+
+        周六, 周日和 holidays 中的日期休市, 开始于 17:00 之后的夜盘在下一个交易日休市时同样休市
+
+    Args:
+        sessions: 交易时段 (开始, 结束), 结束时间不大于开始时间表示跨越午夜\n
+        holidays: 节假日, 默认为 set_holidays 设置的 HOLIDAYS, 没有节假日时节假日前的夜盘按开市处理\n
+        auction: 集合竞价分钟数
+    """
+
+    _cache: Dict[Tuple[Tuple[SessionType, ...], FrozenSet[date], int], "SessionCalendar"] = {}
+
+    def __init__(
+        self,
+        sessions: Iterable[SessionType] = DEFAULT_SESSIONS,
+        holidays: Optional[Iterable[date]] = None,
+        auction: int = 5
+    ) -> None:
+        self.sessions: Tuple[SessionType, ...] = tuple(sessions)
+        self.holidays: FrozenSet[date] = frozenset(HOLIDAYS if holidays is None else holidays)
+        self.auction = auction
+
+        self._bounds: List[Tuple[int, int]] = []
+        for session_open, session_close in self.sessions:
+            _open, _close = _parse_time(session_open), _parse_time(session_close)
+            open_minute = _open.hour * 60 + _open.minute
+            close_minute = _close.hour * 60 + _close.minute
+            if close_minute <= open_minute:
+                close_minute += 1440
+            self._bounds.append((open_minute, close_minute))
+
+        self._session: List[int] = [-1] * 1440
+        """每分钟所属的交易时段下标, 开盘前的集合竞价分钟也属于该时段, -1 表示非交易时间"""
+        self._since_open: List[int] = [0] * 1440
+        """每分钟距所属时段开盘的分钟数, 集合竞价分钟为负数"""
+        self._is_close: List[bool] = [False] * 1440
+
+        for index, (open_minute, close_minute) in enumerate(self._bounds):
+            for minute in range(open_minute - self.auction, close_minute):
+                self._session[minute % 1440] = index
+                self._since_open[minute % 1440] = minute - open_minute
+            self._is_close[close_minute % 1440] = True
+            if self._session[close_minute % 1440] == -1:
+                self._session[close_minute % 1440] = index
+                self._since_open[close_minute % 1440] = close_minute - open_minute
+
+        self._bar_tables: Dict[int, List[int]] = {}
+
+    @classmethod
+    def get(
+        cls,
+        sessions: Iterable[SessionType] = DEFAULT_SESSIONS,
+        holidays: Optional[Iterable[date]] = None,
+        auction: int = 5
+    ) -> "SessionCalendar":
+        """获取相同参数共用的日历, 查找表只构建一次"""
+        key = (tuple(sessions), frozenset(HOLIDAYS if holidays is None else holidays), auction)
+        if key not in cls._cache:
+            cls._cache[key] = cls(*key)
+        return cls._cache[key]
+
+    @classmethod
+    def for_instrument(cls, instrument: str, holidays: Optional[Iterable[date]] = None) -> "SessionCalendar":
+        """按合约品种获取日历"""
+        return cls.get(product_sessions(instrument), holidays)
+
+    def bar_table(self, period: int) -> List[int]:
+        """
+        period 分钟 K 线的查找表, 按需构建后缓存
+
+        Returns:
+            每分钟到所属 K 线结束时间的分钟数, 收盘时间整分为 0, -1 表示非交易时间
+        """
+        if period in self._bar_tables:
+            return self._bar_tables[period]
+
+        table: List[int] = [-1] * 1440
+        for minute in range(1440):
+            index = self._session[minute]
+            if index == -1:
+                continue
+
+            open_minute, close_minute = self._bounds[index]
+            since_open = self._since_open[minute]
+
+            if open_minute + since_open == close_minute:
+                table[minute] = 0
+            else:
+                end = open_minute + (max(since_open, 0) // period + 1) * period
+                table[minute] = min(end, close_minute) - open_minute - since_open
+
+        self._bar_tables[period] = table
+        return table
+
+    def trading_seconds(self) -> bytearray:
+        """
+        一天 86400 秒的交易时段查找表, 1 为属于交易时段
+        ----
+            包含开盘前 auction 分钟的集合竞价, 收盘时间只包含整分的那一秒, 与 K 线归属的范围一致\n
+            只按时刻判断, 不判断周末和节假日
+        """
+        table = bytearray(86400)
+        for minute in range(1440):
+            if (index := self._session[minute]) == -1:
+                continue
+
+            open_minute, close_minute = self._bounds[index]
+            seconds = 1 if open_minute + self._since_open[minute] == close_minute else 60
+            table[minute * 60:minute * 60 + seconds] = b"\x01" * seconds
+
+        return table
+
+    def is_trading_day(self, day: date) -> bool:
+        """是否交易日"""
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _next_weekday(self, day: date) -> date:
+        return day + timedelta(days=3 if day.weekday() == 4 else 1)
+
+    def previous_trading_day(self, day: date) -> date:
+        """day 之前的最近一个交易日"""
+        day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def trading_day(self, _datetime: datetime) -> date:
+        """_datetime 所属的交易日, 17:00 之后 (夜盘) 属于下一个交易日, 休市日顺延到下一个交易日"""
+        day = _datetime.date() + timedelta(days=_datetime.hour >= 17)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def recent_trading_days(self, _datetime: datetime, count: int) -> List[date]:
+        """_datetime 所属的交易日及之前共 count 个交易日, 从最近到最早"""
+        days = [self.trading_day(_datetime)]
+        while len(days) < count:
+            days.append(self.previous_trading_day(days[-1]))
+        return days
+
+    def trading_day_open(self, day: date) -> datetime:
+        """
+        交易日 day 第一个交易时段的开盘时间
+        ----
+            有夜盘且前一个工作日的夜盘开市时为前一个工作日的夜盘开盘时间, 否则为当日第一个日盘时段的开盘时间
+        """
+        night = [open_minute for open_minute, _ in self._bounds if open_minute >= 17 * 60]
+        if night:
+            previous = day - timedelta(days=3 if day.weekday() == 0 else 1)
+            open_time = datetime.combine(previous, time()) + timedelta(minutes=min(night))
+            if self._session_open(open_time) is not None:
+                return open_time
+
+        return datetime.combine(day, time()) + timedelta(
+            minutes=min(open_minute for open_minute, _ in self._bounds if open_minute < 17 * 60)
+        )
+
+    def _session_open(self, _datetime: datetime) -> Optional[datetime]:
+        """_datetime 所属交易时段的开盘时间, 休市时返回 None"""
+        minute = _datetime.hour * 60 + _datetime.minute
+        index = self._session[minute]
+        if index == -1:
+            return None
+
+        open_time = _datetime.replace(second=0, microsecond=0) - timedelta(minutes=self._since_open[minute])
+        open_date = open_time.date()
+
+        if not self.is_trading_day(open_date):
+            return None
+
+        if self._bounds[index][0] >= 17 * 60 and not self.is_trading_day(self._next_weekday(open_date)):
+            """节假日前的夜盘休市"""
+            return None
+
+        return open_time
+
+    def is_trading(self, _datetime: datetime) -> bool:
+        """是否交易时间, 开盘和收盘时间整分均视为交易时间, 集合竞价不算"""
+        minute = _datetime.hour * 60 + _datetime.minute
+        since_open = self._since_open[minute]
+
+        if self._session[minute] == -1 or since_open < 0:
+            return False
+
+        if self._is_close[minute] and (_datetime.second or _datetime.microsecond):
+            return False
+
+        return self._session_open(_datetime) is not None
+
+    def session_bounds(self, _datetime: datetime) -> Optional[Tuple[datetime, datetime]]:
+        """
+        _datetime 所属交易时段的开盘和收盘时间, 集合竞价时间返回即将开盘的时段
+
+        Returns:
+            (开盘时间, 收盘时间), 非交易时间返回 None
+        """
+        if (open_time := self._session_open(_datetime)) is None:
+            return None
+
+        open_minute, close_minute = self._bounds[self._session[_datetime.hour * 60 + _datetime.minute]]
+        return open_time, open_time + timedelta(minutes=close_minute - open_minute)
+
+    def next_bar_time(self, _datetime: datetime, period: int = 1) -> Optional[datetime]:
+        """
+        _datetime 所属 K 线的结束时间, 即 K 线时间
+
+        Args:
+            _datetime: tick 时间\n
+            period: K 线分钟数
+
+        Returns:
+            K 线时间, 非交易时间返回 None
+        """
+        minute = _datetime.hour * 60 + _datetime.minute
+        offset = self.bar_table(period)[minute]
+
+        if offset == -1 or (offset == 0 and (_datetime.second or _datetime.microsecond)):
+            return None
+
+        if self._session_open(_datetime) is None:
+            return None
+
+        return _datetime.replace(second=0, microsecond=0) + timedelta(minutes=offset)
+
+    def is_bar_end(self, _datetime: datetime, period: int = 1) -> bool:
+        """_datetime (整分) 是否 period 分钟 K 线的结束时间"""
+        minute = _datetime.hour * 60 + _datetime.minute
+        if not self._since_open[minute] > 0:
+            return False
+        return self.bar_table(period)[(minute - 1) % 1440] == 1
+
+    def bar_times(self, start: datetime, end: datetime, period: int) -> np.ndarray:
+        """
+        start 到 end (均包含) 之间应有的 K 线时间
+        ----
+            K 线时间为周期结束时间, 每个交易时段从开始时间起每 period 秒一根, 时段最后一根为时段结束时间\n
+            休市的交易时段 (周末, 节假日, 节假日前的夜盘) 没有 K 线
+
+        Args:
+            start: 开始时间\n
+            end: 结束时间\n
+            period: K 线周期秒数
+
+        Returns:
+            datetime64[us] 升序数组
+        """
+        step = timedelta(seconds=period)
+        bar_times: List[datetime] = []
+
+        day: date = start.date() - timedelta(days=1)
+        while day <= end.date():
+            for open_minute, close_minute in self._bounds:
+                open_time = datetime.combine(day, time()) + timedelta(minutes=open_minute)
+                if self._session_open(open_time) is None:
+                    continue
+
+                close_time = open_time + timedelta(minutes=close_minute - open_minute)
+                bar_time = open_time + step
+                while bar_time < close_time:
+                    bar_times.append(bar_time)
+                    bar_time += step
+                bar_times.append(close_time)
+
+            day += timedelta(days=1)
+
+        bar_times = np.array(sorted(bar_times), dtype="datetime64[us]")
+        mask = (bar_times >= np.datetime64(start, "us")) & (bar_times <= np.datetime64(end, "us"))
+        return bar_times[mask]
+
+    def close_times(self, after: datetime) -> List[datetime]:
+        """after 之后 24 小时内各交易时段的收盘时间, 升序"""
+        close_times: List[datetime] = []
+
+        for days in (-1, 0, 1):
+            day = after.date() + timedelta(days=days)
+            for open_minute, close_minute in self._bounds:
+                open_time = datetime.combine(day, time()) + timedelta(minutes=open_minute)
+                close_time = open_time + timedelta(minutes=close_minute - open_minute)
+                if (
+                    after < close_time <= after + timedelta(days=1)
+                    and self._session_open(open_time) is not None
+                ):
+                    close_times.append(close_time)
+
+        return sorted(close_times)
+
+    def close_time_strings(self) -> List[str]:
+        """各交易时段的收盘时间, 格式 HH:MM:SS"""
+        return sorted({
+            f"{close_minute % 1440 // 60:02d}:{close_minute % 60:02d}:00"
+            for _, close_minute in self._bounds
+        })
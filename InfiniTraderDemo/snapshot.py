@@ -0,0 +1,100 @@
+import os
+import pickle
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+SNAPSHOT_VERSION = 2
+"""快照格式版本, 状态的结构变化时递增, 旧版本的快照不再使用"""
+
+
+class SnapshotStore(object):
+    """
+    K 线和指标状态快照
+    ----
+        按 交易所/合约/周期.snapshot 每个 K 线生成器一个文件, 内容为 pickle 的状态字典, numpy 数组按二进制保存\n
+        写入先写临时文件再用 os.replace 替换, 读到的总是完整的旧文件或新文件\n
+        write_async 在后台线程 pickle 和写入, 调用方只需准备之后不再修改的状态, 同一文件还没写入的旧状态直接被新状态替换,
+        后台写入失败的异常保存在 error\n
+        读取失败 (不存在, 损坏, 版本不一致) 时返回 None, 调用方按没有快照处理
+
+    Args:
+        root: 快照目录
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.error: Optional[Exception] = None
+
+        self._pending: Dict[Tuple[str, str, str], Tuple[dict, datetime]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+
+    def path(self, exchange: str, instrument: str, style: str) -> str:
+        """快照文件路径"""
+        return os.path.join(self.root, exchange, instrument, f"{style}.snapshot")
+
+    def read(self, exchange: str, instrument: str, style: str) -> Optional[Tuple[dict, datetime]]:
+        """读取快照, 返回 (状态, 写入时间)"""
+        try:
+            with open(self.path(exchange, instrument, style), "rb") as f:
+                data: dict = pickle.load(f)
+            if data["version"] != SNAPSHOT_VERSION:
+                return None
+            return data["state"], data["written"]
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError, TypeError, ValueError):
+            return None
+
+    def write(self, exchange: str, instrument: str, style: str, state: dict, written: datetime = None) -> None:
+        """
+        写入快照
+
+        Args:
+            state: 状态字典\n
+            written: 写入时间, 默认为当前时间
+        """
+        path = self.path(exchange, instrument, style)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "written": written or datetime.now(), "state": state},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temp, path)
+
+    def write_async(self, exchange: str, instrument: str, style: str, state: dict, written: datetime = None) -> None:
+        """
+        在后台线程写入快照, 立即返回
+
+        Args:
+            state: 状态字典, 之后不能再修改\n
+            written: 写入时间, 默认为当前时间
+        """
+        with self._lock:
+            self._pending[(exchange, instrument, style)] = (state, written or datetime.now())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_pending, daemon=True)
+                self._thread.start()
+
+    def _write_pending(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                key, (state, written) = next(iter(self._pending.items()))
+                del self._pending[key]
+
+            try:
+                self.write(*key, state, written)
+                self.error = None
+            except Exception as error:
+                self.error = error
+
+    def flush(self) -> None:
+        """等待后台写入完成"""
+        while (thread := self._thread) is not None:
+            thread.join()
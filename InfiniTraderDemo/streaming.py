@@ -0,0 +1,847 @@
+import copy
+from collections import deque
+from math import nan, sqrt
+from typing import Any, Callable, Deque, Dict, List, Tuple, Union
+
+import numpy as np
+import talib
+
+HIGH, LOW, CLOSE = 0, 1, 2
+"""StreamingIndicators.update 输入 (high, low, close) 的下标"""
+
+
+def _vectorizable(values: np.ndarray, timeperiod: int) -> bool:
+    """talib 的周期至少为 2, 且会跳过开头的 nan, 数据不足或含 nan 时逐根 update 才与增量指标一致"""
+    return timeperiod >= 2 and len(values) >= timeperiod and not np.isnan(values).any()
+
+
+class StreamingIndicator(object):
+    """
+    增量指标基类
+    ----
+        update 追加一根走完的 K 线并返回最新指标值, 每次为 O(1)\n
+        undo 撤销最近一次 update, replace 用新的数据重算最后一根 K 线, 用于正在走的 K 线\n
+        seed 用整段历史初始化新创建的指标, 可以向量化的指标由 talib 一次计算历史结果, 再按窗口设置状态\n
+        数据不足时返回 nan, 与 talib 对齐
+    """
+
+    def update(self, *inputs: float) -> Any:
+        raise NotImplementedError
+
+    def undo(self) -> None:
+        raise NotImplementedError
+
+    def replace(self, *inputs: float) -> Any:
+        """重算最后一根 K 线"""
+        self.undo()
+        return self.update(*inputs)
+
+    def seed(self, *inputs: np.ndarray) -> list:
+        """
+        用整段历史初始化新创建的指标, 返回每根 K 线的结果, 与逐根 update 一致
+        ----
+            最后一根 K 线仍由 update 计算, 之后可以正常 undo 和 replace
+
+        Args:
+            inputs: 每个输入一个 float64 数组, 长度相同
+        """
+        if not len(inputs[0]):
+            return []
+
+        values = self._bulk(*(column[:-1] for column in inputs))
+        values.append(self.update(*(float(column[-1]) for column in inputs)))
+        return values
+
+    def _bulk(self, *inputs: np.ndarray) -> list:
+        """批量追加 K 线, 不需要保留撤销信息, 默认逐根 update"""
+        return [self.update(*row) for row in zip(*(column.tolist() for column in inputs))]
+
+
+class SMA(StreamingIndicator):
+    """简单均线, 滚动求和, 对应 talib.SMA"""
+
+    def __init__(self, timeperiod: int) -> None:
+        self.timeperiod = timeperiod
+        self.window: Deque[float] = deque()
+        self.total: float = 0.0
+        self._popped: float = None
+
+    def update(self, value: float) -> float:
+        self._popped = self.window.popleft() if len(self.window) == self.timeperiod else None
+        self.window.append(value)
+        self.total += value - (self._popped or 0.0)
+        return self.total / self.timeperiod if len(self.window) == self.timeperiod else nan
+
+    def undo(self) -> None:
+        self.total -= self.window.pop()
+        if self._popped is not None:
+            self.window.appendleft(self._popped)
+            self.total += self._popped
+            self._popped = None
+
+    def _fill(self, values: np.ndarray) -> None:
+        """窗口设为最后 timeperiod 个值"""
+        self.window = deque(values[-self.timeperiod:].tolist())
+        self.total = sum(self.window)
+
+    def _bulk(self, values: np.ndarray) -> list:
+        if not _vectorizable(values, self.timeperiod):
+            return super()._bulk(values)
+
+        self._fill(values)
+        return talib.SMA(values, self.timeperiod).tolist()
+
+
+class STD(SMA):
+    """
+    滚动标准差, 对应 talib.STDDEV
+    ----
+        窗口的均值和离差平方和按 Welford 方法增量更新, 每 timeperiod 根 K 线按窗口重新求和一次,
+        不使用平方和减均值平方, 价格长期不变时不会残留误差
+
+    Args:
+        timeperiod: 周期\n
+        nbdev: 倍数, Indicators.std 使用 sqrt(n / (n - 1)) 即样本标准差
+    """
+
+    def __init__(self, timeperiod: int, nbdev: float = 1.0) -> None:
+        super().__init__(timeperiod)
+        self.nbdev = nbdev
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        """窗口的离差平方和"""
+        self._updates: int = 0
+        """上次重新求和之后的 update 次数"""
+        self._state: Tuple[float, float, int] = None
+
+    def _resum(self) -> None:
+        """按窗口重新计算均值和离差平方和"""
+        self.mean = sum(self.window) / len(self.window) if self.window else 0.0
+        self.m2 = sum((value - self.mean) ** 2 for value in self.window)
+        self._updates = 0
+
+    def update(self, value: float) -> float:
+        self._state = (self.mean, self.m2, self._updates)
+        super().update(value)
+        count, popped = len(self.window), self._popped
+
+        if popped is None:
+            delta = value - self.mean
+            self.mean += delta / count
+            self.m2 += delta * (value - self.mean)
+        else:
+            mean = self.mean + (value - popped) / count
+            self.m2 += (value - popped) * (value - mean + popped - self.mean)
+            self.mean = mean
+
+        self._updates += 1
+        if self._updates >= self.timeperiod:
+            self._resum()
+
+        if count < self.timeperiod:
+            return nan
+
+        variance = self.m2 / count
+        return sqrt(variance) * self.nbdev if variance > 0 else 0.0
+
+    def undo(self) -> None:
+        super().undo()
+        self.mean, self.m2, self._updates = self._state
+
+    def _bulk(self, values: np.ndarray) -> list:
+        if not _vectorizable(values, self.timeperiod):
+            return StreamingIndicator._bulk(self, values)
+
+        self._fill(values)
+        self._resum()
+        return (talib.STDDEV(values, self.timeperiod, 1) * self.nbdev).tolist()
+
+
+class EMA(StreamingIndicator):
+    """指数均线, 以前 timeperiod 个值的简单均值为初值, 对应 talib.EMA"""
+
+    def __init__(self, timeperiod: int) -> None:
+        self.timeperiod = timeperiod
+        self.k = 2.0 / (timeperiod + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.value: float = nan
+        self._saved: Tuple[int, float, float] = None
+
+    def update(self, value: float) -> float:
+        self._saved = (self.count, self.total, self.value)
+        self.count += 1
+
+        if self.count < self.timeperiod:
+            self.total += value
+        elif self.count == self.timeperiod:
+            self.value = (self.total + value) / self.timeperiod
+        else:
+            self.value += (value - self.value) * self.k
+
+        return self.value
+
+    def undo(self) -> None:
+        self.count, self.total, self.value = self._saved
+
+    def _bulk(self, values: np.ndarray) -> list:
+        if not _vectorizable(values, self.timeperiod):
+            return super()._bulk(values)
+
+        result = talib.EMA(values, self.timeperiod)
+        self.count = len(values)
+        self.total = sum(values[:self.timeperiod - 1].tolist())
+        self.value = float(result[-1])
+        return result.tolist()
+
+
+class Extreme(StreamingIndicator):
+    """
+    滚动最值, 单调队列
+    ----
+        队列保存 (序号, 值), 值单调不增 (最大) 或不减 (最小), 队首即窗口最值, 每根 K 线均摊 O(1)
+
+    Args:
+        timeperiod: 周期\n
+        maximum: True 为最大值, 对应 talib.MAX; False 为最小值, 对应 talib.MIN
+    """
+
+    def __init__(self, timeperiod: int, maximum: bool = True) -> None:
+        self.timeperiod = timeperiod
+        self.maximum = maximum
+        self.count: int = 0
+        self.queue: Deque[Tuple[int, float]] = deque()
+        self._popped: List[Tuple[int, float]] = []
+        self._expired: Tuple[int, float] = None
+
+    def _dominated(self, old: float, new: float) -> bool:
+        return old <= new if self.maximum else old >= new
+
+    def update(self, value: float) -> float:
+        self._popped = []
+        while self.queue and self._dominated(self.queue[-1][1], value):
+            self._popped.append(self.queue.pop())
+
+        self.queue.append((self.count, value))
+        self.count += 1
+
+        self._expired = None
+        if self.queue[0][0] <= self.count - 1 - self.timeperiod:
+            self._expired = self.queue.popleft()
+
+        return self.queue[0][1] if self.count >= self.timeperiod else nan
+
+    def undo(self) -> None:
+        self.count -= 1
+        self.queue.pop()
+        self.queue.extend(reversed(self._popped))
+        if self._expired is not None:
+            self.queue.appendleft(self._expired)
+        self._popped, self._expired = [], None
+
+    def _bulk(self, values: np.ndarray) -> list:
+        if not _vectorizable(values, self.timeperiod):
+            return super()._bulk(values)
+
+        result = (talib.MAX if self.maximum else talib.MIN)(values, self.timeperiod)
+        """队列只与最后一个窗口有关, 从窗口的第一根开始重建"""
+        self.count = len(values) - self.timeperiod
+        super()._bulk(values[-self.timeperiod:])
+        return result.tolist()
+
+
+class HHV(Extreme):
+    """移动最高"""
+
+    def __init__(self, timeperiod: int) -> None:
+        super().__init__(timeperiod, maximum=True)
+
+
+class LLV(Extreme):
+    """移动最低"""
+
+    def __init__(self, timeperiod: int) -> None:
+        super().__init__(timeperiod, maximum=False)
+
+
+class RSI(StreamingIndicator):
+    """RSI 相对强弱指数, Wilder 平滑, 对应 talib.RSI"""
+
+    def __init__(self, timeperiod: int) -> None:
+        self.timeperiod = timeperiod
+        self.count: int = 0
+        self.last: float = None
+        self.gain: float = 0.0
+        self.loss: float = 0.0
+        self._saved: Tuple[int, float, float, float] = None
+
+    def update(self, close: float) -> float:
+        self._saved = (self.count, self.last, self.gain, self.loss)
+        n = self.timeperiod
+
+        if self.last is None:
+            self.last = close
+            return nan
+
+        change, self.last = close - self.last, close
+        self.count += 1
+
+        if self.count > n:
+            self.gain *= n - 1
+            self.loss *= n - 1
+
+        if change < 0:
+            self.loss -= change
+        else:
+            self.gain += change
+
+        if self.count < n:
+            return nan
+
+        """前 n 个变化累加后转为均值, 之后为 Wilder 平滑"""
+        self.gain /= n
+        self.loss /= n
+
+        total = self.gain + self.loss
+        return 100.0 * self.gain / total if not -1e-8 < total < 1e-8 else 0.0
+
+    def undo(self) -> None:
+        self.count, self.last, self.gain, self.loss = self._saved
+
+
+class TrueRange(StreamingIndicator):
+    """真实波幅, 从第二根 K 线开始计算, 第一根为 nan"""
+
+    def __init__(self) -> None:
+        self.prev_close: float = None
+        self.last_close: float = None
+        self._saved: Tuple[float, float] = None
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self._saved = (self.prev_close, self.last_close)
+        self.prev_close, self.last_close = self.last_close, close
+
+        if self.prev_close is None:
+            return nan
+
+        return max(high - low, abs(self.prev_close - low), abs(self.prev_close - high))
+
+    def undo(self) -> None:
+        self.prev_close, self.last_close = self._saved
+
+    def _bulk(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> list:
+        if len(close) < 2 or np.isnan(high).any() or np.isnan(low).any() or np.isnan(close).any():
+            return super()._bulk(high, low, close)
+
+        prev_close = close[:-1]
+        high, low = high[1:], low[1:]
+        result = np.maximum(high - low, np.maximum(np.abs(prev_close - low), np.abs(prev_close - high)))
+        self.prev_close, self.last_close = float(close[-2]), float(close[-1])
+        return [nan, *result.tolist()]
+
+
+class ATR(StreamingIndicator):
+    """
+    真实波幅均值
+    ----
+        与 Indicators.atr 一致: 真实波幅从第二根 K 线开始计算, ATR 为其简单均值\n
+        update 返回 (atr, tr)
+    """
+
+    def __init__(self, timeperiod: int) -> None:
+        self.sma = SMA(timeperiod)
+        self.tr = TrueRange()
+
+    def update(self, high: float, low: float, close: float) -> Tuple[float, float]:
+        tr = self.tr.update(high, low, close)
+
+        if self.tr.prev_close is None:
+            return nan, nan
+
+        return self.sma.update(tr), tr
+
+    def undo(self) -> None:
+        if self.tr.prev_close is not None:
+            self.sma.undo()
+        self.tr.undo()
+
+    def _bulk(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> list:
+        tr = self.tr._bulk(high, low, close)
+        atr = self.sma._bulk(np.array(tr[1:], dtype=np.float64))
+        return [(nan, nan)][:len(tr)] + list(zip(atr, tr[1:]))
+
+
+class MACD(StreamingIndicator):
+    """
+    MACD 指标, 对应 talib.MACD (以及均线类型均为 EMA 的 talib.MACDEXT)
+    ----
+        与 talib 一致, 快线在慢线的第一个有效值处以最近 fast_period 个收盘价的均值为初值,
+        三个输出均从信号线有效时开始\n
+        update 返回 (macd, signal, hist), hist 未乘 2
+    """
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9) -> None:
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+
+        self.fast_period = fast_period
+        self.slow_period = slow_period
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        self.count: int = 0
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        self.count += 1
+        slow = self.slow.update(close)
+
+        if self.count <= self.slow_period - self.fast_period:
+            return nan, nan, nan
+
+        fast = self.fast.update(close)
+
+        if self.count < self.slow_period:
+            return nan, nan, nan
+
+        macd = fast - slow
+        signal = self.signal.update(macd)
+
+        if signal != signal:
+            return nan, nan, nan
+
+        return macd, signal, macd - signal
+
+    def undo(self) -> None:
+        if self.count >= self.slow_period:
+            self.signal.undo()
+        if self.count > self.slow_period - self.fast_period:
+            self.fast.undo()
+        self.slow.undo()
+        self.count -= 1
+
+    def _bulk(self, close: np.ndarray) -> list:
+        offset = self.slow_period - self.fast_period
+        slow = self.slow._bulk(close)
+        fast = self.fast._bulk(close[offset:])
+        self.count = len(close)
+
+        if self.count < self.slow_period:
+            return [(nan, nan, nan)] * self.count
+
+        """快线与慢线从慢线的第一个有效值开始对齐"""
+        macd = np.array(fast[self.fast_period - 1:]) - np.array(slow[self.slow_period - 1:])
+        signal = np.array(self.signal._bulk(macd))
+        macd[np.isnan(signal)] = nan
+        return [(nan, nan, nan)] * (self.slow_period - 1) + list(zip(
+            macd.tolist(), signal.tolist(), (macd - signal).tolist()
+        ))
+
+
+class KDJ(StreamingIndicator):
+    """
+    KDJ 指标, 与 Indicators.kdj 一致
+    ----
+        RSV 以 fastk_period 周期的最高最低价计算, K 为 RSV 的 2 * slowk_period - 1 周期 EMA,
+        D 为 K 的 2 * slowd_period - 1 周期 EMA, J = 3K - 2D\n
+        K 从第一个有效 RSV 开始计算, 之前为 0; 之后最高价等于最低价 (RSV 无效) 时 K 保持不变,
+        Indicators.kdj 在这种情况下之后的 K 全部为 0\n
+        update 返回 (k, d, j)
+    """
+
+    def __init__(self, fastk_period: int = 9, slowk_period: int = 3, slowd_period: int = 3) -> None:
+        self.hhv = HHV(fastk_period)
+        self.llv = LLV(fastk_period)
+        self.smooth = KDJSmooth(slowk_period, slowd_period)
+
+    def update(self, high: float, low: float, close: float) -> Tuple[float, float, float]:
+        return self.smooth.update(close, self.hhv.update(high), self.llv.update(low))
+
+    def undo(self) -> None:
+        self.smooth.undo()
+        self.llv.undo()
+        self.hhv.undo()
+
+    def _bulk(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> list:
+        hhv = np.array(self.hhv._bulk(high), dtype=np.float64)
+        llv = np.array(self.llv._bulk(low), dtype=np.float64)
+        return self.smooth._bulk(close, hhv, llv)
+
+
+class KDJSmooth(StreamingIndicator):
+    """
+    由收盘价和已计算的移动最高, 最低计算 KDJ, 平滑方式见 KDJ
+    ----
+        update(close, hhv, llv) 返回 (k, d, j)
+    """
+
+    def __init__(self, slowk_period: int = 3, slowd_period: int = 3) -> None:
+        self.k = EMA(slowk_period * 2 - 1)
+        self.d = EMA(slowd_period * 2 - 1)
+        self._k_fed: bool = False
+
+    def update(self, close: float, hhv: float, llv: float) -> Tuple[float, float, float]:
+        self._k_fed = hhv > llv
+        if self._k_fed:
+            k = self.k.update((close - llv) / (hhv - llv) * 100)
+        else:
+            k = self.k.value
+
+        if k != k:
+            k = 0.0
+
+        d = self.d.update(k)
+        return k, d, k * 3 - d * 2
+
+    def undo(self) -> None:
+        self.d.undo()
+        if self._k_fed:
+            self.k.undo()
+            self._k_fed = False
+
+
+class Donchian(StreamingIndicator):
+    """唐奇安通道, update 返回 (上轨, 下轨)"""
+
+    def __init__(self, timeperiod: int = 20) -> None:
+        self.hhv = HHV(timeperiod)
+        self.llv = LLV(timeperiod)
+
+    def update(self, high: float, low: float) -> Tuple[float, float]:
+        return self.hhv.update(high), self.llv.update(low)
+
+    def undo(self) -> None:
+        self.hhv.undo()
+        self.llv.undo()
+
+    def _bulk(self, high: np.ndarray, low: np.ndarray) -> list:
+        return list(zip(self.hhv._bulk(high), self.llv._bulk(low)))
+
+
+class StreamingIndicators(object):
+    """
+    增量技术指标
+    ----
+        方法和参数与 Indicators 一致, array 为 False 时返回最后一根线的指标\n
+        每组 (指标, 参数) 第一次查询时用 source 的历史数据 seed 一次, 之后每根 K 线只做 O(1) 更新\n
+        KLineProducer 在追加 K 线时调用 update, 更新最后一根 K 线时调用 replace, 插入乱序 K 线时调用 reset\n
+        正在走的 K 线通过 provisional 更新, 只记录 K 线数据, 查询时在上一根走完的 K 线的状态上计算临时值,
+        已确认的状态不变, 每个 tick 的计算量与历史长度无关; K 线走完后由 update 确认, 临时值被丢弃\n
+        array 为 False 时, shift 为向前偏移的 K 线数量, 如 shift=1 取上一根 K 线的指标\n
+        每组指标的结果只保留最近 (最大 shift + 1) 个, 查询过 array 的指标保留全部结果,
+        之后的查询需要更多结果时用 source 重新 seed
+
+    Args:
+        source: 带有 high, low, close 序列的对象, 如 KLineProducer
+    """
+
+    def __init__(self, source: Any = None) -> None:
+        self.source = source
+        self.indicators: Dict[tuple, Tuple[StreamingIndicator, Tuple[int, ...], Deque[Any]]] = {}
+
+        self.forming: Tuple[float, float, float] = None
+        """正在走的 K 线 (high, low, close), 为 None 时最后一根 K 线已走完"""
+
+        self.pending: Dict[tuple, Any] = {}
+        """正在走的 K 线的临时指标值"""
+
+        self.bars: int = None
+        """指标已确认的 K 线数量, 第一次从 source seed 时确定, 之后随 update 增加"""
+
+        self._undoable: bool = True
+        """最后一根走完的 K 线能否 replace, 计算临时值后指标的撤销信息被覆盖"""
+
+    def select(
+        self,
+        key: tuple,
+        factory: Callable[[], StreamingIndicator],
+        fields: Tuple[int, ...],
+        array: bool,
+        shift: int = 0
+    ) -> Any:
+        """
+        获取指标结果
+        ----
+            第一次查询时创建指标并用 seed 一次初始化历史数据, source 的最后一根为正在走的 K 线时不包含该 K 线,
+            自定义的增量指标 (如 IndicatorGraph) 也通过 select 注册\n
+            结果保存在 deque 中, 长度为各次查询中最大的 shift + 1, array 为 True 时不限长度;
+            需要的长度超过已保存的结果时, source 中有全部已确认的 K 线则重新 seed, 否则只放宽长度\n
+            有正在走的 K 线时最后一个结果为临时值\n
+            array 为 True 时返回结果列表, 否则返回倒数第 shift + 1 个结果, 数据不足时返回 None
+        """
+        maxlen = None if array else shift + 1
+
+        if key in self.indicators:
+            indicator, _, values = self.indicators[key]
+            if values.maxlen is not None and (maxlen is None or maxlen > values.maxlen):
+                if (
+                    self.source is not None and self.bars is not None
+                    and len(values) == values.maxlen and len(self.source.close) >= self.bars
+                ):
+                    """较早的结果已被丢弃"""
+                    del self.indicators[key]
+                    self.pending.pop(key, None)
+                else:
+                    self.indicators[key] = (indicator, fields, deque(values, maxlen))
+
+        if key not in self.indicators:
+            indicator, values = factory(), deque(maxlen=maxlen)
+
+            if self.source is not None:
+                columns = (self.source.high, self.source.low, self.source.close)
+                if self.bars is None:
+                    self.bars = len(columns[CLOSE]) - (self.forming is not None)
+                end = self.bars
+                values.extend(indicator.seed(*(
+                    np.asarray(columns[field][:end], dtype=np.float64) for field in fields
+                )))
+
+            self.indicators[key] = (indicator, fields, values)
+
+        values = self.indicators[key][2]
+
+        if self.forming is not None:
+            if array:
+                return [*values, self._provisional(key)]
+            if not shift:
+                return self._provisional(key)
+            shift -= 1
+
+        if array:
+            return list(values)
+        return values[-1 - shift] if shift < len(values) else None
+
+    def _provisional(self, key: tuple) -> Any:
+        """在已确认的状态上计算正在走的 K 线的指标后撤销, 同一个 tick 内只计算一次"""
+        if key not in self.pending:
+            indicator, fields, _ = self.indicators[key]
+            self.pending[key] = indicator.update(*(self.forming[field] for field in fields))
+            indicator.undo()
+            self._undoable = False
+        return self.pending[key]
+
+    def update(self, high: float, low: float, close: float) -> None:
+        """追加一根走完的 K 线, 有正在走的 K 线时即为确认该 K 线"""
+        self.discard()
+        bar = (high, low, close)
+        for indicator, fields, values in self.indicators.values():
+            values.append(indicator.update(*(bar[field] for field in fields)))
+        self._undoable = True
+
+        if self.bars is not None:
+            self.bars += 1
+
+    def replace(self, high: float, low: float, close: float) -> None:
+        """重算最后一根走完的 K 线"""
+        if not self._undoable:
+            """撤销信息已被临时值的计算覆盖, 下次查询时重新回放"""
+            self.reset()
+            return
+
+        bar = (high, low, close)
+        for indicator, fields, values in self.indicators.values():
+            values[-1] = indicator.replace(*(bar[field] for field in fields))
+
+    def provisional(self, high: float, low: float, close: float) -> None:
+        """更新正在走的 K 线, 只记录数据, 临时值在查询时计算"""
+        self.forming = (high, low, close)
+        self.pending.clear()
+
+    def commit(self) -> None:
+        """按最后一次 provisional 的数据确认正在走的 K 线, 没有正在走的 K 线时不处理"""
+        if self.forming is not None:
+            self.update(*self.forming)
+
+    def discard(self) -> None:
+        """丢弃正在走的 K 线及其临时值"""
+        self.forming = None
+        self.pending.clear()
+
+    def reset(self) -> None:
+        """清空全部指标, 下次查询时重新回放"""
+        self.indicators.clear()
+        self.pending.clear()
+        self._undoable = True
+        self.bars = None
+
+    def snapshot(self) -> dict:
+        """
+        已确认的指标状态, 不包含正在走的 K 线
+        ----
+            指标对象深拷贝, 结果 deque 浅拷贝 (元素为不可变的数值或元组), 之后的 update 不影响快照, 可以在其他线程 pickle
+        """
+        return {
+            "indicators": {
+                key: (copy.deepcopy(indicator), fields, deque(values, values.maxlen))
+                for key, (indicator, fields, values) in self.indicators.items()
+            },
+            "undoable": self._undoable,
+            "bars": self.bars
+        }
+
+    def restore(self, state: dict) -> None:
+        """恢复 snapshot 保存的状态, 丢弃正在走的 K 线"""
+        self.discard()
+        self.indicators = state["indicators"]
+        self._undoable = state["undoable"]
+        self.bars = state["bars"]
+
+    @staticmethod
+    def _result(selected: Any, array: bool) -> Union[np.float64, np.ndarray]:
+        if array:
+            return np.array(selected, dtype=np.float64)
+        return np.float64(nan if selected is None else selected)
+
+    @staticmethod
+    def _results(selected: Any, width: int, array: bool) -> tuple:
+        if array:
+            columns = list(zip(*selected)) or [()] * width
+            return tuple(np.array(column, dtype=np.float64) for column in columns)
+        return tuple(map(np.float64, (nan,) * width if selected is None else selected))
+
+    def sma(
+        self,
+        timeperiod: int = 9,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """简单均线"""
+        selected = self.select(("sma", timeperiod), lambda: SMA(timeperiod), (CLOSE,), array, shift)
+        return self._result(selected, array)
+
+    def ema(
+        self,
+        timeperiod: int = 12,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """EXPMA 指标"""
+        selected = self.select(("ema", timeperiod), lambda: EMA(timeperiod), (CLOSE,), array, shift)
+        return self._result(selected, array)
+
+    def std(
+        self,
+        timeperiod: int = 5,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """标准差"""
+        selected = self.select(
+            ("std", timeperiod),
+            lambda: STD(timeperiod, sqrt(timeperiod / (timeperiod - 1))),
+            (CLOSE,),
+            array,
+            shift
+        )
+        return self._result(selected, array)
+
+    def rsi(
+        self,
+        timeperiod: int = 14,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """RSI 相对强弱指数"""
+        selected = self.select(("rsi", timeperiod), lambda: RSI(timeperiod), (CLOSE,), array, shift)
+        return self._result(selected, array)
+
+    def hhv(
+        self,
+        timeperiod: int = 30,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """移动最高"""
+        selected = self.select(("hhv", timeperiod), lambda: HHV(timeperiod), (HIGH,), array, shift)
+        return self._result(selected, array)
+
+    def llv(
+        self,
+        timeperiod: int = 30,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[np.float64, np.ndarray]:
+        """移动最低"""
+        selected = self.select(("llv", timeperiod), lambda: LLV(timeperiod), (LOW,), array, shift)
+        return self._result(selected, array)
+
+    def kdj(
+        self,
+        fastk_period: int = 9,
+        slowk_period: int = 3,
+        slowd_period: int = 3,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[
+        Tuple[np.float64, np.float64, np.float64],
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+    ]:
+        """KDJ 指标"""
+        selected = self.select(
+            ("kdj", fastk_period, slowk_period, slowd_period),
+            lambda: KDJ(fastk_period, slowk_period, slowd_period),
+            (HIGH, LOW, CLOSE),
+            array,
+            shift
+        )
+        return self._results(selected, 3, array)
+
+    def kd(
+        self,
+        fastk_period: int = 9,
+        slowk_period: int = 3,
+        slowd_period: int = 3,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[
+        Tuple[np.float64, np.float64],
+        Tuple[np.ndarray, np.ndarray]
+    ]:
+        """KD 指标"""
+        return self.kdj(fastk_period, slowk_period, slowd_period, array, shift)[:2]
+
+    def macd(
+        self,
+        fast_period: int = 12,
+        slow_period: int = 26,
+        signal_period: int = 9,
+        array: bool = False,
+        shift: int = 0
+    ) -> Union[
+        Tuple[np.float64, np.float64, np.float64],
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+    ]:
+        """MACD 指标, 柱状值与 Indicators.macd 一致乘以 2"""
+        selected = self.select(
+            ("macd", fast_period, slow_period, signal_period),
+            lambda: MACD(fast_period, slow_period, signal_period),
+            (CLOSE,),
+            array,
+            shift
+        )
+        macd, signal, hist = self._results(selected, 3, array)
+        return macd, signal, hist * 2
+
+    def atr(self, timeperiod: int = 14, array: bool = False, shift: int = 0) -> Union[
+        Tuple[np.float64, np.float64],
+        Tuple[np.ndarray, np.ndarray]
+    ]:
+        """真实波幅均值, ATR, 与 Indicators.atr 一致数组从第二根 K 线开始"""
+        selected = self.select(("atr", timeperiod), lambda: ATR(timeperiod), (HIGH, LOW, CLOSE), array, shift)
+        return self._results(selected[1:] if array else selected, 2, array)
+
+    def boll(self, timeperiod: int = 20, deviation: int = 2) -> Tuple[np.float64, np.float64]:
+        """布林通道"""
+        mid = self.sma(timeperiod)
+        std = self.std(timeperiod)
+        return mid + std * deviation, mid - std * deviation
+
+    def keltner(self, timeperiod: int = 20, multiple: int = 2) -> Tuple[np.float64, np.float64]:
+        """肯特纳通道 (Keltner Channels, KC)"""
+        mid = self.ema(timeperiod)
+        atr, _ = self.atr(timeperiod)
+        return mid + atr * multiple, mid - atr * multiple
+
+    def donchian(self, timeperiod: int = 20) -> Tuple[np.float64, np.float64]:
+        """唐奇安通道 (Donchian Channels, DC)"""
+        selected = self.select(("donchian", timeperiod), lambda: Donchian(timeperiod), (HIGH, LOW), False)
+        return self._results(selected, 2, False)
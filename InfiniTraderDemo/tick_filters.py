@@ -0,0 +1,294 @@
+import math
+from datetime import datetime
+from operator import attrgetter
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from sessions import (DEFAULT_SESSIONS, SessionCalendar, SessionType,
+                      product_sessions)
+
+TickType = Any
+"""TickData 或任何带有相同行情字段的对象"""
+
+
+def _clock_seconds(value: str) -> int:
+    """HH:MM 或 HH:MM:SS(.f) 转为当日秒数"""
+    parts = value.split(":")
+    hour, minute = int(parts[0]), int(parts[1])
+    second = int(parts[2][:2]) if len(parts) > 2 else 0
+    return hour * 3600 + minute * 60 + second
+
+
+class TickFilter(object):
+    """
+    tick 过滤器基类
+    ----
+        子类实现 check, 返回 True 表示保留该 tick\n
+        hits 为拒绝的 tick 数量, cost 为累计耗时 (秒), 由 TickFilterChain 统计
+    """
+
+    name: str = ""
+
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.cost: float = 0.0
+
+    def check(self, tick: TickType) -> bool:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """清空统计"""
+        self.hits = 0
+        self.cost = 0.0
+
+
+class DuplicateFilter(TickFilter):
+    """
+    重复 tick 过滤
+    ----
+        keys 中的字段与上一个保留的 tick 全部相同即视为重复\n
+        默认按时间和累计成交量判断, 只按成交量判断时与 K 线合成丢弃成交量不变的 tick 的规则一致
+
+    Args:
+        keys: 比较的字段名
+    """
+
+    name = "duplicate"
+
+    def __init__(self, keys: Tuple[str, ...] = ("datetime", "volume")) -> None:
+        super().__init__()
+        self.keys = keys
+        self._key = attrgetter(*keys)
+        self._last_key: Any = None
+
+    def check(self, tick: TickType) -> bool:
+        key = self._key(tick)
+        if key == self._last_key:
+            return False
+        self._last_key = key
+        return True
+
+
+class SessionFilter(TickFilter):
+    """
+    非交易时段过滤
+    ----
+        启动时由 SessionCalendar.trading_seconds 得到一天 86400 秒的查找表, 每个 tick 只做一次下标查询\n
+        开盘前 auction 分钟的集合竞价 tick (如 08:59, 20:59) 和收盘时间整分的 tick 保留,
+        与 MinKLineGenerator 归入 K 线的范围一致; 只按时刻判断, 不判断周末和节假日\n
+        tick.datetime 为空时使用 tick.time
+
+    Args:
+        sessions: 交易时段 (开始, 结束), 默认按 symbol 的品种取 product_sessions, 都没有给定时为 DEFAULT_SESSIONS\n
+        symbol: 合约代码\n
+        auction: 集合竞价分钟数
+    """
+
+    name = "session"
+
+    def __init__(
+        self,
+        sessions: Iterable[SessionType] = None,
+        symbol: str = None,
+        auction: int = 5
+    ) -> None:
+        super().__init__()
+        if sessions is None:
+            sessions = product_sessions(symbol) if symbol else DEFAULT_SESSIONS
+
+        self.sessions = tuple(sessions)
+        self.calendar = SessionCalendar.get(self.sessions, auction=auction)
+        self._table = self.calendar.trading_seconds()
+
+    def check(self, tick: TickType) -> bool:
+        _datetime: datetime = tick.datetime
+        if _datetime is None:
+            return self._table[_clock_seconds(tick.time)] == 1
+        return self._table[_datetime.hour * 3600 + _datetime.minute * 60 + _datetime.second] == 1
+
+
+class StaleFilter(TickFilter):
+    """
+    过期时间戳过滤
+    ----
+        拒绝时间早于上一个保留 tick 的乱序 tick\n
+        设置 max_lag 时, 还会拒绝与本地时间相差超过 max_lag 秒的 tick (断线重连后推送的旧行情, 或时间错误的 tick)
+
+    Args:
+        max_lag: 与本地时间的最大偏差秒数, 为 None 不检查\n
+        clock: 本地时间函数
+    """
+
+    name = "stale"
+
+    def __init__(self, max_lag: float = None, clock: Callable[[], datetime] = datetime.now) -> None:
+        super().__init__()
+        self.max_lag = max_lag
+        self.clock = clock
+        self._last_time: datetime = None
+
+    def check(self, tick: TickType) -> bool:
+        _datetime: datetime = tick.datetime
+
+        if self._last_time is not None and _datetime < self._last_time:
+            return False
+
+        if self.max_lag is not None and abs((self.clock() - _datetime).total_seconds()) > self.max_lag:
+            return False
+
+        self._last_time = _datetime
+        return True
+
+
+class CrossedBookFilter(TickFilter):
+    """买一价不低于卖一价的交叉盘口过滤, 单边无报价时不判断"""
+
+    name = "crossed_book"
+
+    def check(self, tick: TickType) -> bool:
+        bid, ask = tick.bidPrice1, tick.askPrice1
+        return not (bid > 0 and ask > 0 and bid >= ask)
+
+
+class PriceFilter(TickFilter):
+    """
+    异常价格过滤
+    ----
+        拒绝最新价不大于 0, 非有限值, 或超出涨跌停价 (涨跌停价大于 0 时) 的 tick
+
+    Args:
+        empty_book: 是否拒绝买一价或卖一价为 0 的 tick, 即涨跌停封板和集合竞价时的行情\n
+        limits: 是否拒绝超出涨跌停价的 tick
+    """
+
+    name = "price"
+
+    def __init__(self, empty_book: bool = False, limits: bool = True) -> None:
+        super().__init__()
+        self.empty_book = empty_book
+        self.limits = limits
+
+    def check(self, tick: TickType) -> bool:
+        price: float = tick.lastPrice
+
+        if not price > 0 or not math.isfinite(price):
+            return False
+
+        if self.limits and tick.upperLimit > 0 and not tick.lowerLimit <= price <= tick.upperLimit:
+            return False
+
+        if self.empty_book and (tick.bidPrice1 <= 0 or tick.askPrice1 <= 0):
+            return False
+
+        return True
+
+
+def default_filters(symbol: str = None) -> List[TickFilter]:
+    """
+    默认过滤链: 价格, 重复, 交叉盘口, 过期时间戳, 交易时段
+
+    Args:
+        symbol: 合约代码, 交易时段按其品种取 product_sessions, 为空时使用 DEFAULT_SESSIONS
+    """
+    return [
+        PriceFilter(),
+        DuplicateFilter(),
+        CrossedBookFilter(),
+        StaleFilter(),
+        SessionFilter(symbol=symbol)
+    ]
+
+
+class TickFilterChain(object):
+    """
+    单合约 tick 过滤链
+    ----
+        按顺序执行各过滤器, 遇到第一个拒绝即返回 False, 之后的过滤器不再执行\n
+        建议把开销小, 命中率高的过滤器放在前面
+
+    Args:
+        stages: 过滤器列表, 过滤器带有状态, 不能在多个合约间共用\n
+        profile: 是否统计每个过滤器的耗时, 开启后每个过滤器多两次计时调用, 默认只统计拒绝数量
+    """
+
+    def __init__(self, stages: Iterable[TickFilter], profile: bool = False) -> None:
+        self.stages: Tuple[TickFilter, ...] = tuple(stages)
+        self.profile = profile
+
+        self.passed: int = 0
+        self.rejected: int = 0
+
+        self._checks = tuple((stage, stage.check) for stage in self.stages)
+
+    def __call__(self, tick: TickType) -> bool:
+        """返回 True 表示 tick 通过全部过滤器"""
+        if self.profile:
+            for stage, check in self._checks:
+                start = perf_counter()
+                keep = check(tick)
+                stage.cost += perf_counter() - start
+                if not keep:
+                    stage.hits += 1
+                    self.rejected += 1
+                    return False
+        else:
+            for stage, check in self._checks:
+                if not check(tick):
+                    stage.hits += 1
+                    self.rejected += 1
+                    return False
+
+        self.passed += 1
+        return True
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        各过滤器的统计
+
+        Returns:
+            {过滤器名称: {"hits": 拒绝数量, "cost": 累计耗时 (秒)}}, 以及 total 的通过和拒绝数量
+        """
+        stats = {stage.name: {"hits": stage.hits, "cost": stage.cost} for stage in self.stages}
+        stats["total"] = {"passed": self.passed, "rejected": self.rejected}
+        return stats
+
+    def reset(self) -> None:
+        """清空统计"""
+        self.passed = self.rejected = 0
+        for stage in self.stages:
+            stage.reset()
+
+
+class TickFilterPipeline(object):
+    """
+    按合约分开的 tick 过滤
+    ----
+        每个合约第一次出现时用 factory 构建一条独立的过滤链, 之后直接复用
+
+    Args:
+        factory: 返回过滤器列表的函数, 参数为合约代码\n
+        profile: 是否统计每个过滤器的耗时
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Iterable[TickFilter]] = default_filters,
+        profile: bool = False
+    ) -> None:
+        self.factory = factory
+        self.profile = profile
+        self.chains: Dict[str, TickFilterChain] = {}
+
+    def __call__(self, tick: TickType) -> bool:
+        chain = self.chains.get(tick.symbol)
+        if chain is None:
+            chain = self.chains[tick.symbol] = TickFilterChain(self.factory(tick.symbol), self.profile)
+        return chain(tick)
+
+    def stats(self) -> Dict[str, Dict[str, dict]]:
+        """各合约过滤链的统计"""
+        return {symbol: chain.stats() for symbol, chain in self.chains.items()}
+
+    def reset(self) -> None:
+        for chain in self.chains.values():
+            chain.reset()
@@ -185,9 +185,12 @@ class KLineWidget(KeyWraper):
     update_candle_signal = QtCore.pyqtSignal()
     add_buy_sell_signal = QtCore.pyqtSignal(int)
 
-    def __init__(self, parent: QWidget = None):
+    def __init__(self, parent: QWidget = None, compact: bool = False):
         super().__init__(parent)
 
+        self.compact: bool = compact
+        """紧凑存储, K 线数组的价格为 float32, 成交量和持仓量为 int32"""
+
         self.index: int = 0
         self.view_kline_range: List[int] = [0, 0]
         self.kline_count: int = 60  # 显示的 K 线范围
@@ -224,17 +227,17 @@ class KLineWidget(KeyWraper):
         """初始化数据容器"""
         base = ['open', 'close', 'low', 'high']
 
-        self.datas: np.recarray = pd.DataFrame(
+        self.datas: np.recarray = self._compact(pd.DataFrame(
             columns=['datetime', *base, 'volume', 'openInterest']
-        ).set_index("datetime").to_records(index_dtypes='<M8[s]')
+        ).set_index("datetime").to_records(index_dtypes='<M8[s]'))
 
-        self.list_kline: np.recarray = pd.DataFrame(
+        self.list_kline: np.recarray = self._compact(pd.DataFrame(
             columns=['array_index', *base]
-        ).to_records(False)
+        ).to_records(False))
 
-        self.list_volume: np.recarray = pd.DataFrame(
+        self.list_volume: np.recarray = self._compact(pd.DataFrame(
             columns=['array_index', *base[:2], 'high', 'low']
-        ).to_records(False)
+        ).to_records(False), volume=True)
 
         self.list_high: List[float] = []
         self.list_low: List[float] = []
@@ -242,6 +245,31 @@ class KLineWidget(KeyWraper):
         self.list_open_interest: List[int] = []
         self.arrows: List[pg.ArrowItem] = []
 
+    def _compact(self, records: np.recarray, volume: bool = False) -> np.recarray:
+        """
+        紧凑模式下转换 K 线数组的类型, 非紧凑模式原样返回
+
+        Args:
+            records: K 线数组\n
+            volume: 是否为成交量数组, 为 True 时数值列全部为成交量
+        """
+        if not self.compact:
+            return records
+
+        return records.astype([
+            (name, records.dtype[name]) if name in ("datetime", "array_index")
+            else (name, np.int32 if volume or name in ("volume", "openInterest") else np.float32)
+            for name in records.dtype.names
+        ])
+
+    def memory_usage(self) -> Dict[str, int]:
+        """K 线数组的内存占用, nbytes 为实际字节数, float64 为数值列均为 float64 时的字节数"""
+        arrays = (self.datas, self.list_kline, self.list_volume)
+        return {
+            "nbytes": sum(array.nbytes for array in arrays),
+            "float64": sum(len(array) * 8 * len(array.dtype.names) for array in arrays)
+        }
+
     def init_ui(self):
         """初始化界面"""
 
@@ -610,16 +638,16 @@ class KLineWidget(KeyWraper):
         """
         datas['array_index'] = np.array(range(len(datas.index)))
 
-        self.datas = datas[
+        self.datas = self._compact(datas[
             ['open', 'close', 'low', 'high', 'volume', 'openInterest']
-        ].to_records(index_dtypes='<M8[s]')
+        ].to_records(index_dtypes='<M8[s]'))
 
         self.time_axis.xdict = {}
         self.time_axis.update_xdict(dict(enumerate(self.datas["datetime"])))
         self.set_xrange_event()
 
         # 更新画图用到的数据
-        self.list_kline = datas[['array_index', 'open', 'close', 'low', 'high']].to_records(False)
+        self.list_kline = self._compact(datas[['array_index', 'open', 'close', 'low', 'high']].to_records(False))
         self.list_high = datas['high'].values.tolist()
         self.list_low = datas['low'].values.tolist()
         self.list_open_interest = datas['openInterest'].values.tolist()
@@ -632,7 +660,7 @@ class KLineWidget(KeyWraper):
         df.loc[datas["open"].values > datas["close"].values, "close"] = 0
         df["low"] = 0
 
-        self.list_volume = df.to_records(False)
+        self.list_volume = self._compact(df.to_records(False), volume=True)
 
     def plot_all(self):
         """重画所有界面"""
@@ -1,13 +1,26 @@
+import copy
+import os
 import threading
-from datetime import datetime, timedelta
-from typing import Any, Callable, List, Literal, Union
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import (Any, Callable, Dict, Iterable, List, Literal, Optional,
+                    Tuple, Union)
 
+import ctaEngine  # type: ignore
 import numpy as np
 from apscheduler.job import Job
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from aggregation import KLineResampler, style_seconds
 from core import KLineStyle, KLineStyleType, MarketCenter
+from indicator_graph import IndicatorSet
 from indicators import Indicators
+from replay import BarChunk, replay
+from series import KLineSeries, SharedKLineSeries
+from sessions import (DEFAULT_SESSIONS, PRODUCT_SESSIONS, SessionCalendar,
+                      SessionType, product_of, product_sessions)
+from snapshot import SnapshotStore
+from streaming import StreamingIndicators
 from vtObject import KLineData, TickData
 
 DateTimeType = datetime
@@ -45,19 +58,31 @@ class Scheduler(object):
 class KLineGenerator(object):
     """秒级 K 线生成器
 
+    以第一个 tick 的整数时间戳 (秒) 为锚点, 按 seconds 切分时间桶,
+    每个 tick 只做一次整除判断所属时间桶, 缺失的秒数无需补全, 同一秒内的多个 tick 归入同一时间桶
+
     Args:
         callback: 推送 K 线回调, 也可以是任何接受一根 K 线然后返回 None 的函数\n
-        seconds: 合成秒数
+        seconds: 合成秒数\n
+        tick_filter: tick 过滤函数, 如 TickFilterChain, 返回 False 的 tick 不参与合成
     """
 
-    def __init__(self, callback: Callable[[KLineData], None], seconds: int = 1) -> None:
+    def __init__(
+        self,
+        callback: Callable[[KLineData], None],
+        seconds: int = 1,
+        tick_filter: Callable[[TickData], bool] = None
+    ) -> None:
         self.callback = callback
         self.seconds = seconds
+        self.tick_filter = tick_filter
 
         self.cache_kline: KLineData = None
         self.last_tick: TickData = None
         self.is_new: bool = True
-        self.timekeeper: List[datetime] = []
+
+        self._anchor_ts: int = None
+        self._bucket: int = None
 
     @property
     def seconds(self) -> int:
@@ -67,75 +92,63 @@ class KLineGenerator(object):
     def seconds(self, value: int) -> None:
         if not isinstance(value, int):
             raise ValueError("秒数必须为 int 类型")
+        if value < 1:
+            raise ValueError("秒数必须大于 0")
         self._seconds: int = value
 
     @property
     def first_time(self) -> datetime:
-        """获取第一条 tick 的时间"""
-        return self.timekeeper[0]
+        """获取当前 K 线周期的开始时间"""
+        return datetime.fromtimestamp(self._anchor_ts + self._bucket * self.seconds)
 
     @property
     def last_k_time(self) -> datetime:
-        """获取上一条 K 线的时间"""
-        return self.sort_timekeeper[self.seconds - 1]
-
-    @property
-    def sort_timekeeper(self) -> List[datetime]:
-        """对时间线去重"""
-        return sorted(set(self.timekeeper), key=self.timekeeper.index)
+        """获取当前 K 线周期的最后一秒, 即推送时 K 线的时间"""
+        return datetime.fromtimestamp(self._anchor_ts + self._bucket * self.seconds + self.seconds - 1)
 
     @staticmethod
     def _ts(_datetime: datetime) -> int:
         """获取 datetime 对象的时间戳"""
         return int(_datetime.timestamp())
 
-    def save_time(self, _time: datetime) -> None:
-        """对时间去除毫秒数并保存至时间线"""
-        self.timekeeper.append(_time.replace(microsecond=0))
-
-    def fix_timeline(self, tick: TickData) -> None:
-        """修复时间线中缺失的时间"""
-        lost_seconds: int = self._ts(tick.datetime) - self._ts(self.last_tick.datetime)
-        if (lost_ticks := (lost_seconds - 1)) > 0:
-            # 如果少了 tick，则手动补全 timekeeper
-            for j in range(lost_ticks, 0, -1):
-                self.timekeeper.insert(-1, (tick.datetime - timedelta(seconds=j)).replace(microsecond=0))
-
     def set_kline_data(self, **kwargs) -> None:
         """对当前缓存的 K 线设置数据"""
         self.cache_kline.__dict__.update(kwargs)
 
     def new_kline_cycle(self, tick: TickData) -> bool:
         """判断该 tick 是否进入新的 K 线周期"""
+        bucket: int = (self._ts(tick.datetime) - self._anchor_ts) // self.seconds
+
         if not self.cache_kline:
             # 首次运行
+            self._bucket = bucket
             return False
 
-        diff_seconds: int = self._ts(tick.datetime) - self._ts(self.first_time)
-
-        self.fix_timeline(tick)
-
-        if diff_seconds >= self.seconds:
-            # 新 tick 时间和时间容器中第一根 tick 时间秒数对比
-            # 如果大于等于设置的秒数，则表示进入新的 K 线周期
-            # 然后要修复时间线，在把时间线中正确的时间赋予当前缓存 K 线
-            # 最后把该 K 线时间之后的时间重新赋值给时间线，成为新的时间线
+        if bucket > self._bucket:
+            # tick 所在时间桶大于当前 K 线的时间桶, 则表示进入新的 K 线周期
+            # 当前缓存 K 线的时间为其时间桶的最后一秒
+            last_k_time = self.last_k_time
 
             self.set_kline_data(
-                date=self.last_k_time.strftime("%Y%m%d"),
-                time=self.last_k_time.strftime("%X"),
-                datetime=self.last_k_time
+                date=last_k_time.strftime("%Y%m%d"),
+                time=last_k_time.strftime("%X"),
+                datetime=last_k_time
             )
-            self.timekeeper = self.sort_timekeeper[self.seconds:]
+            self._bucket = bucket
 
             return True
 
+        return False
+
     def tick_to_kline(self, tick: TickData) -> None:
-        if self.is_new and tick.datetime.microsecond >= 500000:
-            # 第一次运行，要毫秒数要小于 500ms，并且 self.seconds 能被 tick 的秒数整除
+        if self.tick_filter and not self.tick_filter(tick):
             return
 
-        self.save_time(tick.datetime)
+        if self._anchor_ts is None:
+            if tick.datetime.microsecond >= 500000:
+                # 第一次运行，要毫秒数要小于 500ms
+                return
+            self._anchor_ts = self._ts(tick.datetime)
 
         if self.new_kline_cycle(tick):
             self.is_new = True
@@ -177,7 +190,19 @@ class MinKLineGenerator(object):
         exchange: 交易所代码\n
         instrument: 合约代码\n
         style: 合成 K 线分钟, 默认 M1 即 1 分钟 K 线, 必须使用 KLineStyle 的枚举值\n
-        real_time_callback: 实时推送 K 线回调, 推送频率和 tick 相同
+        real_time_callback: 实时推送 K 线回调, 推送频率和 tick 相同\n
+        sessions: 合约交易时段, 默认按合约品种取 PRODUCT_SESSIONS, 用于计算 K 线时间, 收盘时间和断线后缺失的 K 线数量,
+            品种不在 PRODUCT_SESSIONS 中时使用包含夜盘的 DEFAULT_SESSIONS 并写日志警告;
+            K 线时间和收盘时间只有 M1 ~ M15 由交易时段计算, M30 及以上的周期与平台的历史 K 线对齐方式可能不同, 仍由 MarketCenter 计算\n
+        holidays: 节假日, 节假日以及节假日前的夜盘休市, 默认为 sessions.set_holidays 设置的节假日,
+            两者都没有时写日志警告, 节假日前的夜盘按开市处理\n
+        tick_filter: tick 过滤函数, 如 TickFilterChain, 在成交量判断之前执行, 返回 False 的 tick 不参与合成\n
+        warmup: 历史 K 线只推送最后 warmup 根, 之前的 K 线批量写入序列, 见 KLineProducer\n
+        snapshot: 状态快照, 给定时启动时恢复当前交易日的快照, 不再获取历史 K 线, 只补快照之后缺失的 K 线;
+            每隔 snapshot_interval 秒在 K 线走完时在 tick 线程复制状态, 由后台线程写入, stop_push_scheduler 时同步保存;
+            恢复后 callback 不会收到历史 K 线, 策略在回调中自己维护的状态 (自定义序列, 信号等) 不会重建,
+            需要策略自己保存, 或者改为从 producer 的序列和指标读取\n
+        snapshot_interval: 定期保存快照的间隔秒数
     """
 
     def __init__(
@@ -186,23 +211,59 @@ class MinKLineGenerator(object):
         exchange: str,
         instrument: str,
         style: Union[KLineStyleType, str] = KLineStyle.M1,
-        real_time_callback: Callable[[KLineData], None] = None
+        real_time_callback: Callable[[KLineData], None] = None,
+        sessions: Tuple[SessionType, ...] = None,
+        holidays: Iterable[date] = None,
+        tick_filter: Callable[[TickData], bool] = None,
+        warmup: int = None,
+        snapshot: SnapshotStore = None,
+        snapshot_interval: int = 300
     ) -> None:
         self.callback = callback
         self.exchange = exchange
         self.instrument = instrument
         self.style = style
         self.real_time_callback = real_time_callback
+        self.sessions = sessions or product_sessions(instrument)
+        self.tick_filter = tick_filter
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+
+        self.calendar = SessionCalendar.get(self.sessions, holidays)
+        try:
+            self._bar_minutes: int = style_seconds(self.style) // 60
+        except ValueError:
+            """日线等按交易日合成的周期仍由 MarketCenter 计算"""
+            self._bar_minutes: int = None
+
+        if self._bar_minutes and self._bar_minutes > self._CALENDAR_MAX_MINUTES:
+            """M30, H1 等周期在交易时段中间的休息前后与平台的历史 K 线划分不一定相同, 仍由 MarketCenter 计算"""
+            self._bar_minutes = None
+
+        if not sessions and product_of(instrument) not in PRODUCT_SESSIONS:
+            ctaEngine.writeLog(f"{exchange}.{instrument} 的品种没有交易时段, 使用默认交易时段 {DEFAULT_SESSIONS}, 请传入 sessions")
+        if self._bar_minutes is not None and not self.calendar.holidays:
+            ctaEngine.writeLog(f"{exchange}.{instrument} 没有设置节假日, 节假日前的夜盘按开市处理, 请传入 holidays 或调用 set_holidays")
 
         self.scheduler = Scheduler()
         self.market_center = MarketCenter()
+
+        self._snapshot_time: datetime = None
+        self._resumed: dict = self.load_snapshot()
+        """快照中的状态, 第一个 tick 与快照中正在合成的 K 线属于同一根 K 线时继续合成"""
+
         self.producer = KLineProducer(
             exchange=self.exchange,
             instrument=self.instrument,
             style=style,
-            callback=callback
+            callback=callback,
+            history=self._resumed is None,
+            warmup=warmup
         )
 
+        if self._resumed is not None:
+            self.producer.restore(self._resumed["producer"])
+
         self.next_gen_time: datetime = None
 
         self._first_run: bool = True
@@ -212,6 +273,10 @@ class MinKLineGenerator(object):
         self._min_last_tick: TickData = None
         self._min_last_volume: int = 0
         self._dirty_time: datetime = None
+        self._lose_kline: bool = False
+        self._backfill_thread: threading.Thread = None
+        self._backfill_data: List[dict] = []
+        self._backfill_after: datetime = None
 
     @property
     def style(self) -> KLineStyleType:
@@ -227,8 +292,57 @@ class MinKLineGenerator(object):
             raise ValueError("合成分钟必须为 KLineStyle 的枚举值")
 
     def stop_push_scheduler(self) -> None:
-        """停止定时器"""
+        """停止定时器, 设置了 snapshot 时等待后台写入完成后同步保存快照, 在策略停止 (onStop) 时调用"""
         self.scheduler.stop()
+        self.save_snapshot()
+
+    def load_snapshot(self) -> Optional[dict]:
+        """读取快照, 没有设置 snapshot, 没有快照或快照不是当前交易日写入的时返回 None"""
+        if self.snapshot is None or (entry := self.snapshot.read(
+            self.exchange, self.instrument, self.style.name
+        )) is None:
+            return None
+
+        state, written = entry
+        if self.calendar.trading_day(written) != self.calendar.trading_day(datetime.now()):
+            return None
+        return state
+
+    def save_snapshot(self, background: bool = False) -> None:
+        """
+        保存快照
+        ----
+            包含 KLineProducer 的序列和增量指标, 以及正在合成的 K 线 (_cache_kline, _min_last_volume, _dirty_time),
+            还没有收到 tick 时保留恢复的快照中正在合成的 K 线\n
+            状态在调用线程复制, background 为 True 时由 SnapshotStore 的后台线程 pickle 和写入, 调用线程不等待
+
+        Args:
+            background: 是否在后台线程写入
+        """
+        if self.snapshot is None:
+            return
+
+        if self._first_run:
+            resumed = self._resumed or {}
+            cache_kline = resumed.get("cache_kline")
+            min_last_volume, dirty_time = resumed.get("min_last_volume", 0), resumed.get("dirty_time")
+        else:
+            cache_kline = None if self._is_new else copy.copy(self._cache_kline)
+            min_last_volume, dirty_time = self._min_last_volume, self._dirty_time
+
+        state = {
+            "producer": self.producer.snapshot(),
+            "cache_kline": cache_kline,
+            "min_last_volume": min_last_volume,
+            "dirty_time": dirty_time
+        }
+
+        if background:
+            self.snapshot.write_async(self.exchange, self.instrument, self.style.name, state)
+        else:
+            self.snapshot.flush()
+            self.snapshot.write(self.exchange, self.instrument, self.style.name, state)
+        self._snapshot_time = datetime.now()
 
     def _set_kline_data(self, **kwargs) -> None:
         """对当前缓存的 K 线设置数据"""
@@ -247,6 +361,33 @@ class MinKLineGenerator(object):
             return _datetime
         return _datetime.replace(second=0, microsecond=0)
 
+    def _resume_kline(self, tick: TickData) -> bool:
+        """
+        用快照中正在合成的 K 线继续合成
+        ----
+            第一个 tick 与快照中正在合成的 K 线属于同一根 K 线时, 恢复 _cache_kline, _min_last_volume 和 _dirty_time,
+            成交量由累计成交量计算, 包含停止期间的成交; 停止期间的最高最低价只能由之后的 tick 更新\n
+            不是同一根 K 线时返回 False, 该 K 线已经走完, 由补数据获取
+        """
+        state, self._resumed = self._resumed, None
+        if not state or state["cache_kline"] is None or state["cache_kline"].datetime != self.next_gen_time:
+            return False
+
+        self._first_run = False
+        self._is_new = False
+        self._cache_kline = state["cache_kline"]
+        self._min_last_volume = state["min_last_volume"]
+        self._dirty_time = state["dirty_time"]
+
+        self._set_kline_data(
+            high=max(self._cache_kline.high, tick.lastPrice),
+            low=min(self._cache_kline.low, tick.lastPrice),
+            close=tick.lastPrice,
+            volume=tick.volume - self._min_last_volume,
+            openInterest=tick.openInterest
+        )
+        return True
+
     def _init_kline(self, tick: TickData) -> None:
         """使用 K 线快照和第一个 tick 初始化第一根 K 线"""
         self._first_run = False
@@ -330,6 +471,10 @@ class MinKLineGenerator(object):
 
     def get_next_gen_time(self, tick_time: datetime) -> dict:
         """获取下一根 K 线合成时间"""
+        if self._bar_minutes:
+            self.next_gen_time = self.calendar.next_bar_time(tick_time, self._bar_minutes)
+            return
+
         self.next_gen_time = self.market_center.get_next_gen_time(
             exchange=self.exchange,
             instrument=self.instrument,
@@ -337,6 +482,18 @@ class MinKLineGenerator(object):
             style=self.style
         )
 
+    def get_avl_close_time(self, tick_time: datetime) -> List[datetime]:
+        """获取 tick_time 之后 24 小时内各交易时段的收盘时间"""
+        if self._bar_minutes:
+            return self.calendar.close_times(tick_time)
+        return self.market_center.get_avl_close_time(self.instrument)
+
+    def get_close_time(self) -> List[str]:
+        """获取各交易时段的收盘时间, 格式 HH:MM:SS"""
+        if self._bar_minutes:
+            return self.calendar.close_time_strings()
+        return self.market_center.get_close_time(self.instrument)
+
     def get_kline_snapshot(self) -> dict:
         """获取 K 线快照"""
         return self.market_center.get_kline_snapshot(
@@ -353,33 +510,91 @@ class MinKLineGenerator(object):
             data=data
         )
 
-    def _push_kline(self) -> None:
-        """推送 K 线"""
-        if self._lose_kline:
-            """缺少 K 线，需要在第一次推送的时候补上"""
-            self._lose_kline = None
-            kline_data = self.market_center.get_kline_data(
+    _CALENDAR_MAX_MINUTES = 15
+    """由交易时段日历计算 K 线时间的最大周期分钟数, 交易时段都在整刻钟开收盘, 这些周期与平台的划分相同"""
+
+    _BACKFILL_MARGIN = 2
+    """补数据时在预计缺失的数量之外多获取的 K 线数量"""
+
+    _BACKFILL_MIN = 30
+    """补数据时最少获取的 K 线数量"""
+
+    def _start_backfill(self, tick_time: datetime) -> None:
+        """
+        根据最后一根已保存的 K 线和交易时段计算缺失的 K 线数量, 在后台线程获取这部分 K 线
+        ----
+            第一个 tick 紧接最后一根 K 线时不需要补; 否则多获取 _BACKFILL_MARGIN 根, 且不少于 _BACKFILL_MIN 根,
+            覆盖最近的 K 线中包含正在走的 K 线, 以及实际交易时段比 sessions 长的情况, 已有的 K 线合并时跳过
+
+        Args:
+            tick_time: 第一个 tick 的时间, 该 tick 所在的 K 线由 tick 合成, 不需要补
+        """
+        period = style_seconds(self.style)
+        last_time: datetime = self.producer.datetime[-1].astype(datetime)
+        if tick_time < last_time + timedelta(seconds=period):
+            return
+
+        missing: int = len(self.calendar.bar_times(
+            start=last_time + timedelta(seconds=1),
+            end=tick_time.replace(second=0, microsecond=0),
+            period=period
+        ))
+        count = max(missing + self._BACKFILL_MARGIN, self._BACKFILL_MIN)
+        self._backfill_after = last_time
+
+        def fetch() -> None:
+            self._backfill_data = self.market_center.get_kline_data(
                 exchange=self.exchange,
                 instrument=self.instrument,
-                count=-365,
+                count=-count,
                 style=self.style
+            ) or []
+
+        self._backfill_thread = threading.Thread(target=fetch, daemon=True)
+        self._backfill_thread.start()
+
+    def _merge_backfill(self) -> None:
+        """等待后台补数据完成, 在推送当前 K 线之前按时间顺序补上缺失的 K 线"""
+        if self._backfill_thread is None:
+            return
+
+        self._backfill_thread.join()
+        self._backfill_thread = None
+
+        data, self._backfill_data = self._backfill_data, []
+
+        if not data or min(kline["datetime"] for kline in data) > self._backfill_after:
+            ctaEngine.writeLog(
+                f"{self.exchange}.{self.instrument} 补数据没有获取到 {self._backfill_after} 及之前的 K 线, "
+                "之间的 K 线可能缺失"
             )
 
-            for kline in kline_data:
-                if kline["datetime"] in self.producer.datetime:
-                    continue
+        for kline in data:
+            if (
+                self.producer.series.contains(kline["datetime"])
+                or (self.next_gen_time and kline["datetime"] >= self.next_gen_time)
+            ):
+                """已有的 K 线, 以及正在合成的 K 线"""
+                continue
 
-                self.save_kline([kline])
+            self.save_kline([kline])
 
-                _kline = KLineData()
-                _kline.__dict__.update(
-                    exchange=self.exchange,
-                    symbol=self.instrument,
-                    **kline
-                )
+            _kline = KLineData()
+            _kline.__dict__.update(
+                exchange=self.exchange,
+                symbol=self.instrument,
+                **kline
+            )
+
+            self.producer.update(_kline)
+            self.callback(_kline)
 
-                self.producer.update(_kline)
-                self.callback(_kline)
+    def _push_kline(self) -> None:
+        """推送 K 线"""
+        if self._lose_kline:
+            """缺少 K 线，需要在第一次推送的时候补上"""
+            self._lose_kline = None
+            self._merge_backfill()
 
         self._set_kline_data(
             volume=self._last_tick.volume - self._min_last_volume,
@@ -405,6 +620,12 @@ class MinKLineGenerator(object):
         self._min_last_tick = self._last_tick
         self._min_last_volume = self._last_tick.volume
 
+        if self.snapshot is not None and (
+            self._snapshot_time is None
+            or datetime.now() - self._snapshot_time >= timedelta(seconds=self.snapshot_interval)
+        ):
+            self.save_snapshot(background=True)
+
     def tick_to_kline(self, tick: TickData, push: bool = False) -> None:
         """合成 K 线"""
         if push and self.next_gen_time == datetime.now().replace(second=0, microsecond=0):
@@ -415,6 +636,7 @@ class MinKLineGenerator(object):
 
         if (
             tick.symbol != self.instrument
+            or (self.tick_filter and not self.tick_filter(tick))
             or not tick.volume
             or (
                 self._last_tick
@@ -436,11 +658,15 @@ class MinKLineGenerator(object):
                 microsecond=0
             ) != self.producer.datetime[-1]
 
+            if self._lose_kline:
+                self._start_backfill(tick.datetime)
+
             self.get_next_gen_time(tick.datetime)
 
-            self._init_kline(tick)
+            if not self._resume_kline(tick):
+                self._init_kline(tick)
 
-            for run_date in self.market_center.get_avl_close_time(tick.symbol):
+            for run_date in self.get_avl_close_time(tick.datetime):
                 """添加推送任务"""
                 self.scheduler.add_job(
                     func=self.tick_to_kline,
@@ -452,7 +678,7 @@ class MinKLineGenerator(object):
             if self.scheduler.get_jobs():
                 self.scheduler.start()
 
-            self.close_time = self.market_center.get_close_time(tick.symbol)
+            self.close_time = self.get_close_time()
             self._last_tick = tick
 
             return
@@ -508,8 +734,8 @@ class MinKLineGenerator(object):
         )
 
         if callable(self.real_time_callback) and self.next_gen_time:
-            """实时推送合成数据"""
-            self.producer.update(self._cache_kline)
+            """实时推送合成数据, 正在走的 K 线的指标为临时值, K 线走完时确认"""
+            self.producer.update_provisional(self._cache_kline)
             self.real_time_callback(self._cache_kline)
 
         self._last_tick = tick
@@ -518,11 +744,16 @@ class MinKLineGenerator(object):
 class KLineContainer(object):
     """K 线容器
     ----
-        可以自动缓存实例本身, 重复的交易所及合约不再重新获取 K 线
+        可以自动缓存实例本身, 重复的交易所及合约不再重新获取 K 线\n
+        设置 shared_dir 后, 历史 K 线保存在该目录的内存映射文件中, 按 (交易所, 合约, K 线周期) 区分,
+        第一个获取历史 K 线的进程负责写入, 之后的策略进程直接只读挂载, 不再获取和持有 K 线字典;
+        写进程退出后文件不再挂载, 下一个进程重新获取历史 K 线并成为写进程
 
     Args:
         exchange: 交易所代码\n
-        instrument: 合约代码
+        instrument: 合约代码\n
+        style: K 线周期\n
+        fetch: 是否获取历史 K 线, 为 False 时只创建容器
     """
 
     _lock_1 = threading.Lock()
@@ -530,12 +761,20 @@ class KLineContainer(object):
     _instance = None
     __init_flag = False
 
+    shared_dir: str = None
+    """跨进程共享历史 K 线的目录, 需在创建 K 线生成器之前设置"""
+
+    max_klines: int = 14400
+    """每个合约每个 K 线周期最多缓存的 K 线数量, 超出后丢弃最旧的 K 线"""
+
     def __new__(cls, *args, **kwargs):
         with cls._lock_1:
             if cls._instance is None:
                 """只需要在 new class 的时候初始化 all_kline"""
                 cls._instance = super().__new__(cls)
                 cls._instance.all_kline = {}
+                cls._instance.shared_kline = {}
+                cls._instance.kline_index = {}
             return cls._instance
 
     def __init__(
@@ -543,25 +782,108 @@ class KLineContainer(object):
         exchange: str,
         instrument: str,
         style: KLineStyleType,
+        fetch: bool = True
     ) -> None:
         super().__init__()
 
         with self._lock_2:
-            if self.__init_flag and self.get(exchange, instrument, style):
+            if self.__init_flag and self._cached(exchange, instrument, style):
                 return
 
         self.market_center = MarketCenter()
 
+        if not fetch:
+            return
+
         self.init(exchange, instrument, style)
 
         self.__init_flag = True
 
+    def _shared_path(self, exchange: str, instrument: str, style: KLineStyleType) -> str:
+        """共享 K 线的映射文件路径"""
+        return os.path.join(self.shared_dir, f"{exchange}.{instrument}.{style.name}.kline")
+
+    def _cached(self, exchange: str, instrument: str, style: KLineStyleType) -> bool:
+        """是否已缓存该合约的 K 线"""
+        if not isinstance(style, KLineStyle):
+            return False
+        return (
+            (exchange, instrument, style.name) in self.shared_kline
+            or bool(self.all_kline.get(exchange, {}).get(instrument, {}).get(style.name))
+        )
+
     def get(self, exchange: str, instrument: str, style: KLineStyleType) -> List[dict]:
         """根据交易所, 合约和 K 线分钟获取 K 线"""
         if isinstance(style, KLineStyle):
-            return self.all_kline.get(exchange, {}).get(instrument, {}).get(style.name, [])
+            data = self.all_kline.get(exchange, {}).get(instrument, {}).get(style.name, [])
+
+            if (shared := self.shared_kline.get((exchange, instrument, style.name))) is not None:
+                return [*shared.iter_klines(), *data]
+
+            return data
         return []
 
+    def split(
+        self,
+        exchange: str,
+        instrument: str,
+        style: KLineStyleType,
+        count: int
+    ) -> Tuple[List[BarChunk], List[dict]]:
+        """
+        按最后 count 根拆分 K 线, 不含空 K 线 (Padding)
+        ----
+            最后 count 根为 K 线字典, 之前的 K 线为按列处理的 BarChunk\n
+            共享 K 线只复制一次映射文件中的列, 之前的部分直接作为列数据, 只有最后 count 根逐根转为 K 线字典
+
+        Args:
+            count: 转为 K 线字典的数量
+        """
+        if not isinstance(style, KLineStyle):
+            return [], []
+
+        data = [
+            kline for kline in self.all_kline.get(exchange, {}).get(instrument, {}).get(style.name, [])
+            if kline.get("open")
+        ]
+        local_split = max(len(data) - count, 0)
+        chunks = [BarChunk(data[:local_split], open_interest="open_interest")]
+
+        if (shared := self.shared_kline.get((exchange, instrument, style.name))) is None:
+            return chunks, data[local_split:]
+
+        columns = shared.snapshot()
+        nonempty = columns["open"] != 0
+        columns = {name: column[nonempty] for name, column in columns.items()}
+
+        shared_split = max(len(columns["datetime"]) - (count - (len(data) - local_split)), 0)
+        head = BarChunk.from_columns(
+            {name: column[:shared_split] for name, column in columns.items()}, open_interest="open_interest"
+        )
+        tail = BarChunk.from_columns(
+            {name: column[shared_split:] for name, column in columns.items()}, open_interest="open_interest"
+        )
+        """共享 K 线在本地缓存的 K 线之前"""
+        return [head, *chunks], [*tail.records, *data[local_split:]]
+
+    @staticmethod
+    def _upsert(klines: List[dict], index: List[datetime], kline: dict) -> None:
+        """按时间写入 K 线, 相同时间覆盖, 新 K 线追加在末尾, 乱序的 K 线二分插入"""
+        _datetime: datetime = kline["datetime"]
+
+        if not index or _datetime > index[-1]:
+            index.append(_datetime)
+            klines.append(kline)
+            return
+
+        position = bisect_left(index, _datetime)
+
+        if index[position] == _datetime:
+            klines[position] = kline
+        else:
+            index.insert(position, _datetime)
+            klines.insert(position, kline)
+
     def set(
         self,
         exchange: str,
@@ -569,16 +891,39 @@ class KLineContainer(object):
         style: KLineStyleType,
         data: List[dict]
     ) -> None:
-        """根据交易所, 合约和 K 线分钟缓存 K 线"""
+        """根据交易所, 合约和 K 线分钟缓存 K 线, 按时间去重, 共享 K 线由写进程写入, 只读进程保存在本地"""
         if isinstance(style, KLineStyle):
-            self.all_kline.setdefault(exchange, {}).setdefault(
-                instrument, {}).setdefault(style.name, []).extend(data)
+            shared: SharedKLineSeries = self.shared_kline.get((exchange, instrument, style.name))
+
+            if shared is not None and shared.writer:
+                shared.extend(data)
+                return
+
+            klines: List[dict] = self.all_kline.setdefault(exchange, {}).setdefault(
+                instrument, {}).setdefault(style.name, [])
+            index: List[datetime] = self.kline_index.setdefault((exchange, instrument, style.name), [])
+
+            for kline in data:
+                self._upsert(klines, index, kline)
+
+            if len(klines) > self.max_klines + self.max_klines // 10:
+                """超出上限一定数量后再批量裁剪, 均摊裁剪开销"""
+                del klines[:-self.max_klines], index[:-self.max_klines]
 
     def init(self, exchange: str, instrument: str, style: KLineStyleType) -> None:
         """获取合约 K 线并缓存"""
         if not all([exchange, instrument]):
             raise ValueError("交易所或合约代码为空")
 
+        if self.shared_dir and (shared := SharedKLineSeries.attach(
+            self._shared_path(exchange, instrument, style)
+        )) is not None:
+            if len(shared):
+                """存活的写进程已写入共享 K 线"""
+                self.shared_kline[(exchange, instrument, style.name)] = shared
+                return
+            shared.close()
+
         if not (data := self.market_center.get_kline_data(
             exchange=exchange,
             instrument=instrument,
@@ -587,6 +932,12 @@ class KLineContainer(object):
         )):
             raise ValueError(f"获取到空数据, 请检查交易所 {exchange} 或者合约代码 {instrument} 是否填写错误")
 
+        if self.shared_dir and (shared := SharedKLineSeries.create(
+            self._shared_path(exchange, instrument, style)
+        )) is not None:
+            """成为写进程"""
+            self.shared_kline[(exchange, instrument, style.name)] = shared
+
         self.set(
             exchange=exchange,
             instrument=instrument,
@@ -606,25 +957,39 @@ class KLineProducer(Indicators):
         instrument: 合约代码\n
         style: 合成 K 线分钟\n
             默认 M1 即 1 分钟 K 线, 必须使用 KLineStyle 的枚举值\n
-        callback: 推送 K 线回调
+        callback: 推送 K 线回调\n
+        history: 是否获取并推送历史 K 线, 为 False 时序列只由 update 写入\n
+        compact: 是否使用紧凑存储, 见 KLineSeries\n
+        price_decimals: 价格小数位数, 给定时价格按放大后的 int32 存储\n
+        views: 历史 K 线是否以 BarView 推送给回调, 回调只读取 K 线数据时不需要逐根创建 K 线对象\n
+        warmup: 历史 K 线批量预热, 给定时只把最后 warmup 根推送给回调, 之前的 K 线按列一次写入序列,
+            增量指标和声明的指标在下一次查询时一次计算; 为 None 时逐根推送全部历史 K 线
         """
     def __init__(
         self,
         exchange: str,
         instrument: str,
         style: Union[KLineStyleType, str] = "M1",
-        callback: Callable[[KLineData], None] = None
+        callback: Callable[[KLineData], None] = None,
+        history: bool = True,
+        compact: bool = False,
+        price_decimals: int = None,
+        views: bool = False,
+        warmup: int = None
     ) -> None:
         super().__init__()
         self.style = style
         self.exchange = exchange
         self.instrument = instrument
         self.callback = callback
+        self.views = views
+        self.warmup = warmup
 
         self.kline_container = KLineContainer(
             exchange=exchange,
             instrument=instrument,
-            style=self.style
+            style=self.style,
+            fetch=history
         )
 
         if callback and hasattr(callback, "__self__"):
@@ -634,18 +999,22 @@ class KLineProducer(Indicators):
         self._first_run = True
         self._cache_kline: KLineData = None
 
-        self._open = np.zeros(10)
-        self._close = np.zeros(10)
-        self._high = np.zeros(10)
-        self._low = np.zeros(10)
-        self._volume = np.zeros(10)
-        self._datetime = np.arange(
+        self.series = KLineSeries(compact=compact, price_decimals=price_decimals)
+        """K 线列式存储"""
+
+        for _datetime in np.arange(
             '1999-11-20 00',
             '1999-11-20 10',
             dtype='datetime64[h]'
-        )
+        ):
+            """填充 10 根空 K 线, 保证指标和时间比较有足够长度"""
+            self.series.append(0, 0, 0, 0, 0, _datetime)
+
+        self.streaming = StreamingIndicators(self)
+        """增量指标, 方法与内置指标一致, 每根 K 线 O(1) 更新"""
 
-        self.worker()
+        if history:
+            self.worker()
 
     @property
     def style(self) -> KLineStyleType:
@@ -665,58 +1034,39 @@ class KLineProducer(Indicators):
         return self.kline_container.get(self.exchange, self.instrument, self.style)
 
     @property
-    def open(self) -> List[np.float64]:
+    def open(self) -> np.ndarray:
         """开盘价序列"""
-        return self._open
-
-    @open.setter
-    def open(self, value: List[np.float64]) -> None:
-        self._open = value
+        return self.series.open
 
     @property
-    def close(self) -> List[np.float64]:
+    def close(self) -> np.ndarray:
         """收盘价序列"""
-        return self._close
-
-    @close.setter
-    def close(self, value: List[np.float64]) -> None:
-        self._close = value
+        return self.series.close
 
     @property
-    def high(self) -> List[np.float64]:
+    def high(self) -> np.ndarray:
         """最高价序列"""
-        return self._high
-
-    @high.setter
-    def high(self, value: List[np.float64]) -> None:
-        self._high = value
+        return self.series.high
 
     @property
-    def low(self) -> List[np.float64]:
+    def low(self) -> np.ndarray:
         """最低价序列"""
-        return self._low
-
-    @low.setter
-    def low(self, value: List[np.float64]) -> None:
-        self._low = value
+        return self.series.low
 
     @property
-    def volume(self) -> List[np.float64]:
+    def volume(self) -> np.ndarray:
         """成交量序列"""
-        return self._volume
-
-    @volume.setter
-    def volume(self, value: List[np.float64]) -> None:
-        self._volume = value
+        return self.series.volume
 
     @property
-    def datetime(self) -> List[DateTimeType]:
+    def datetime(self) -> np.ndarray:
         """时间序列"""
-        return self._datetime
+        return self.series.datetime
 
-    @datetime.setter
-    def datetime(self, value: List[DateTimeType]) -> None:
-        self._datetime = value
+    @property
+    def open_interest(self) -> np.ndarray:
+        """持仓量序列"""
+        return self.series.open_interest
 
     def update(self, kline: KLineData) -> None:
         """
@@ -725,43 +1075,110 @@ class KLineProducer(Indicators):
         Args:
             kline: K 线对象
         """
-        if self.datetime[-2] < kline.datetime < self.datetime[-1]:
-            self.insert_data(kline)
-        elif self.datetime[-1] != kline.datetime:
+        if self.datetime[-1] == kline.datetime:
+            self.update_last_kline(kline)
+        elif self.datetime[-1] < kline.datetime:
             self.append_data(kline)
         else:
-            self.update_last_kline(kline)
+            """乱序 K 线, 二分查找后覆盖或插入"""
+            self.series.upsert(*self._kline_values(kline))
+            self.streaming.reset()
+            self.invalidate()
+
+    @staticmethod
+    def _kline_values(kline: KLineData) -> tuple:
+        """按列顺序取出 K 线数据"""
+        return (
+            kline.open,
+            kline.high,
+            kline.low,
+            kline.close,
+            kline.volume,
+            kline.datetime,
+            kline.openInterest
+        )
 
     def append_data(self, kline: KLineData) -> None:
         """添加 K 线数据"""
-        self.open = np.append(self.open, kline.open)
-        self.close = np.append(self.close, kline.close)
-        self.high = np.append(self.high, kline.high)
-        self.low = np.append(self.low, kline.low)
-        self.volume = np.append(self.volume, kline.volume)
-        self.datetime = np.append(self.datetime, kline.datetime)
+        self.streaming.commit()
+        self.series.append(*self._kline_values(kline))
+        self.streaming.update(kline.high, kline.low, kline.close)
+        self.invalidate()
 
     def insert_data(self, kline: KLineData, index: int = -1) -> None:
         """插入 K 线数据"""
-        self.open = np.insert(self.open, index, kline.open, axis=0)
-        self.close = np.insert(self.close, index, kline.close, axis=0)
-        self.high = np.insert(self.high, index, kline.high, axis=0)
-        self.low = np.insert(self.low, index, kline.low, axis=0)
-        self.volume = np.insert(self.volume, index, kline.volume, axis=0)
-        self.datetime = np.insert(self.datetime, index, kline.datetime, axis=0)
+        self.series.insert(index, *self._kline_values(kline))
+        self.streaming.reset()
+        self.invalidate()
 
     def update_last_kline(self, kline: KLineData) -> None:
-        """更新最后一根 K 线数据"""
-        self.open[-1] = kline.open
-        self.close[-1] = kline.close
-        self.high[-1] = kline.high
-        self.low[-1] = kline.low
-        self.volume[-1] = kline.volume
-        self.datetime[-1] = kline.datetime
+        """更新最后一根 K 线数据, 最后一根为正在走的 K 线时即为确认该 K 线"""
+        self.series.update_last(*self._kline_values(kline))
 
-    def _set_kline_data(self, **kwargs) -> None:
-        """对当前缓存的 K 线设置数据"""
-        self._cache_kline.__dict__.update(kwargs)
+        if self.streaming.forming is not None:
+            self.streaming.update(kline.high, kline.low, kline.close)
+        else:
+            self.streaming.replace(kline.high, kline.low, kline.close)
+
+        self.invalidate()
+
+    def update_provisional(self, kline: KLineData) -> None:
+        """
+        更新正在走的 K 线
+        ----
+            数据序列中写入正在走的 K 线, 增量指标 (streaming) 只记录其数据, 查询时在上一根走完的 K 线的状态上计算临时值,
+            每个 tick 的计算量与历史长度无关\n
+            K 线走完后调用 update 确认; 时间早于或等于最后一根已走完的 K 线时按 update 处理
+
+        Args:
+            kline: 正在走的 K 线
+        """
+        if self.streaming.forming is not None and self.datetime[-1] == kline.datetime:
+            self.series.update_last(*self._kline_values(kline))
+        elif self.datetime[-1] < kline.datetime:
+            """上一根正在走的 K 线没有被确认时, 按最后一次的数据确认"""
+            self.streaming.commit()
+            self.series.append(*self._kline_values(kline))
+        else:
+            self.update(kline)
+            return
+
+        self.streaming.provisional(kline.high, kline.low, kline.close)
+        self.invalidate()
+
+    def declare(self, declarations: Union[str, Dict[str, str]], namespace: Any = None) -> IndicatorSet:
+        """
+        声明策略用到的指标
+        ----
+            共用的节点 (真实波幅, 均线, 移动最高最低等) 只计算一次, 结果按声明的名称发布为属性, 见 IndicatorSet
+
+        Args:
+            declarations: 指标声明, 如 "kc=keltner(N); ma0=sma(P1)"\n
+            namespace: 参数名称的取值对象, 如策略的 params_map
+        """
+        return IndicatorSet(self.streaming, declarations, namespace)
+
+    def missing_ranges(
+        self,
+        start: datetime,
+        end: datetime,
+        calendar: SessionCalendar = None
+    ) -> List[Tuple[datetime, datetime]]:
+        """
+        根据交易时段日历查询 start 到 end 之间缺失的 K 线
+        ----
+            应有的 K 线时间由 SessionCalendar.bar_times 生成, 休市的交易时段 (周末, 节假日, 节假日前的夜盘) 不算缺失
+
+        Args:
+            start: 开始时间\n
+            end: 结束时间\n
+            calendar: 交易时段日历, 默认为合约品种的日历 SessionCalendar.for_instrument
+
+        Returns:
+            [(缺失开始时间, 缺失结束时间), ...], 均为 K 线时间
+        """
+        calendar = calendar or SessionCalendar.for_instrument(self.instrument)
+        return self.series.missing_ranges(calendar.bar_times(start, end, style_seconds(self.style)))
 
     def _get_next_gen_time(self, _datetime) -> None:
         """根据传入的时间与 K 线时间类型生成下一根 K 线的开始时间"""
@@ -779,26 +1196,187 @@ class KLineProducer(Indicators):
             """如果回调可用, 则使用回调"""
             self.callback(self._cache_kline)
 
-    def worker(self) -> None:
-        """将 K 线数据转成 K 线对象后推送"""
-        if not (data := self._get_data()):
+    def snapshot(self) -> dict:
+        """
+        序列和增量指标的快照, 见 SnapshotStore
+        ----
+            只包含已走完的 K 线, update_provisional 写入的正在走的 K 线由 MinKLineGenerator 的合成状态保存\n
+            序列按 float64 保存, 恢复时按当前的存储方式写入; talib 指标的缓存不保存, 恢复后重新计算\n
+            序列和增量指标都是复制的, 之后的更新不影响快照, 可以在其他线程 pickle
+        """
+        size = len(self.series) - (self.streaming.forming is not None)
+        return {
+            "series": {
+                name: getattr(self.series, name)[:size].copy() for name in KLineSeries.columns
+            },
+            "streaming": self.streaming.snapshot()
+        }
+
+    def restore(self, state: dict) -> None:
+        """
+        恢复 snapshot 保存的序列和增量指标
+
+        Args:
+            state: snapshot 的返回值
+        """
+        self.series.clear()
+        self.series.extend(*(state["series"][name] for name in KLineSeries.columns))
+        self.streaming.restore(state["streaming"])
+        self.invalidate()
+
+    def ingest(self, chunk: BarChunk) -> None:
+        """
+        历史 K 线批量写入序列, 不推送给回调
+        ----
+            各列一次写入, 增量指标清空后在下一次查询时由 seed 一次初始化, 不逐根计算指标\n
+            时间不是严格升序或不晚于最后一根 K 线时逐根 update
+
+        Args:
+            chunk: 一段历史 K 线
+        """
+        _datetime = chunk.column("datetime")
+        if not len(_datetime):
             return
 
-        for kline in data:
-            if not kline.get("open"):
-                """空 K 线, Padding"""
-                continue
+        if (
+            (len(self.series) and _datetime[0] <= self.datetime[-1])
+            or (np.diff(_datetime) <= np.timedelta64(0)).any()
+        ):
+            for kline in chunk.klines():
+                self.update(kline)
+            return
 
-            self._cache_kline = KLineData()
+        self.series.extend(*(
+            chunk.column(name) for name in ("open", "high", "low", "close", "volume", "datetime", "openInterest")
+        ))
+        self.streaming.reset()
+        self.invalidate()
 
-            self._set_kline_data(
-                exchange=self.exchange,
-                symbol=self.instrument,
-                **kline,
-                openInterest=kline["open_interest"],
+    def worker(self) -> None:
+        """
+        推送历史 K 线
+        ----
+            按段回放推送, views 为 False 时逐根转成 K 线对象\n
+            warmup 不为 None 时, 最后 warmup 根之前的 K 线由 ingest 一次写入, 回调只收到最后 warmup 根,
+            避免每根历史 K 线都触发一次全量的指标计算; 共享 K 线之前的部分按列写入, 不转为 K 线字典
+        """
+        if self.warmup is not None:
+            history, klines = self.kline_container.split(self.exchange, self.instrument, self.style, self.warmup)
+            for chunk in history:
+                self.ingest(chunk)
+        else:
+            klines = [kline for kline in self._get_data() if kline.get("open")]
+            """空 K 线 (Padding) 不推送"""
+
+        chunks = replay(
+            klines,
+            extra={"exchange": self.exchange, "symbol": self.instrument},
+            open_interest="open_interest"
+        )
+
+        for chunk in chunks:
+            for self._cache_kline in (chunk if self.views else chunk.klines()):
+                self._push()
+
+
+class KLineCascade(object):
+    """多周期 K 线级联合成
+    ----
+        每个合约只使用一条 M1 K 线流, 增量合成任意多个更高周期的 K 线\n
+        更高周期各有独立的 KLineProducer (指标) 和推送回调, 不再单独获取历史 K 线\n
+        把 update 作为 M1 的 MinKLineGenerator 的回调即可,
+        MinKLineGenerator 推送历史 M1 K 线时同步合成各周期的历史 K 线\n
+        M1 的回调直接收到 update 的 K 线, 不再创建第二个 M1 生产器, M1 的指标通过 MinKLineGenerator.producer 读取\n
+        更高周期的指标通过 producers[style] 读取; 与单独的 KLineProducer 不同, 不会把生产器注入回调所属实例的 indicators,
+        否则多个周期会互相覆盖, strategy.indicators 只指向最后创建的周期\n
+        更高周期按交易时段日历对齐 (KLineResampler 的 calendar), 每个交易时段从开盘时间起每个周期一根,
+        时段最后一根在时段结束时间走完 (如 11:30 和 15:00 收盘的 M1 K 线到达时立即推送), 不跨越休市合并
+
+    Example:
+        self.cascade = KLineCascade("SHFE", "rb2410", {"M1": self.on_m1, "M5": self.on_m5, "H1": self.on_h1})\n
+        self.generator = MinKLineGenerator(self.cascade.update, "SHFE", "rb2410", "M1")
+
+    Args:
+        exchange: 交易所代码\n
+        instrument: 合约代码\n
+        callbacks: 各周期的推送 K 线回调, 键为 KLineStyle 枚举值或名称\n
+        sessions: 合约交易时段, 默认按合约品种取 PRODUCT_SESSIONS, 应与 MinKLineGenerator 的 sessions 相同\n
+        holidays: 节假日, 默认为 sessions.set_holidays 设置的节假日
+    """
+
+    def __init__(
+        self,
+        exchange: str,
+        instrument: str,
+        callbacks: Dict[Union[KLineStyleType, str], Callable[[KLineData], None]],
+        sessions: Tuple[SessionType, ...] = None,
+        holidays: Iterable[date] = None
+    ) -> None:
+        self.exchange = exchange
+        self.instrument = instrument
+        self.calendar = SessionCalendar.get(sessions or product_sessions(instrument), holidays)
+
+        self.producers: Dict[KLineStyleType, KLineProducer] = {}
+        """各周期的 K 线生产器"""
+
+        self.callbacks: Dict[KLineStyleType, Callable[[KLineData], None]] = {}
+        """各周期的推送 K 线回调, 不交给生产器, 避免注入 indicators"""
+
+        self.resamplers: Dict[KLineStyleType, KLineResampler] = {}
+
+        self.m1_callback: Callable[[KLineData], None] = None
+        """M1 的推送 K 线回调"""
+
+        for style, callback in callbacks.items():
+            if style in ("M1", KLineStyle.M1):
+                self.m1_callback = callback
+                continue
+
+            producer = KLineProducer(
+                exchange=exchange,
+                instrument=instrument,
+                style=style,
+                history=False
             )
+            self.producers[producer.style] = producer
+            self.callbacks[producer.style] = callback
+            self.resamplers[producer.style] = KLineResampler(producer.style, self.calendar)
+
+    def _push(self, producer: KLineProducer, kline: KLineData) -> None:
+        producer.update(kline)
+
+        if callable(callback := self.callbacks[producer.style]):
+            callback(kline)
+
+    def update(self, kline: KLineData) -> None:
+        """
+        推送一根走完的 M1 K 线, 并推送由此走完的各周期 K 线
+
+        Args:
+            kline: M1 K 线
+        """
+        if callable(self.m1_callback):
+            self.m1_callback(kline)
+
+        for style, producer in self.producers.items():
+            for data in self.resamplers[style].update(
+                kline.datetime,
+                kline.open,
+                kline.high,
+                kline.low,
+                kline.close,
+                kline.volume,
+                kline.openInterest
+            ):
+                _kline = KLineData()
+                _kline.__dict__.update(
+                    exchange=self.exchange,
+                    symbol=self.instrument,
+                    **data,
+                    openInterest=data["open_interest"]
+                )
 
-            self._push()
+                self._push(producer, _kline)
 
 
 def isdigit(value: str) -> bool:
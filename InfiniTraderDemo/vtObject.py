@@ -15,7 +15,7 @@ if os.path.exists(qt_origin_path):
 
 import ctaEngine  # type: ignore
 
-from models import Base, DateTimeType
+from models import Base, DateTimeType, compact_record
 from vtConstant import *
 
 product_cls = {
@@ -204,6 +204,13 @@ class VtBarData(KLineData):
     ...
 
 
+CompactTickData = compact_record(VtTickData, "CompactTickData")
+"""字段存放在槽中的 Tick, 字段与 VtTickData 相同, 内存约为 40%, 从字典构造比 dataclass 慢, 用于长期保存大量 Tick"""
+
+CompactKLineData = compact_record(KLineData, open_interest=0)
+"""字段存放在槽中的 K 线, 字段与 KLineData 相同, 另外声明 ctaEngine.getKLineData 返回的 open_interest, 见 CompactTickData"""
+
+
 @dataclass
 class PositionData(Base):
     """